@@ -0,0 +1,173 @@
+# checkstyle: noqa
+
+import sys
+import getopt
+import time
+
+from sulley import coverage
+from sulley import pedrpc
+
+'''
+Coverage feedback agent for *nix targets.
+
+Shares an edge hit count map with an instrumented target through a file, /dev/shm/sulley_coverage by default.
+The target finds the map through the SULLEY_COVERAGE_MAP environment variable and bumps the byte of every edge
+it takes, so start it with the variable set, ie: through the process monitor:
+
+    target.procmon_options = {"start_commands": ["env SULLEY_COVERAGE_MAP=/dev/shm/sulley_coverage ./httpd"]}
+    target.covmon          = pedrpc.Client("10.0.0.1", 26004)
+
+Any instrumentation writing AFL style hit counts into the map will do. With clang, build the target with
+-fsanitize-coverage=trace-pc-guard and link in a runtime along the lines of:
+
+    static unsigned char *map;
+
+    void __sanitizer_cov_trace_pc_guard_init (uint32_t *start, uint32_t *stop) {
+        int fd = open(getenv("SULLEY_COVERAGE_MAP"), O_RDWR);
+        map = mmap(NULL, 65536, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        for (uint32_t n = 0; start < stop; start++) *start = n++ % 65536;
+    }
+
+    void __sanitizer_cov_trace_pc_guard (uint32_t *guard) {
+        map[*guard]++;
+    }
+
+A ptrace based basic block sampler writing into the map works as well, with coarser results.
+
+Replicated methods:
+    - alive
+    - log
+    - post_send
+    - pre_send
+    - get_coverage
+    - reset_coverage
+
+Limitations
+    - The target must run on the same host as the agent
+    - Hit counts of a target which keeps running between test cases, ie: a background thread, are charged to
+      whichever test case is in flight
+'''
+
+USAGE = "USAGE: coverage_monitor_unix.py"\
+        "\n    [-m|--map PATH]              file backing the coverage map (default /dev/shm/sulley_coverage)"\
+        "\n    [-s|--map_size SIZE]         number of edge counters in the map (default 65536)"\
+        "\n    [-P|--port PORT]             TCP port to bind this agent too"\
+        "\n    [-l|--log_level LEVEL]       log level (default 1), increase for more verbosity"
+
+ERR   = lambda msg: sys.stderr.write("ERR> " + msg + "\n") or sys.exit(1)
+
+
+class nix_coverage_monitor_pedrpc_server(pedrpc.Server):
+    def __init__(self, host, port, map_filename, map_size=coverage.MAP_SIZE, log_level=1):
+        '''
+        @type host: String
+        @param host: Hostname or IP address
+        @type port: Integer
+        @param port: Port to bind server to
+        @type map_filename: String
+        @param map_filename: File backing the coverage map, exported to the target as SULLEY_COVERAGE_MAP
+        @type map_size: Integer
+        @param map_size: (Optional, def=65536) Number of edge counters in the map
+        @type log_level: Integer
+        @param log_level: (Optional, def=1) Log output level, increase for more verbosity
+        '''
+
+        pedrpc.Server.__init__(self, host, port)
+        self.log_level   = log_level
+        self.bitmap      = coverage.bitmap(map_filename, map_size)
+        self.test_number = 0
+
+        self.log("Coverage Monitor PED-RPC server initialized:")
+        self.log("Coverage map: %s (%d edges)" % (map_filename, map_size))
+        self.log("Listening on %s:%s" % (host, port))
+        self.log("awaiting requests...")
+
+
+    def alive (self):
+        '''
+        Returns True. Useful for PED-RPC clients who want to see if the PED-RPC connection is still alive.
+        '''
+
+        return True
+
+
+    def log (self, msg="", level=1):
+        '''
+        If the supplied message falls under the current log level, print the specified message to screen.
+
+        @type  msg: String
+        @param msg: Message to log
+        '''
+
+        if self.log_level >= level:
+            print "[%s] %s" % (time.strftime("%I:%M.%S"), msg)
+
+
+    def pre_send (self, test_number):
+        '''
+        This routine is called before the fuzzer transmits a test case and clears the hit counts.
+
+        @type  test_number: Integer
+        @param test_number: Test number about to be transmitted
+        '''
+
+        self.log("pre_send(%d)" % test_number, 10)
+        self.test_number = test_number
+        self.bitmap.reset()
+
+
+    def post_send (self):
+        '''
+        This routine is called after the fuzzer transmits a test case and reports the coverage it reached.
+
+        @rtype:  Integer
+        @return: Number of (edge, hit count bucket) pairs no earlier test case reached
+        '''
+
+        new = self.bitmap.update()
+
+        if new:
+            self.log("test case %d reached %d new edges, %d total" % (self.test_number, new, self.bitmap.total), 5)
+
+        return new
+
+
+    def get_coverage (self):
+        '''
+        @rtype:  Integer
+        @return: Number of (edge, hit count bucket) pairs reached so far
+        '''
+
+        return self.bitmap.total
+
+
+    def reset_coverage (self):
+        '''
+        Forget the coverage reached so far, ie: when the target binary was rebuilt.
+        '''
+
+        self.bitmap.seen  = 0L
+        self.bitmap.total = 0
+
+
+if __name__ == "__main__":
+    # parse command line options.
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "m:s:P:l:", ["map=", "map_size=", "port=", "log_level="])
+    except getopt.GetoptError:
+        ERR(USAGE)
+
+    log_level    = 1
+    PORT         = 26004
+    map_filename = "/dev/shm/sulley_coverage"
+    map_size     = coverage.MAP_SIZE
+
+    for opt, arg in opts:
+        if opt in ("-m", "--map"):       map_filename = arg
+        if opt in ("-s", "--map_size"):  map_size     = int(arg)
+        if opt in ("-P", "--port"):      PORT         = int(arg)
+        if opt in ("-l", "--log_level"): log_level    = int(arg)
+
+    # spawn the PED-RPC servlet.
+    servlet = nix_coverage_monitor_pedrpc_server("0.0.0.0", PORT, map_filename, map_size, log_level)
+    servlet.serve_forever()
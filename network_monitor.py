@@ -10,6 +10,8 @@ import impacket
 import impacket.ImpactDecoder
 import signal
 from sulley import pedrpc
+from utils import pcap_ring
+from utils import pcap_store
 
 
 def log_error(message=None):
@@ -24,8 +26,11 @@ def create_usage():
     message = """USAGE: network_monitor.py
     <-d|--device DEVICE #>    device to sniff on (see list below)
     [-f|--filter PCAP FILTER] BPF filter string
-    [-P|--log_path PATH]      log directory to store pcaps to
+    [-P|--log_path PATH]      directory of the pcapng store
     [-l|--log_level LEVEL]    log level (default 1), increase for more verbosity
+    [-r|--ring MB]            capture continuously into a ring of MB megabytes and only
+                              save the pcaps of test cases that crashed
+    [-w|--window N]           with -r, also save the N test cases before a crash
     [--port PORT]             TCP port to bind this agent to
 
 Network Device List:
@@ -58,11 +63,11 @@ Network Device List:
 
 ########################################################################################################################
 class PcapThread (threading.Thread):
-    def __init__ (self, network_monitor, pcap, pcap_save_path):
+    def __init__ (self, network_monitor, pcap):
         self.network_monitor = network_monitor
         self.pcap            = pcap
         self.decoder         = None
-        self.dumper          = self.pcap.dump_open(pcap_save_path)
+        self.packets         = []       # (seconds, microseconds, length, data) for the pcapng store.
         self.active          = True
         self.data_bytes      = 0
 
@@ -77,8 +82,9 @@ class PcapThread (threading.Thread):
         threading.Thread.__init__(self)
 
     def packet_handler (self, header, data):
-        # add the captured data to the PCAP.
-        self.dumper.dump(header, data)
+        # hold on to the captured data until the test case is stored.
+        seconds, useconds = header.getts()
+        self.packets.append((seconds, useconds, header.getlen(), data))
 
         # increment the captured byte count.
         self.data_bytes += len(data)
@@ -94,7 +100,7 @@ class PcapThread (threading.Thread):
 
 ########################################################################################################################
 class NetworkMonitorPedrpcServer (pedrpc.Server):
-    def __init__ (self, host, port, monitor_device, bpf_filter="", path="./", level=1):
+    def __init__ (self, host, port, monitor_device, bpf_filter="", path="./", level=1, ring_size=0, window=1):
         """
         @type  host:           str
         @param host:           Hostname or IP address to bind server to
@@ -108,6 +114,11 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         @param path:           (Optional, def="./") Path to save recorded PCAPs to
         @type  level:          int
         @param level:          (Optional, def=1) Log output level, increase for more verbosity
+        @type  ring_size:      int
+        @param ring_size:      (Optional, def=0) Capture continuously into a ring of this many bytes, 0 for a capture
+                               and a pcap per test case
+        @type  window:         int
+        @param window:         (Optional, def=1) Number of test cases before a crash to save along with it
         """
 
         # initialize the PED-RPC server.
@@ -118,17 +129,25 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         self.log_level   = level
         self.pcap        = None
         self.pcap_thread = None
+        self.store       = None
+        self.test_number = None
+        self.ring        = None
+        self.ring_size   = ring_size
+        self.window      = window
 
         # ensure the log path is valid.
         if not os.access(self.log_path, os.X_OK):
             self.log("invalid log path: %s" % self.log_path)
             raise Exception
 
+        self.store = pcap_store.store(self.log_path)
+
         self.log("Network Monitor PED-RPC server initialized:")
         self.log("\t device:    %s" % self.device)
         self.log("\t filter:    %s" % self.filter)
         self.log("\t log path:  %s" % self.log_path)
         self.log("\t log_level: %d" % self.log_level)
+        self.log("\t ring:      %d bytes" % self.ring_size)
         self.log("Awaiting requests...")
 
     def __stop (self):
@@ -158,12 +177,19 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         @return: Number of bytes captured in PCAP thread.
         """
 
-        # grab the number of recorded bytes.
+        # in ring mode the capture keeps running, just close off the test case.
+        if self.ring:
+            return self.ring.mark_end()
+
+        # grab the number of recorded bytes and the packets.
         data_bytes = self.pcap_thread.data_bytes
+        packets    = list(self.pcap_thread.packets)
 
         # stop the packet capture thread.
         self.__stop()
 
+        self.store.append(self.test_number, packets)
+
         self.log("stopped PCAP thread, snagged %d bytes of data" % data_bytes)
         return data_bytes
 
@@ -172,15 +198,24 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         This routine is called before the fuzzer transmits a test case and spin off a packet capture thread.
         """
 
+        if self.ring_size:
+            if not self.ring:
+                self.start_ring()
+
+            self.log("marking start of test case #%d" % test_number, 10)
+            self.ring.mark_start(test_number)
+            return
+
         self.log("initializing capture for test case #%d" % test_number)
 
         # open the capture device and set the BPF filter.
         self.pcap = pcapy.open_live(self.device, -1, 1, 100)
         self.pcap.setfilter(self.filter)
+        self.store.linktype = self.pcap.datalink()
+        self.test_number    = test_number
 
         # instantiate the capture thread.
-        pcap_log_path = "%s/%d.pcap" % (self.log_path, test_number)
-        self.pcap_thread = PcapThread(self, self.pcap, pcap_log_path)
+        self.pcap_thread = PcapThread(self, self.pcap)
         self.pcap_thread.start()
 
     def log (self, msg="", level=1):
@@ -194,19 +229,69 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         if self.log_level >= level:
             print "[%s] %s" % (time.strftime("%I:%M.%S"), msg)
 
-    def retrieve (self, test_number):
+    def persist (self, test_number):
         """
-        Return the raw binary contents of the PCAP saved for the specified test case number.
+        Called by the fuzzer when a test case crashed the target. In ring mode, save the packets of the test case and
+        the window of test cases before it to the pcapng store retrieve() reads. Otherwise they are stored already.
+
+        @type  test_number: int
+        @param test_number: Test number that crashed the target
+
+        @rtype:  int
+        @return: Number of packets saved, None when not capturing into a ring
+        """
+
+        if not self.ring:
+            return None
+
+        packets = [packet[1:] for packet in self.ring.window(test_number, before=self.window)]
+        self.store.append(test_number, packets)
+
+        self.log("saved %d packets around test case #%d" % (len(packets), test_number))
+        return len(packets)
+
+    def export (self, test_numbers, filename):
+        """
+        Bulk export the captures of a set of test cases, ie: every crashing test case, into a single pcapng file.
+
+        @type  test_numbers: list
+        @param test_numbers: Test numbers to export
+        @type  filename:     str
+        @param filename:     Name of the pcapng file to write, relative to the log path
+
+        @rtype:  int
+        @return: Number of test cases exported
+        """
+
+        filename = os.path.join(self.log_path, filename)
+        exported = self.store.export(test_numbers, filename)
+
+        self.log("exported %d test cases to %s" % (exported, filename))
+        return exported
+
+    def retrieve (self, test_number, offset=0, length=None):
+        """
+        Return the raw binary contents of the capture saved for the specified test case number. Large captures can be
+        pulled in chunks with offset and length, a short read marks the end of the capture.
 
         @type  test_number: int
         @param test_number: Test number to retrieve PCAP for.
+        @type  offset:      int
+        @param offset:      (Optional, def=0) Offset into the capture
+        @type  length:      int
+        @param length:      (Optional, def=None) Maximum number of bytes to return, None for the rest of the capture
         """
 
-        self.log("retrieving PCAP for test case #%d" % test_number)
+        self.log("retrieving PCAP for test case #%d" % test_number, 1 if not offset else 10)
+
+        if test_number in self.store.index:
+            return self.store.read(test_number, offset, length)
 
+        # captures saved before the store existed are a pcap per test case.
         pcap_log_path = "%s/%d.pcap" % (self.log_path, test_number)
         fh            = open(pcap_log_path, "rb")
-        data          = fh.read()
+        fh.seek(offset)
+        data          = fh.read() if length is None else fh.read(length)
         fh.close()
 
         return data
@@ -215,9 +300,29 @@ class NetworkMonitorPedrpcServer (pedrpc.Server):
         self.log("updating PCAP filter to '%s'" % new_filter)
         self.filter = new_filter
 
+        # the ring capture is long lived, apply the filter to it right away.
+        if self.ring:
+            self.pcap.setfilter(self.filter)
+
+    def start_ring (self):
+        """
+        Open the capture device once and start the capture thread feeding the ring.
+        """
+
+        self.log("starting continuous capture into a %d byte ring" % self.ring_size)
+
+        self.pcap = pcapy.open_live(self.device, -1, 1, 100)
+        self.pcap.setfilter(self.filter)
+        self.store.linktype = self.pcap.datalink()
+
+        self.ring        = pcap_ring.ring(self.ring_size)
+        self.pcap_thread = pcap_ring.capture_thread(self.pcap, self.ring)
+        self.pcap_thread.start()
+
     def set_log_path (self, new_log_path):
         self.log("updating log path to '%s'" % new_log_path)
         self.log_path = new_log_path
+        self.store    = pcap_store.store(self.log_path, self.store.linktype)
 
 
 ########################################################################################################################
@@ -230,7 +335,8 @@ if __name__ == "__main__":
 
     # parse command line options.
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "d:f:P:l:", ["device=", "filter=", "log_path=", "log_level=", "port="])
+        opts, args = getopt.getopt(sys.argv[1:], "d:f:P:l:r:w:",
+                                   ["device=", "filter=", "log_path=", "log_level=", "port=", "ring=", "window="])
     except getopt.GetoptError:
         log_error(usage_message)
 
@@ -238,6 +344,8 @@ if __name__ == "__main__":
     pcap_filter = ""
     log_path    = "./"
     log_level   = 1
+    ring_size   = 0
+    window      = 1
 
     for opt, arg in opts:
         if opt in ("-d", "--device"):
@@ -250,12 +358,17 @@ if __name__ == "__main__":
             log_level = int(arg)
         if opt in "--port":
             rpc_port = int(arg)
+        if opt in ("-r", "--ring"):
+            ring_size = int(arg) * 1024 * 1024
+        if opt in ("-w", "--window"):
+            window = int(arg)
 
     if not device:
         log_error(usage_message)
 
     try:
-        servlet = NetworkMonitorPedrpcServer("0.0.0.0", rpc_port, device, pcap_filter, log_path, log_level)
+        servlet = NetworkMonitorPedrpcServer("0.0.0.0", rpc_port, device, pcap_filter, log_path, log_level,
+                                             ring_size, window)
         t = threading.Thread(target=servlet.serve_forever)
         t.daemon = True
         t.start()
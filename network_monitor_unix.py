@@ -7,6 +7,8 @@ import sys
 import os
 
 from sulley import pedrpc
+from utils import pcap_ring
+from utils import pcap_store
 
 import pcapy
 import impacket
@@ -18,8 +20,11 @@ ERR   = lambda msg: sys.stderr.write("ERR> " + msg + "\n") or sys.exit(1)
 USAGE = "USAGE: network_monitor.py"                                                                \
         "\n    <-d|--device DEVICE #>    device to sniff on (see list below)"                      \
         "\n    [-f|--filter PCAP FILTER] BPF filter string"                                        \
-        "\n    [-P|--log_path PATH]      log directory to store pcaps to"                          \
+        "\n    [-P|--log_path PATH]      directory of the pcapng store"                          \
         "\n    [-l|--log_level LEVEL]    log level (default 1), increase for more verbosity"       \
+        "\n    [-r|--ring MB]            capture continuously into a ring of MB megabytes and only"  \
+        "\n                              save the pcaps of test cases that crashed"                 \
+        "\n    [-w|--window N]           with -r, also save the N test cases before a crash"         \
         "\n    [--port PORT]             TCP port to bind this agent to"                           \
         "\n\nNetwork Device List:\n"
 
@@ -52,12 +57,12 @@ for dev in pcapy.findalldevs():
 
 ########################################################################################################################
 class pcap_thread (threading.Thread):
-    def __init__ (self, network_monitor, pcap, pcap_save_path):
+    def __init__ (self, network_monitor, pcap):
         self.network_monitor = network_monitor
         self.pcap            = pcap
 
         self.decoder         = None
-        self.dumper          = self.pcap.dump_open(pcap_save_path)
+        self.packets         = []       # (seconds, microseconds, length, data) for the pcapng store.
         self.active          = True
         self.data_bytes      = 0
 
@@ -73,8 +78,9 @@ class pcap_thread (threading.Thread):
 
 
     def packet_handler (self, header, data):
-        # add the captured data to the PCAP.
-        self.dumper.dump(header, data)
+        # hold on to the captured data until the test case is stored.
+        seconds, useconds = header.getts()
+        self.packets.append((seconds, useconds, header.getlen(), data))
 
         # increment the captured byte count.
         self.data_bytes += len(data)
@@ -91,7 +97,7 @@ class pcap_thread (threading.Thread):
 
 ########################################################################################################################
 class network_monitor_pedrpc_server (pedrpc.server):
-    def __init__ (self, host, port, device, filter="", log_path="./", log_level=1):
+    def __init__ (self, host, port, device, filter="", log_path="./", log_level=1, ring_size=0, window=1):
         '''
         @type  host:        String
         @param host:        Hostname or IP address to bind server to
@@ -105,6 +111,11 @@ class network_monitor_pedrpc_server (pedrpc.server):
         @param log_path:    (Optional, def="./") Path to save recorded PCAPs to
         @type  log_level:   Integer
         @param log_level:   (Optional, def=1) Log output level, increase for more verbosity
+        @type  ring_size:   Integer
+        @param ring_size:   (Optional, def=0) Capture continuously into a ring of this many bytes, 0 for a capture
+                            and a pcap per test case
+        @type  window:      Integer
+        @param window:      (Optional, def=1) Number of test cases before a crash to save along with it
         '''
 
         # initialize the PED-RPC server.
@@ -117,17 +128,25 @@ class network_monitor_pedrpc_server (pedrpc.server):
 
         self.pcap        = None
         self.pcap_thread = None
+        self.store       = None
+        self.test_number = None
+        self.ring        = None
+        self.ring_size   = ring_size
+        self.window      = window
 
         # ensure the log path is valid.
         if not os.access(self.log_path, os.X_OK):
             self.log("invalid log path: %s" % self.log_path)
             raise Exception
 
+        self.store = pcap_store.store(self.log_path)
+
         self.log("Network Monitor PED-RPC server initialized:")
         self.log("\t device:    %s" % self.device)
         self.log("\t filter:    %s" % self.filter)
         self.log("\t log path:  %s" % self.log_path)
         self.log("\t log_level: %d" % self.log_level)
+        self.log("\t ring:      %d bytes" % self.ring_size)
         self.log("Awaiting requests...")
 
 
@@ -160,12 +179,19 @@ class network_monitor_pedrpc_server (pedrpc.server):
         @return: Number of bytes captured in PCAP thread.
         '''
 
-        # grab the number of recorded bytes.
+        # in ring mode the capture keeps running, just close off the test case.
+        if self.ring:
+            return self.ring.mark_end()
+
+        # grab the number of recorded bytes and the packets.
         data_bytes = self.pcap_thread.data_bytes
+        packets    = list(self.pcap_thread.packets)
 
         # stop the packet capture thread.
         self.__stop()
 
+        self.store.append(self.test_number, packets)
+
         self.log("stopped PCAP thread, snagged %d bytes of data" % data_bytes)
         return data_bytes
 
@@ -175,15 +201,24 @@ class network_monitor_pedrpc_server (pedrpc.server):
         This routine is called before the fuzzer transmits a test case and spin off a packet capture thread.
         '''
 
+        if self.ring_size:
+            if not self.ring:
+                self.start_ring()
+
+            self.log("marking start of test case #%d" % test_number, 10)
+            self.ring.mark_start(test_number)
+            return
+
         self.log("initializing capture for test case #%d" % test_number)
 
         # open the capture device and set the BPF filter.
         self.pcap = pcapy.open_live(self.device, 65536, 1, 100)
         self.pcap.setfilter(self.filter)
+        self.store.linktype = self.pcap.datalink()
+        self.test_number    = test_number
 
         # instantiate the capture thread.
-        pcap_log_path = "%s/%d.pcap" % (self.log_path, test_number)
-        self.pcap_thread = pcap_thread(self, self.pcap, pcap_log_path)
+        self.pcap_thread = pcap_thread(self, self.pcap)
         self.pcap_thread.start()
 
 
@@ -199,19 +234,71 @@ class network_monitor_pedrpc_server (pedrpc.server):
             print "[%s] %s" % (time.strftime("%I:%M.%S"), msg)
 
 
-    def retrieve (self, test_number):
+    def persist (self, test_number):
+        '''
+        Called by the fuzzer when a test case crashed the target. In ring mode, save the packets of the test case and
+        the window of test cases before it to the pcapng store retrieve() reads. Otherwise they are stored already.
+
+        @type  test_number: Integer
+        @param test_number: Test number that crashed the target
+
+        @rtype:  Integer
+        @return: Number of packets saved, None when not capturing into a ring
+        '''
+
+        if not self.ring:
+            return None
+
+        packets = [packet[1:] for packet in self.ring.window(test_number, before=self.window)]
+        self.store.append(test_number, packets)
+
+        self.log("saved %d packets around test case #%d" % (len(packets), test_number))
+        return len(packets)
+
+
+    def export (self, test_numbers, filename):
+        '''
+        Bulk export the captures of a set of test cases, ie: every crashing test case, into a single pcapng file.
+
+        @type  test_numbers: list
+        @param test_numbers: Test numbers to export
+        @type  filename:     String
+        @param filename:     Name of the pcapng file to write, relative to the log path
+
+        @rtype:  Integer
+        @return: Number of test cases exported
+        '''
+
+        filename = os.path.join(self.log_path, filename)
+        exported = self.store.export(test_numbers, filename)
+
+        self.log("exported %d test cases to %s" % (exported, filename))
+        return exported
+
+
+    def retrieve (self, test_number, offset=0, length=None):
         '''
-        Return the raw binary contents of the PCAP saved for the specified test case number.
+        Return the raw binary contents of the capture saved for the specified test case number. Large captures can be
+        pulled in chunks with offset and length, a short read marks the end of the capture.
 
         @type  test_number: Integer
         @param test_number: Test number to retrieve PCAP for.
+        @type  offset:      Integer
+        @param offset:      (Optional, def=0) Offset into the capture
+        @type  length:      Integer
+        @param length:      (Optional, def=None) Maximum number of bytes to return, None for the rest of the capture
         '''
 
-        self.log("retrieving PCAP for test case #%d" % test_number)
+        self.log("retrieving PCAP for test case #%d" % test_number, 1 if not offset else 10)
+
+        if test_number in self.store.index:
+            return self.store.read(test_number, offset, length)
 
+        # captures saved before the store existed are a pcap per test case.
         pcap_log_path = "%s/%d.pcap" % (self.log_path, test_number)
         fh            = open(pcap_log_path, "rb")
-        data          = fh.read()
+        fh.seek(offset)
+        data          = fh.read() if length is None else fh.read(length)
         fh.close()
 
         return data
@@ -222,11 +309,32 @@ class network_monitor_pedrpc_server (pedrpc.server):
 
         self.filter = filter
 
+        # the ring capture is long lived, apply the filter to it right away.
+        if self.ring:
+            self.pcap.setfilter(self.filter)
+
+
+    def start_ring (self):
+        '''
+        Open the capture device once and start the capture thread feeding the ring.
+        '''
+
+        self.log("starting continuous capture into a %d byte ring" % self.ring_size)
+
+        self.pcap = pcapy.open_live(self.device, 65536, 1, 100)
+        self.pcap.setfilter(self.filter)
+        self.store.linktype = self.pcap.datalink()
+
+        self.ring        = pcap_ring.ring(self.ring_size)
+        self.pcap_thread = pcap_ring.capture_thread(self.pcap, self.ring)
+        self.pcap_thread.start()
+
 
     def set_log_path (self, log_path):
         self.log("updating log path to '%s'" % log_path)
 
         self.log_path = log_path
+        self.store    = pcap_store.store(self.log_path, self.store.linktype)
 
 
 ########################################################################################################################
@@ -234,7 +342,7 @@ class network_monitor_pedrpc_server (pedrpc.server):
 if __name__ == "__main__":
     # parse command line options.
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "d:f:P:l:", ["device=", "filter=", "log_path=", "log_level=", "port="])
+        opts, args = getopt.getopt(sys.argv[1:], "d:f:P:l:r:w:", ["device=", "filter=", "log_path=", "log_level=", "port=", "ring=", "window="])
     except getopt.GetoptError:
         ERR(USAGE)
 
@@ -242,6 +350,8 @@ if __name__ == "__main__":
     filter    = ""
     log_path  = "./"
     log_level = 1
+    ring_size = 0
+    window    = 1
 
     for opt, arg in opts:
         if opt in ("-d", "--device"):     device    = IFS[int(arg)]
@@ -249,12 +359,15 @@ if __name__ == "__main__":
         if opt in ("-P", "--log_path"):   log_path  = arg
         if opt in ("-l", "--log_level"):  log_level = int(arg)
         if opt in ("--port"):             PORT      = int(arg)
+        if opt in ("-r", "--ring"):       ring_size = int(arg) * 1024 * 1024
+        if opt in ("-w", "--window"):     window    = int(arg)
 
     if not device:
         ERR(USAGE)
 
     try:
-        servlet = network_monitor_pedrpc_server("0.0.0.0", PORT, device, filter, log_path, log_level)
+        servlet = network_monitor_pedrpc_server("0.0.0.0", PORT, device, filter, log_path, log_level, ring_size,
+                                                window)
         servlet.serve_forever()
     except:
         pass
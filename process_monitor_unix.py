@@ -2,12 +2,18 @@
 
 import os
 import sys
+import fcntl
 import getopt
+import select
+import shlex
+import shutil
 import signal
+import struct
 import time
 import threading
 
 from sulley import pedrpc
+from sulley import readiness
 
 '''
 By nnp
@@ -16,7 +22,8 @@ http://www.unprotectedhex.com
 This intended as a basic replacement for Sulley's process_monitor.py on *nix.
 The below options are accepted. Crash details are limited to the signal that
 caused the death and whatever operating system supported mechanism is in place (i.e
-core dumps)
+core dumps). Children are watched through SIGCHLD, a crash is recorded the moment
+it happens and can be waited on with wait_for_crash().
 
 Replicated methods:
     - alive
@@ -27,37 +34,81 @@ Replicated methods:
     - stop_target
     - set_start_commands
     - set_stop_commands
+    - set_readiness
+    - wait_for_crash
 
 Limitations
     - Cannot attach to an already running process
-    - Currently only accepts one start_command
+    - Fork server mode (-f) needs a target carrying an AFL compatible fork
+      server, an afl-gcc/afl-clang build, or the LD_PRELOAD stand-in in
+      utils/forkserver_preload.c loaded with --preload. Otherwise it falls
+      back to spawning the target for every start
     - Limited 'crash binning'. Relies on the availability of core dumps. These
       should be created in the same directory the process is ran from on Linux
       and in the (hidden) /cores directory on OS X. On OS X you have to add 
       the option COREDUMPS=-YES- to /etc/hostconfig and then `ulimit -c
-      unlimited` as far as I know. A restart may be required. The file
-      specified by crash_bin will any other available details such as the test
-      that caused the crash and the signal received by the program
+      unlimited` as far as I know. A restart may be required. Cores are
+      collected in the background and, with -d, moved to a directory of
+      their own. The file specified by crash_bin will any other available
+      details such as the test that caused the crash, the signal received by
+      the program and the path of its core
 '''
 
 USAGE = "USAGE: process_monitor_unix.py"\
         "\n    -c|--crash_bin             File to record crash info too" \
         "\n    [-P|--port PORT]             TCP port to bind this agent too"\
-        "\n    [-l|--log_level LEVEL]       log level (default 1), increase for more verbosity"
+        "\n    [-l|--log_level LEVEL]       log level (default 1), increase for more verbosity"\
+        "\n    [-f|--forkserver]            restart the target by forking an AFL style fork server"\
+        "\n    [--preload LIB]              LD_PRELOAD a stand-in fork server, see utils/forkserver_preload.c"\
+        "\n    [-d|--core_dir DIR]          directory to collect core files in"
 
 ERR   = lambda msg: sys.stderr.write("ERR> " + msg + "\n") or sys.exit(1)
 
+# signal number -> name, aliases are listed first so the canonical names (SIGABRT over SIGIOT) win.
+SIGNALS = dict((getattr(signal, name), name) for name in sorted(dir(signal), reverse=True)
+               if name.startswith("SIG") and "_" not in name)
+
+
+def core_candidates(child):
+    '''
+    Where the core file of a crashed child may show up, following /proc/sys/kernel/core_pattern when there is one.
+
+    @type  child: debugger_thread
+    @param child: Child that dumped core
+
+    @rtype:  List
+    @return: Candidate paths, empty if cores are piped to a helper such as apport or systemd-coredump
+    '''
+
+    candidates = ["core", "core.%d" % child.pid, "/cores/core.%d" % child.pid]
+
+    try:
+        pattern = open("/proc/sys/kernel/core_pattern").read().strip()
+    except IOError:
+        return candidates
+
+    if pattern.startswith("|"):
+        return []
+
+    for spec, value in (("%p", str(child.pid)), ("%e", os.path.basename(child.tokens[0])[:15]), ("%%", "%")):
+        pattern = pattern.replace(spec, value)
+
+    # the kernel appends the pid unless the pattern asks for it.
+    if "%" not in pattern:
+        candidates.insert(0, pattern)
+
+    return candidates
+
 
 class debugger_thread:
     def __init__(self, start_command):
         '''
-        This class isn't actually ran as a thread, only the start_monitoring
-        method is. It can spawn/stop a process, wait for it to exit and report on
-        the exit status/code.
+        Spawns/stops a process and reports on its exit status/code. The process is reaped lazily with
+        waitpid(WNOHANG) whenever its liveness is checked, so no thread has to block on it.
         '''
         
         self.start_command = start_command
-        self.tokens = start_command.split(' ')
+        self.tokens = shlex.split(start_command)
         self.cmd_args = []
         self.pid = None
         self.exit_status = None
@@ -66,35 +117,250 @@ class debugger_thread:
     def spawn_target(self):
         print self.tokens
         self.pid = os.spawnv(os.P_NOWAIT, self.tokens[0], self.tokens)
+        self.exit_status = None
         self.alive = True
-        
-    def start_monitoring(self):
+
+    def reap(self, options=os.WNOHANG):
         '''
-        self.exit_status = os.waitpid(self.pid, os.WNOHANG | os.WUNTRACED)
-        while self.exit_status == (0, 0):                    
-            self.exit_status = os.waitpid(self.pid, os.WNOHANG | os.WUNTRACED)
+        Collect the exit status of the target process if it has exited.
+
+        @type  options: Integer
+        @param options: (Optional, def=os.WNOHANG) Options to waitpid, 0 blocks until the process exits
         '''
-        
-        self.exit_status = os.waitpid(self.pid, 0)
-        # [0] is the pid
-        self.exit_status = self.exit_status[1]
-            
-        self.alive = False
+
+        try:
+            pid, status = os.waitpid(self.pid, options)
+        except OSError:
+            # already reaped elsewhere, the exit status is lost.
+            pid, status = self.pid, 0
+
+        if pid:
+            self.exit_status = status
+            self.alive = False
 
     def get_exit_status(self):
         return self.exit_status
 
     def stop_target(self):
         os.kill(self.pid, signal.SIGKILL)
-        self.alive = False
+        self.reap(0)
+
+    def shutdown(self):
+        '''
+        Release anything held across restarts. Nothing to do for a plain spawned process.
+        '''
+
+        pass
 
     def isAlive(self):
+        if self.alive:
+            self.reap()
+
         return self.alive
 
+
+class forkserver(debugger_thread):
+    '''
+    Launches the target through an AFL style fork server. The binary is started once and runs its initialization up
+    to the point the fork server was placed, typically just before its accept loop, then parks. Every later start
+    asks the parked image to fork, which skips the initialization entirely.
+
+    The fork server itself lives in the target: an afl-gcc/afl-clang instrumented build, or the LD_PRELOAD stand-in
+    in utils/forkserver_preload.c implementing the same protocol. Two pipes connect us to it: we write 4 bytes to its
+    control descriptor (FORKSRV_FD) to request a child, it answers on its status descriptor (FORKSRV_FD + 1) with the
+    child pid and, once that child exits, with its waitpid() status.
+    '''
+
+    FORKSRV_FD = 198
+
+    def __init__(self, start_command, timeout=10, preload=None):
+        '''
+        @type  start_command: String
+        @param start_command: Command line of the target
+        @type  timeout:       Integer
+        @param timeout:       (Optional, def=10) Seconds to wait on the fork server for each reply
+        @type  preload:       String
+        @param preload:       (Optional, def=None) Shared library carrying the fork server, LD_PRELOADed into the target
+        '''
+
+        debugger_thread.__init__(self, start_command)
+
+        self.timeout    = timeout
+        self.preload    = preload
+        self.server_pid = None
+        self.ctl_fd     = None
+        self.st_fd      = None
+        self.fallback   = False
+
+    def read_status(self, timeout):
+        '''
+        Read one 4 byte reply from the fork server.
+
+        @rtype:  Integer
+        @return: Reply, or None if the fork server did not answer in time or went away
+        '''
+
+        readable, _, _ = select.select([self.st_fd], [], [], timeout)
+
+        if not readable:
+            return None
+
+        data = ""
+        while len(data) < 4:
+            chunk = os.read(self.st_fd, 4 - len(data))
+            if not chunk:
+                return None
+
+            data += chunk
+
+        return struct.unpack("i", data)[0]
+
+    def start_server(self):
+        '''
+        Start the target binary and wait for its fork server to say hello.
+
+        @rtype:  Boolean
+        @return: True if the fork server is up, False if the target does not speak the protocol
+        '''
+
+        ctl_read, ctl_write = os.pipe()
+        st_read,  st_write  = os.pipe()
+
+        pid = os.fork()
+
+        if not pid:
+            try:
+                os.dup2(ctl_read, self.FORKSRV_FD)
+                os.dup2(st_write, self.FORKSRV_FD + 1)
+
+                for fd in (ctl_read, ctl_write, st_read, st_write):
+                    os.close(fd)
+
+                if self.preload:
+                    os.environ["LD_PRELOAD"] = self.preload
+
+                os.execv(self.tokens[0], self.tokens)
+            finally:
+                os._exit(127)
+
+        os.close(ctl_read)
+        os.close(st_write)
+
+        self.server_pid = pid
+        self.ctl_fd     = ctl_write
+        self.st_fd      = st_read
+
+        if self.read_status(self.timeout) is None:
+            self.shutdown()
+            return False
+
+        return True
+
+    def spawn_target(self, retry=True):
+        '''
+        Ask the fork server for a fresh child, starting the server first if it is not up.
+
+        @type  retry: Boolean
+        @param retry: (Optional, def=True) Start the fork server over if it went away, once
+        '''
+
+        if self.fallback:
+            return debugger_thread.spawn_target(self)
+
+        # the fork server only takes a new request once the previous child is gone.
+        if self.alive:
+            self.stop_target()
+
+        if not self.server_pid and not self.start_server():
+            print "[!] no fork server answered, falling back to spawning %s" % self.tokens[0]
+            self.fallback = True
+            return debugger_thread.spawn_target(self)
+
+        pid = None
+
+        try:
+            os.write(self.ctl_fd, struct.pack("i", 0))
+            pid = self.read_status(self.timeout)
+        except OSError:
+            pass
+
+        # the fork server went away, start it over once. if that one fails too, stop relying on it.
+        if not pid:
+            self.shutdown()
+
+            if retry:
+                return self.spawn_target(retry=False)
+
+            print "[!] fork server keeps failing, falling back to spawning %s" % self.tokens[0]
+            self.fallback = True
+            return debugger_thread.spawn_target(self)
+
+        self.pid = pid
+        self.exit_status = None
+        self.alive = True
+
+    def reap(self, options=os.WNOHANG):
+        if self.fallback:
+            return debugger_thread.reap(self, options)
+
+        # the target is a child of the fork server, which reports its exit status to us.
+        status = self.read_status(None if options == 0 else 0)
+
+        if status is not None:
+            self.exit_status = status
+            self.alive = False
+        elif not self.server_alive():
+            self.exit_status = 0
+            self.alive = False
+
+    def server_alive(self):
+        if not self.server_pid:
+            return False
+
+        try:
+            pid, status = os.waitpid(self.server_pid, os.WNOHANG)
+        except OSError:
+            pid = self.server_pid
+
+        if pid:
+            self.server_pid = None
+            self.shutdown()
+            return False
+
+        return True
+
+    def stop_target(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+        self.reap(0)
+
+    def shutdown(self):
+        '''
+        Kill the parked fork server and close the pipes to it.
+        '''
+
+        if self.server_pid:
+            try:
+                os.kill(self.server_pid, signal.SIGKILL)
+                os.waitpid(self.server_pid, 0)
+            except OSError:
+                pass
+
+        for fd in (self.ctl_fd, self.st_fd):
+            if fd is not None:
+                os.close(fd)
+
+        self.server_pid = None
+        self.ctl_fd     = None
+        self.st_fd      = None
+
 ########################################################################################################################
 
 class nix_process_monitor_pedrpc_server(pedrpc.Server):
-    def __init__(self, host, port, crash_bin, log_level=1):
+    def __init__(self, host, port, crash_bin, log_level=1, forkserver=False, core_dir=None, preload=None):
         '''
         @type host: String
         @param host: Hostname or IP address
@@ -102,13 +368,51 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
         @param port: Port to bind server to
         @type crash_bin: String
         @param crash_bin: Where to save monitored process crashes for analysis
+        @type forkserver: Boolean
+        @param forkserver: (Optional, def=False) Launch the target through its fork server, see forkserver
+        @type core_dir: String
+        @param core_dir: (Optional, def=None) Directory to move collected core files to, left in place if None
+        @type preload: String
+        @param preload: (Optional, def=None) Stand-in fork server library to LD_PRELOAD into the target in fork
+                        server mode, see utils/forkserver_preload.c
         
         '''
         
         pedrpc.Server.__init__(self, host, port)
         self.crash_bin = crash_bin
+        self.crash_file = open(crash_bin, 'a')
+        self.core_dir = core_dir
         self.log_level = log_level
-        self.dbg = None
+        self.children = []
+        self.events = []
+        self.stopping = False
+        self.forkserver = forkserver
+        self.preload = preload
+        self.readiness = []
+        self.ready_timeout = 30
+        self.test_number = 0
+        self.last_synopsis = ""
+        self.start_commands = []
+        self.stop_commands = []
+
+        # every reap, spawn and kill of a child happens under this lock, crashes are announced through it.
+        self.lock = threading.Condition()
+        self.bin_lock = threading.Lock()
+
+        # SIGCHLD wakes the monitor thread through a self-pipe. restart interrupted system calls so the PED-RPC
+        # server doesn't notice the signal.
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        for fd in (self.wakeup_r, self.wakeup_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.siginterrupt(signal.SIGCHLD, False)
+        signal.set_wakeup_fd(self.wakeup_w)
+
+        monitor = threading.Thread(target=self.monitor)
+        monitor.daemon = True
+        monitor.start()
+
         self.log("Process Monitor PED-RPC server initialized:")
         self.log("Listening on %s:%s" % (host, port))
         self.log("awaiting requests...")
@@ -131,6 +435,137 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
         if self.log_level >= level:
             print "[%s] %s" % (time.strftime("%I:%M.%S"), msg)
 
+    def monitor (self):
+        '''
+        Monitor thread. Sleeps until SIGCHLD arrives or a fork server reports on a child and records a crash the
+        moment a child dies, attributed to the test case in flight.
+        '''
+
+        while 1:
+            with self.lock:
+                fds = [self.wakeup_r] + [child.st_fd for child in self.children
+                                        if getattr(child, "st_fd", None) is not None]
+
+            try:
+                readable, _, _ = select.select(fds, [], [], 1)
+            except (select.error, OSError):
+                # interrupted, or a fork server pipe was closed under us.
+                continue
+
+            if self.wakeup_r in readable:
+                try:
+                    while os.read(self.wakeup_r, 512):
+                        pass
+                except OSError:
+                    pass
+
+            with self.lock:
+                for child in self.children:
+                    if not child.alive:
+                        continue
+
+                    child.reap()
+
+                    if not child.alive and not self.stopping:
+                        self.record_crash(child)
+
+    def record_crash (self, child):
+        '''
+        Record the death of a child in the crash bin and wake up anyone waiting on a crash. Called with the lock held.
+
+        @type  child: debugger_thread
+        @param child: Child that died
+        '''
+
+        exit_status = child.get_exit_status()
+
+        if os.WIFSIGNALED(exit_status):
+            signum = os.WTERMSIG(exit_status)
+            reason = 'Terminated with signal %d (%s)' % (signum, SIGNALS.get(signum, "unknown"))
+
+            if os.WCOREDUMP(exit_status):
+                reason += ', core dumped'
+        elif os.WIFEXITED(exit_status):
+            reason = 'Exit with code - ' + str(os.WEXITSTATUS(exit_status))
+        else:
+            reason = 'Process died for unknown reason'
+
+        synopsis = '[%s] Crash : Test - %d Reason - %s Pid - %d Command - %s\n' % \
+            (time.strftime("%I:%M.%S"), self.test_number, reason, child.pid, child.start_command)
+
+        self.log("test case %d crashed pid %d: %s" % (self.test_number, child.pid, reason))
+        self.write_crash_bin(synopsis)
+
+        self.events.append(synopsis)
+        self.lock.notify_all()
+
+        if os.WIFSIGNALED(exit_status) and os.WCOREDUMP(exit_status):
+            collector = threading.Thread(target=self.collect_core, args=(self.test_number, child))
+            collector.daemon = True
+            collector.start()
+
+    def write_crash_bin (self, line):
+        with self.bin_lock:
+            self.crash_file.write(line)
+            self.crash_file.flush()
+
+    def collect_core (self, test_number, child, timeout=30):
+        '''
+        Wait for the core file of a crashed child to be written out and file it away, off the monitor thread so
+        crash detection never waits on the disk.
+
+        @type  test_number: Integer
+        @param test_number: Test case the child crashed on
+        @type  child:       debugger_thread
+        @param child:       Child that dumped core
+        @type  timeout:     Integer
+        @param timeout:     (Optional, def=30) Seconds to wait for the core file to appear and stop growing
+        '''
+
+        candidates = core_candidates(child)
+        died       = time.time() - 1
+
+        if not candidates:
+            self.log("cores are piped to a helper, not collecting core of pid %d" % child.pid)
+            return
+
+        sizes = {}
+        found = []
+
+        def written ():
+            for path in candidates:
+                try:
+                    # skip over cores left behind by earlier crashes.
+                    if os.path.getmtime(path) < died:
+                        continue
+
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+
+                # the kernel is done writing once the size stops changing between two polls.
+                if size and sizes.get(path) == size:
+                    found.append(path)
+                    return True
+
+                sizes[path] = size
+
+            return False
+
+        if not readiness.wait_ready(readiness.callback(written), timeout=timeout, delay=0.25):
+            self.log("no core file found for pid %d in: %s" % (child.pid, ", ".join(candidates)))
+            return
+
+        path = found[0]
+
+        if self.core_dir:
+            destination = os.path.join(self.core_dir, "core.%d.%d" % (test_number, child.pid))
+            shutil.move(path, destination)
+            path = destination
+
+        self.log("collected core of pid %d: %s" % (child.pid, path))
+        self.write_crash_bin('[%s] Core : Test - %d Path - %s\n' % (time.strftime("%I:%M.%S"), test_number, path))
+
     def post_send (self):
         '''
         This routine is called after the fuzzer transmits a test case and returns the status of the target.
@@ -139,25 +574,14 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
         @return: Return True if the target is still active, False otherwise.
         '''
 
-        if not self.dbg.isAlive():
-            exit_status = self.dbg.get_exit_status()
-            rec_file = open(self.crash_bin, 'a')
-            if os.WCOREDUMP(exit_status):
-                reason = 'Segmentation fault'
-            elif os.WIFSTOPPED(exit_status):
-                reason = 'Stopped with signal ' + str(os.WTERMSIG(exit_status))
-            elif os.WIFSIGNALED(exit_status):
-                reason = 'Terminated with signal ' + str(os.WTERMSIG(exit_status))
-            elif os.WIFEXITED(exit_status):
-                reason = 'Exit with code - ' + str(os.WEXITSTATUS(exit_status))
-            else:
-                reason = 'Process died for unknown reason'
-                
-            self.last_synopsis = '[%s] Crash : Test - %d Reason - %s\n' % (time.strftime("%I:%M.%S"), self.test_number, reason)
-            rec_file.write(self.last_synopsis)
-            rec_file.close()
-
-        return self.dbg.isAlive()
+        with self.lock:
+            events, self.events = self.events, []
+            alive = all(child.alive for child in self.children)
+
+        if events:
+            self.last_synopsis = "".join(events)
+
+        return alive and not events
 
     def pre_send (self, test_number):
         '''
@@ -167,54 +591,105 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
         @type  test_number: Integer
         @param test_number: Test number to retrieve PCAP for.
         '''
-        if self.dbg == None:
+        if not self.children:
             self.start_target()
             
         self.log("pre_send(%d)" % test_number, 10)
         self.test_number = test_number
 
+    def wait_for_crash (self, timeout):
+        '''
+        Block until a child dies or the timeout expires, whichever comes first. Lets the fuzzer learn about a crash
+        as it happens instead of sitting out a fixed delay before calling post_send().
+
+        @type  timeout: Float
+        @param timeout: Seconds to wait
+
+        @rtype:  Boolean
+        @return: True if a crash is pending for post_send() to report, False otherwise
+        '''
+
+        deadline = time.time() + timeout
+
+        with self.lock:
+            while not self.events:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+                self.lock.wait(remaining)
+
+            return bool(self.events)
+
     def start_target (self):
         '''
-        Start up the target process by issuing the commands in self.start_commands.
+        Start up the target processes by issuing the commands in self.start_commands.
         '''
 
         self.log("starting target process")
-        
-        self.dbg = debugger_thread(self.start_commands[0])
-        self.dbg.spawn_target()
-        # prevent blocking by spawning off another thread to waitpid
-        threading.Thread(target=self.dbg.start_monitoring).start()
-        self.log("done. target up and running, giving it 5 seconds to settle in.")
-        time.sleep(5)
+
+        # mark where the probes start looking before the target gets a chance to log its ready line.
+        for probe in self.readiness:
+            probe.reset()
+
+        with self.lock:
+            # fork servers are kept across restarts, that's the whole point of them.
+            if not self.forkserver or [child.start_command for child in self.children] != self.start_commands:
+                for child in self.children:
+                    child.shutdown()
+
+                if self.forkserver:
+                    self.children = [forkserver(command, preload=self.preload) for command in self.start_commands]
+                else:
+                    self.children = [debugger_thread(command) for command in self.start_commands]
+
+            for child in self.children:
+                child.spawn_target()
+
+        if self.readiness:
+            self.log("done. target up and running, waiting for it to become ready.")
+            if not readiness.wait_ready(self.readiness, timeout=self.ready_timeout, reset=False):
+                self.log("target not ready after %d seconds" % self.ready_timeout)
+        else:
+            self.log("done. target up and running.")
+
+        with self.lock:
+            return all(child.alive for child in self.children)
 
     def stop_target (self):
         '''
-        Kill the current debugger thread and stop the target process by issuing the commands in self.stop_commands.
+        Stop the target processes by issuing the commands in self.stop_commands. Deaths caused by the stop commands
+        aren't crashes.
         '''
 
-        # give the debugger thread a chance to exit.
-        time.sleep(1)
-
         self.log("stopping target process")
-
-        for command in self.stop_commands:
-            if command == "TERMINATE_PID":
-                self.dbg.stop_target()
-            else:
-                os.system(command)
+        self.stopping = True
+
+        try:
+            for command in self.stop_commands:
+                if command == "TERMINATE_PID":
+                    with self.lock:
+                        for child in self.children:
+                            if child.alive:
+                                child.stop_target()
+                else:
+                    os.system(command)
+
+            # give the monitor thread a chance to reap the processes.
+            dead = readiness.callback(lambda: not [child for child in self.children if child.alive])
+            if not readiness.wait_ready(dead, timeout=5):
+                self.log("target process still alive after stop commands")
+        finally:
+            self.stopping = False
 
     def set_start_commands (self, start_commands):
         '''
-        We expect start_commands to be a list with one element for example
-        ['/usr/bin/program arg1 arg2 arg3']
+        We expect start_commands to be a list with one element per process to start and monitor, for example
+        ['/usr/bin/program arg1 arg2 arg3', '/usr/bin/helper']
         '''
 
-        if len(start_commands) > 1:
-            self.log("This process monitor does not accept > 1 start command")
-            return
-
         self.log("updating start commands to: %s" % start_commands)
-        self.start_commands = start_commands
+        self.start_commands = list(start_commands)
 
 
     def set_stop_commands (self, stop_commands):
@@ -222,6 +697,27 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
 
         self.stop_commands = stop_commands
 
+    def set_readiness (self, probes, timeout=30):
+        '''
+        Probes start_target() waits on before returning, see sulley.readiness. Without probes start_target() returns
+        as soon as the process is spawned and leaves the waiting to the session.
+        '''
+
+        self.log("updating readiness probes to: %s" % probes)
+
+        self.readiness = probes
+        self.ready_timeout = timeout
+
+    def set_forkserver (self, forkserver):
+        self.log("updating fork server mode to: %s" % forkserver)
+
+        self.forkserver = forkserver
+
+    def set_preload (self, preload):
+        self.log("updating fork server preload library to: %s" % preload)
+
+        self.preload = preload
+
     def set_proc_name (self, proc_name):
         self.log("updating target process name to '%s'" % proc_name)
 
@@ -242,17 +738,23 @@ class nix_process_monitor_pedrpc_server(pedrpc.Server):
 if __name__ == "__main__":
     # parse command line options.
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "c:P:l:", ["crash_bin=","port=","log_level=",])
+        opts, args = getopt.getopt(sys.argv[1:], "c:P:l:fd:", ["crash_bin=","port=","log_level=","forkserver","core_dir=","preload="])
     except getopt.GetoptError:
         ERR(USAGE)
 
     log_level = 1
     PORT = None
     crash_bin = None
+    forkserver = False
+    core_dir = None
+    preload = None
     for opt, arg in opts:
         if opt in ("-c", "--crash_bin"):   crash_bin  = arg
         if opt in ("-P", "--port"): PORT = int(arg)
         if opt in ("-l", "--log_level"):   log_level  = int(arg)
+        if opt in ("-f", "--forkserver"):  forkserver = True
+        if opt in ("-d", "--core_dir"):    core_dir   = arg
+        if opt == "--preload":              preload    = arg
 
     if not crash_bin: ERR(USAGE)
     
@@ -261,6 +763,6 @@ if __name__ == "__main__":
     
     # spawn the PED-RPC servlet.
 
-    servlet = nix_process_monitor_pedrpc_server("0.0.0.0", PORT, crash_bin, log_level)
+    servlet = nix_process_monitor_pedrpc_server("0.0.0.0", PORT, crash_bin, log_level, forkserver, core_dir, preload)
     servlet.serve_forever()
 
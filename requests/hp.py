@@ -4,21 +4,8 @@ from struct import *
 
 
 ########################################################################################################################
-def unicode_ftw(val):
-    """
-    Simple unicode slicer
-    """
-
-    val_list = []
-    for char in val:
-        val_list.append("\x00")
-        val_list.append(pack('B', ord(char)))
-
-    ret = ""
-    for char in val_list:
-        ret += char
-
-    return ret
+# simple unicode slicer, "\x00" before every byte.
+unicode_ftw = encoders.utf16_be
 
 ########################################################################################################################
 s_initialize("omni")
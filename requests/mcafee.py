@@ -3,14 +3,7 @@ from sulley import *
 from struct import *
 
 # stupid one byte XOR
-def mcafee_epo_xor (buf, poly=0xAA):
-    l = len(buf)
-    new_buf = ""
-
-    for char in buf:
-        new_buf += chr(ord(char) ^ poly)
-
-    return new_buf
+mcafee_epo_xor = encoders.xor(0xAA)
 
 ########################################################################################################################
 s_initialize("mcafee_epo_framework_tcp")
@@ -86,69 +86,69 @@ ndmp_messages = \
 
 
 ########################################################################################################################
-s_initialize("Veritas NDMP_CONECT_CLIENT_AUTH")
-
-# the first bit is the last frag flag, we'll always set it and truncate our size to 3 bytes.
-# 3 bytes of size gives us a max 16mb ndmp message, plenty of space.
-s_static("\x80")
-s_size("request", length=3, endian=">")
-
-if s_block_start("request"):
-    if s_block_start("ndmp header"):
-        s_static(struct.pack(">L", 1),           name="sequence")
-        s_static(struct.pack(">L", time.time()), name="timestamp")
-        s_static(struct.pack(">L", 0),           name="message type")    # request (0)
-        s_static(struct.pack(">L", 0x901),       name="NDMP_CONECT_CLIENT_AUTH")
-        s_static(struct.pack(">L", 1),           name="reply sequence")
-        s_static(struct.pack(">L", 0),           name="error")
-    s_block_end("ndmp header")
-
-    s_group("auth types", values=[struct.pack(">L", 190), struct.pack(">L", 5), struct.pack(">L", 4)])
-
-    if s_block_start("body", group="auth types"):
-        # do random data.
-        s_random(0, min_length=1000, max_length=50000, num_mutations=500)
-
-        # random valid XDR string.
-        #s_lego("xdr_string", "pedram")
-    s_block_end("body")
-s_block_end("request")
+@s_define("Veritas NDMP_CONECT_CLIENT_AUTH")
+def ndmp_connect_client_auth():
+    # the first bit is the last frag flag, we'll always set it and truncate our size to 3 bytes.
+    # 3 bytes of size gives us a max 16mb ndmp message, plenty of space.
+    s_static("\x80")
+    s_size("request", length=3, endian=">")
+
+    if s_block_start("request"):
+        if s_block_start("ndmp header"):
+            s_static(struct.pack(">L", 1),           name="sequence")
+            s_static(struct.pack(">L", time.time()), name="timestamp")
+            s_static(struct.pack(">L", 0),           name="message type")    # request (0)
+            s_static(struct.pack(">L", 0x901),       name="NDMP_CONECT_CLIENT_AUTH")
+            s_static(struct.pack(">L", 1),           name="reply sequence")
+            s_static(struct.pack(">L", 0),           name="error")
+        s_block_end("ndmp header")
+
+        s_group("auth types", values=[struct.pack(">L", 190), struct.pack(">L", 5), struct.pack(">L", 4)])
+
+        if s_block_start("body", group="auth types"):
+            # do random data.
+            s_random(0, min_length=1000, max_length=50000, num_mutations=500)
+
+            # random valid XDR string.
+            #s_lego("xdr_string", "pedram")
+        s_block_end("body")
+    s_block_end("request")
 
 
 ########################################################################################################################
-s_initialize("Veritas Proprietary Message Types")
-
-# the first bit is the last frag flag, we'll always set it and truncate our size to 3 bytes.
-# 3 bytes of size gives us a max 16mb ndmp message, plenty of space.
-s_static("\x80")
-s_size("request", length=3, endian=">")
-
-if s_block_start("request"):
-    if s_block_start("ndmp header"):
-        s_static(struct.pack(">L", 1),           name="sequence")
-        s_static(struct.pack(">L", time.time()), name="timestamp")
-        s_static(struct.pack(">L", 0),           name="message type")    # request (0)
-
-        s_group("prop ops", values = \
-            [
-                struct.pack(">L", 0xf315),      # file list?
-                struct.pack(">L", 0xf316),
-                struct.pack(">L", 0xf317),
-                struct.pack(">L", 0xf200),      #
-                struct.pack(">L", 0xf201),
-                struct.pack(">L", 0xf202),
-                struct.pack(">L", 0xf31b),
-                struct.pack(">L", 0xf270),      # send strings like NDMP_PROP_PEER_PROTOCOL_VERSION
-                struct.pack(">L", 0xf271),
-                struct.pack(">L", 0xf33b),
-                struct.pack(">L", 0xf33c),
-            ])
-
-        s_static(struct.pack(">L", 1),           name="reply sequence")
-        s_static(struct.pack(">L", 0),           name="error")
-    s_block_end("ndmp header")
-
-    if s_block_start("body", group="prop ops"):
-        s_random("\x00\x00\x00\x00", min_length=1000, max_length=50000, num_mutations=100)
-    s_block_end("body")
-s_block_end("request")
\ No newline at end of file
+@s_define("Veritas Proprietary Message Types")
+def ndmp_proprietary_message_types():
+    # the first bit is the last frag flag, we'll always set it and truncate our size to 3 bytes.
+    # 3 bytes of size gives us a max 16mb ndmp message, plenty of space.
+    s_static("\x80")
+    s_size("request", length=3, endian=">")
+
+    if s_block_start("request"):
+        if s_block_start("ndmp header"):
+            s_static(struct.pack(">L", 1),           name="sequence")
+            s_static(struct.pack(">L", time.time()), name="timestamp")
+            s_static(struct.pack(">L", 0),           name="message type")    # request (0)
+
+            s_group("prop ops", values = \
+                [
+                    struct.pack(">L", 0xf315),      # file list?
+                    struct.pack(">L", 0xf316),
+                    struct.pack(">L", 0xf317),
+                    struct.pack(">L", 0xf200),      #
+                    struct.pack(">L", 0xf201),
+                    struct.pack(">L", 0xf202),
+                    struct.pack(">L", 0xf31b),
+                    struct.pack(">L", 0xf270),      # send strings like NDMP_PROP_PEER_PROTOCOL_VERSION
+                    struct.pack(">L", 0xf271),
+                    struct.pack(">L", 0xf33b),
+                    struct.pack(">L", 0xf33c),
+                ])
+
+            s_static(struct.pack(">L", 1),           name="reply sequence")
+            s_static(struct.pack(">L", 0),           name="error")
+        s_block_end("ndmp header")
+
+        if s_block_start("body", group="prop ops"):
+            s_random("\x00\x00\x00\x00", min_length=1000, max_length=50000, num_mutations=100)
+        s_block_end("body")
+    s_block_end("request")
@@ -1,5 +1,6 @@
 """Sulley Framework."""
 import sulley.blocks
+import sulley.encoders
 import sulley.instrumentation
 import sulley.legos
 import sulley.pedrpc
@@ -35,12 +36,9 @@ def s_get(name=None):
     if not name:
         return sulley.blocks.CURRENT
 
-    # ensure this gotten request is the new current.
+    # ensure this gotten request is the new current, building it first if it was lazily defined.
     s_switch(name)
 
-    if name not in sulley.blocks.REQUESTS:
-        raise sulley.sex.SullyRuntimeError("blocks.REQUESTS NOT FOUND: %s" % name)
-
     return sulley.blocks.REQUESTS[name]
 
 
@@ -55,13 +53,45 @@ def s_initialize(name):
     @type  name: String
     @param name: Name of request
     """
-    if name in sulley.blocks.REQUESTS:
+    if name in sulley.blocks.REQUESTS or name in sulley.blocks.BUILDERS:
         raise sulley.sex.SullyRuntimeError("blocks.REQUESTS ALREADY EXISTS: %s" % name)
 
     sulley.blocks.REQUESTS[name] = sulley.blocks.request(name)
     sulley.blocks.CURRENT = sulley.blocks.REQUESTS[name]
 
 
+def s_define(name, builder=None, validate=False):
+    """
+    Lazily define a request.
+
+    The builder is a callable containing the s_* calls that would otherwise follow s_initialize().
+    It is not run until the request is first needed by s_get(), s_switch() or session.connect(),
+    so importing a module full of request definitions costs next to nothing. s_define() may also be
+    used as a decorator::
+
+        @s_define("HTTP BASIC")
+        def http_basic():
+            s_static("GET / HTTP/1.1\r\n\r\n")
+
+    @type  name:     String
+    @param name:     Name of request
+    @type  builder:  Function
+    @param builder:  (Optional, def=None) Callable building the request, omit to use as decorator
+    @type  validate: Boolean
+    @param validate: (Optional, def=False) Build the request immediately to surface definition errors
+    """
+    if builder is None:
+        return lambda func: s_define(name, func, validate) or func
+
+    if name in sulley.blocks.REQUESTS or name in sulley.blocks.BUILDERS:
+        raise sulley.sex.SullyRuntimeError("blocks.REQUESTS ALREADY EXISTS: %s" % name)
+
+    sulley.blocks.BUILDERS[name] = builder
+
+    if validate:
+        sulley.blocks.materialize(name)
+
+
 def s_mutate():
     """Mutate the current request and return False if mutations are exhausted.
 
@@ -95,10 +125,12 @@ def s_switch(name):
     @type  name: String
     @param name: Name of request
     """
-    if name not in sulley.blocks.REQUESTS:
+    req = sulley.blocks.materialize(name)
+
+    if req is None:
         raise sulley.sex.SullyRuntimeError("blocks.REQUESTS NOT FOUND: %s" % name)
 
-    sulley.blocks.CURRENT = sulley.blocks.REQUESTS[name]
+    sulley.blocks.CURRENT = req
 
 
 def s_block_start(
@@ -108,7 +140,8 @@ def s_block_start(
     dep=None,
     dep_value=None,
     dep_values=[],
-    dep_compare="=="
+    dep_compare="==",
+    memoize=None
 ):
     r"""Open a new block under the current request.
 
@@ -124,9 +157,9 @@ def s_block_start(
     @param name:        Name of block being opened
     @type  group:       String
     @param group:       (Optional, def=None) Name of group to associate this block with
-    @type  encoder:     Function Pointer
+    @type  encoder:     Function Pointer or String
     @param encoder:     (Optional, def=None) Optional pointer to a function to pass rendered data
-                        prior to return
+                        prior to return, or the name of a registered encoder, ie: "utf16_le"
     @type  dep:         String
     @param dep:         (Optional, def=None) Optional primitive whose specific value this block
                         depends on
@@ -136,6 +169,10 @@ def s_block_start(
     @param dep_values:  (Optional, def=[]) Values that field "dep" may contain for block to render
     @type  dep_compare: String
     @param dep_compare: (Optional, def="==") Comparison method to use on (==, !=, >, >=, <, <=)
+    @type  memoize:     Boolean
+    @param memoize:     (Optional, def=None) Reuse the encoder output of earlier renders of the same
+                        block contents. Defaults to True for the built-in encoders, which are marked
+                        encoders.pure(), and False for any other callable
     """
     block = sulley.blocks.block(
         name,
@@ -145,7 +182,8 @@ def s_block_start(
         dep,
         dep_value,
         dep_values,
-        dep_compare)
+        dep_compare,
+        memoize)
     sulley.blocks.CURRENT.push(block)
 
     return True
@@ -195,6 +233,31 @@ def s_checksum(block_name, algorithm="crc32", length=0, endian="<", name=None):
     sulley.blocks.CURRENT.push(checksum)
 
 
+def s_combinatorial(names, strength=2, fuzzable=True, name=None):
+    """Mutate the named primitives together, sending every combination of strength fuzz library
+    entries at least once without stepping through their whole cross product.
+
+    This block modifier MUST come after the primitives it combines. They keep their own single
+    field mutations, the combinations follow.
+
+    @type  names:    List
+    @param names:    Names of the primitives to combine
+    @type  strength: Integer
+    @param strength: (Optional, def=2) Number of primitives every combination spans, 2 for pairwise
+    @type  fuzzable: Boolean
+    @param fuzzable: (Optional, def=True) Enable/disable fuzzing of this combination
+    @type  name:     String
+    @param name:     (Optional, def=None) Specifying a name gives you direct access to it
+    """
+    combinatorial = sulley.blocks.combinatorial(
+        names,
+        sulley.blocks.CURRENT,
+        strength,
+        fuzzable,
+        name)
+    sulley.blocks.CURRENT.push(combinatorial)
+
+
 def s_repeat(
     block_name,
     min_reps=0,
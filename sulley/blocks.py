@@ -1,9 +1,12 @@
 """Sulley blocks module."""
 from __future__ import print_function
+import collections
+import copy
 import zlib
 import hashlib
 import struct
 
+import encoders
 import pgraph
 import primitives
 import sex
@@ -11,6 +14,76 @@ from utils.crc16 import CRC16
 
 REQUESTS = {}
 CURRENT = None
+BUILDERS = {}   # lazily defined requests, name -> builder callable. see s_define().
+ENCODER_CACHE_SIZE = 16     # encoded outputs remembered per memoizing block, 0 to never memoize.
+
+
+def segments_of(item):
+    """Rendered contents of a rendered item as a list of strings and repetitions.
+
+    @rtype:  List
+    @return: List of Raw and blocks.repetition segments, concatenating to item.rendered
+    """
+    if isinstance(item, (block, repeat)):
+        return item.segments
+
+    return [item.rendered]
+
+
+def segments_length(segments):
+    """Length of the concatenation of a list of segments, without expanding repetitions."""
+    return sum([len(segment) for segment in segments])
+
+
+def next_prime(n):
+    """Smallest prime greater than or equal to n."""
+    n = max(n, 2)
+
+    while any([n % divisor == 0 for divisor in xrange(2, int(n ** 0.5) + 1)]):
+        n += 1
+
+    return n
+
+
+def materialize(name):
+    """Return the named request, running its deferred builder on first access.
+
+    The builder runs against a fresh request which is temporarily made current, the previously
+    current request is restored afterwards.
+
+    @type  name: String
+    @param name: Name of request
+
+    @rtype:  blocks.request
+    @return: The requested request or None if no request or builder exists under that name.
+    """
+    global CURRENT
+
+    if name in REQUESTS:
+        return REQUESTS[name]
+
+    if name not in BUILDERS:
+        return None
+
+    builder = BUILDERS.pop(name)
+    previous = CURRENT
+    CURRENT = REQUESTS[name] = request(name)
+
+    try:
+        builder()
+
+        if CURRENT.block_stack:
+            raise sex.SullyRuntimeError("UNCLOSED BLOCK: %s" % CURRENT.block_stack[-1].name)
+    except:
+        # leave the registry as we found it so the definition can be fixed and retried.
+        del REQUESTS[name]
+        BUILDERS[name] = builder
+        CURRENT = previous
+        raise
+
+    built = CURRENT
+    CURRENT = previous
+    return built
 
 
 class request(pgraph.node):
@@ -37,9 +110,19 @@ class request(pgraph.node):
         self.rendered = ""      # rendered block structure.
         self.mutant_index = 0       # current mutation index.
         self.mutant = None    # current primitive being mutated.
+        self.mutation_count = None  # cached (primitives.GENERATION, num_mutations) pair.
+
+        # interleaved mode, see mutate_interleaved().
+        self.interleave = False
+        self.turns = None           # cached (primitives.GENERATION, items mutated in turn) pair.
+        self.turn = 0               # position in turns of the next item to mutate.
+        self.active = None          # item mutated last, held at its mutation until the next one.
 
     def mutate(self):
         """Mutate something."""
+        if self.interleave:
+            return self.mutate_interleaved()
+
         mutated = False
 
         for item in self.stack:
@@ -56,18 +139,85 @@ class request(pgraph.node):
 
         return mutated
 
+    def mutate_interleaved(self):
+        """Mutate the fuzzable items in turn, one fuzz library entry each per round.
+
+        By default the first fuzzable item runs through its whole library before the next one is
+        touched. Interleaved, every field gets the head of its library, ie: omission, format strings
+        and integer boundaries, before any gets the long tail. Only one item is mutated at a time,
+        the others are held at their original values, and the number of mutations is unchanged.
+
+        @rtype:  Boolean
+        @return: True on success, False once every item is exhausted
+        """
+        turns = self.get_turns()
+
+        if self.active is not None:
+            hold(self.active)
+            self.active = None
+
+        for step in xrange(len(turns)):
+            position = (self.turn + step) % len(turns)
+            item = turns[position]
+
+            if item.mutate():
+                if not isinstance(item, block):
+                    self.mutant = item
+
+                self.active = item
+                self.turn = position + 1
+                self.mutant_index += 1
+                return True
+
+        return False
+
+    def get_turns(self, stack=None):
+        """The items mutate_interleaved() takes turns on.
+
+        Those are the fuzzable primitives, looking through blocks. Blocks tied to a group or to a
+        dependency take a turn as a whole, they step their contents themselves.
+
+        @rtype:  List
+        @return: Items in stack order
+        """
+        if stack is None:
+            if self.turns and self.turns[0] == primitives.GENERATION:
+                return self.turns[1]
+
+            self.turns = (primitives.GENERATION, self.get_turns(self.stack))
+            return self.turns[1]
+
+        turns = []
+
+        for item in stack:
+            if not item.fuzzable:
+                continue
+
+            if isinstance(item, block) and not item.group and not item.dep:
+                turns.extend(self.get_turns(item.stack))
+            else:
+                turns.append(item)
+
+        return turns
+
     def num_mutations(self):
         """Determine the number of repetitions we will be making.
 
+        The count is cached until the structure or a fuzzable flag changes.
+
         @rtype:  Integer
         @return: Number of mutated forms this primitive can take.
         """
+        if self.mutation_count and self.mutation_count[0] == primitives.GENERATION:
+            return self.mutation_count[1]
+
         num_mutations = 0
 
         for item in self.stack:
             if item.fuzzable:
                 num_mutations += item.num_mutations()
 
+        self.mutation_count = (primitives.GENERATION, num_mutations)
         return num_mutations
 
     def pop(self):
@@ -91,6 +241,9 @@ class request(pgraph.node):
 
             self.names[item.name] = item
 
+        # the structure changed, cached mutation counts are stale.
+        primitives.invalidate_mutations()
+
         # if there are no open blocks, the item gets pushed onto the request stack.
         # otherwise, the pushed item goes onto the stack of the last opened block.
         if not self.block_stack:
@@ -104,6 +257,16 @@ class request(pgraph.node):
 
     def render(self):
         """Render a block."""
+        self.rendered = "".join([str(segment) for segment in self.render_segments()])
+
+        return self.rendered
+
+    def render_segments(self):
+        """Render the request without expanding repeated blocks.
+
+        @rtype:  List
+        @return: List of Raw and blocks.repetition segments, concatenating to render()
+        """
         # ensure there are no open blocks lingering.
         if self.block_stack:
             raise sex.SullyRuntimeError("UNCLOSED BLOCK: %s" % self.block_stack[-1].name)
@@ -137,18 +300,20 @@ class request(pgraph.node):
                 update_size(item.stack, item.name)
                 item.render()
 
-        # now collect, merge and return the rendered items.
-        self.rendered = ""
+        # now collect and return the rendered items.
+        segments = []
 
         for item in self.stack:
-            self.rendered += item.rendered
+            segments.extend(segments_of(item))
 
-        return self.rendered
+        return segments
 
     def reset(self):
         """Reset every block and primitives mutant state under this request."""
         self.mutant_index = 1
         self.closed_blocks = {}
+        self.turn = 0
+        self.active = None
 
         for item in self.stack:
             if item.fuzzable:
@@ -172,9 +337,48 @@ class request(pgraph.node):
                 yield item
 
 
+def hold(item):
+    """Put an item whose turn is over back to its original value, keeping its fuzz library position.
+
+    @type  item: Mixed
+    @param item: Primitive, repeat or block, see request.mutate_interleaved()
+    """
+    if isinstance(item, block):
+        for child in item.stack:
+            if child.fuzzable:
+                hold(child)
+
+        if item.group:
+            item.request.names[item.group].value = item.request.names[item.group].original_value
+
+        if item.dep:
+            item.request.names[item.dep].value = item.request.names[item.dep].original_value
+
+    elif isinstance(item, combinatorial):
+        for factor in item.factors:
+            factor.value = factor.original_value
+
+    # sizers render their fuzz value only while they are the current mutant.
+    elif isinstance(item, (primitives.base_primitive, repeat)):
+        item.value = item.original_value
+
+
 class block(object):
     """Actual block."""
 
+    @property
+    def rendered(self):
+        """Rendered block contents, joined from the segments on first access."""
+        if self._rendered is None:
+            self._rendered = "".join([str(segment) for segment in self.segments])
+
+        return self._rendered
+
+    @rendered.setter
+    def rendered(self, value):
+        self._rendered = value
+        self.segments = [value]
+
     def __init__(
         self,
         name,
@@ -185,6 +389,7 @@ class block(object):
         dep_value=None,
         dep_values=[],
         dep_compare="==",
+        memoize=None,
     ):
         """The basic building block.
 
@@ -196,9 +401,10 @@ class block(object):
         @param request:     Request this block belongs to
         @type  group:       String
         @param group:       (Optional, def=None) Name of group to associate this block with
-        @type  encoder:     Function Pointer
+        @type  encoder:     Function Pointer or String
         @param encoder:     (Optional, def=None) Optional pointer to a function to pass rendered
-                            data to prior to return
+                            data to prior to return, or the name of a registered encoder
+                            (see encoders.py)
         @type  dep:         String
         @param dep:         (Optional, def=None) Optional primitive whose specific value this block
                             is dependant on
@@ -211,11 +417,14 @@ class block(object):
         @type  dep_compare: String
         @param dep_compare: (Optional, def="==") Comparison method to apply to dependency
                             (==, !=, >, >=, <, <=)
+        @type  memoize:     Boolean
+        @param memoize:     (Optional, def=None) Reuse the encoder output of earlier renders of the
+                            same contents, by default only for encoders marked encoders.pure()
         """
         self.name = name
         self.request = request
         self.group = group
-        self.encoder = encoder
+        self.encoder = encoders.resolve(encoder)
         self.dep = dep
         self.dep_value = dep_value
         self.dep_values = dep_values
@@ -227,6 +436,13 @@ class block(object):
         self.group_idx = 0   # if this block is tied to a group, the index within that group.
         self.fuzz_complete = False  # whether or not we are done fuzzing this block.
         self.mutant_index = 0      # current mutation index.
+        self.mutation_count = None  # cached (primitives.GENERATION, num_mutations) pair.
+        self.encoded = collections.OrderedDict()  # pre-encode digest -> encoded data, least recent first.
+
+        if memoize is None:
+            memoize = encoders.is_pure(self.encoder)
+
+        self.memoize = memoize
 
     def mutate(self):
         """Mutate a block."""
@@ -334,9 +550,14 @@ class block(object):
     def num_mutations(self):
         """Determine the number of repetitions we will be making.
 
+        The count is cached until the structure or a fuzzable flag changes.
+
         @rtype:  Integer
         @return: Number of mutated forms this primitive can take.
         """
+        if self.mutation_count and self.mutation_count[0] == primitives.GENERATION:
+            return self.mutation_count[1]
+
         num_mutations = 0
 
         for item in self.stack:
@@ -347,11 +568,13 @@ class block(object):
         if self.group:
             num_mutations *= len(self.request.names[self.group].values)
 
+        self.mutation_count = (primitives.GENERATION, num_mutations)
         return num_mutations
 
     def push(self, item):
         """Push an arbitrary item onto this blocks stack."""
         self.stack.append(item)
+        primitives.invalidate_mutations()
 
     def render(self):
         """Step through every item on this blocks stack and render it.
@@ -406,21 +629,53 @@ class block(object):
         for item in self.stack:
             item.render()
 
-        # now collect and merge the rendered items.
-        self.rendered = ""
+        # now collect the rendered items, repeated blocks stay unexpanded until they are needed.
+        segments = []
 
         for item in self.stack:
-            self.rendered += item.rendered
+            segments.extend(segments_of(item))
+
+        self._rendered = None
+        self.segments = segments
 
         # if an encoder was attached to this block, call it.
         if self.encoder:
-            self.rendered = self.encoder(self.rendered)
+            self.rendered = self.encode(self.rendered)
 
         # the block is now closed, clear out all the entries from the request back splice dictionary
         if self.name in self.request.callbacks:
             for item in self.request.callbacks[self.name]:
                 item.render()
 
+    def encode(self, data):
+        """Run the encoder, reusing the output of an earlier render of the same data.
+
+        Most renders of a block leave its contents untouched, ie: the mutating primitive lives in a
+        sibling block, so a memoizing block keeps the encoded output of its last few distinct
+        contents around, keyed on their digest.
+
+        @type  data: Raw
+        @param data: Rendered block contents
+
+        @rtype:  Raw
+        @return: Encoded block contents
+        """
+        if not self.memoize or not ENCODER_CACHE_SIZE:
+            return self.encoder(data)
+
+        key = hashlib.sha1(data).digest()
+
+        if key in self.encoded:
+            encoded = self.encoded.pop(key)
+        else:
+            encoded = self.encoder(data)
+
+            while len(self.encoded) >= ENCODER_CACHE_SIZE:
+                self.encoded.popitem(last=False)
+
+        self.encoded[key] = encoded
+        return encoded
+
     def reset(self):
         """Reset the primitives on this blocks stack to the starting mutation state."""
         self.fuzz_complete = False
@@ -530,12 +785,79 @@ class checksum(object):
             self.request.callbacks[self.block_name].append(self)
 
 
+class repetition(object):
+    """Rendered contents of a block repeated count times, expanded only when needed."""
+
+    def __init__(self, segment, count):
+        """Initialize.
+
+        @type  segment: Raw
+        @param segment: Rendered contents of the repeated block
+        @type  count:   Integer
+        @param count:   Number of repetitions
+        """
+        self.segment = segment
+        self.count = count
+
+    def __len__(self):
+        return len(self.segment) * self.count
+
+    def __str__(self):
+        return self.segment * self.count
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "%r * %d" % (self.segment, self.count)
+
+    def chunks(self, size=64 * 1024):
+        """Yield the expanded contents in pieces of about size bytes, reusing a single buffer.
+
+        @type  size: Integer
+        @param size: (Optional, def=64KB) Approximate size of each piece
+
+        @rtype:  Generator
+        @return: Pieces concatenating to str(self)
+        """
+        if not self.segment or not self.count:
+            return
+
+        per_chunk = min(max(1, size / len(self.segment)), self.count)
+        full, rest = divmod(self.count, per_chunk)
+        chunk = self.segment * per_chunk
+
+        for i in xrange(full):
+            yield chunk
+
+        if rest:
+            yield self.segment * rest
+
+
 class repeat(object):
     """This block type is a hybrid between a block and a primitive (it can be fuzzed).
 
     Theuser does not need to be wary of this fact.
     """
 
+    fuzzable = primitives.invalidating_attribute("_fuzzable")
+
+    @property
+    def rendered(self):
+        """Rendered repetitions, expanded on first access."""
+        if self._rendered is None:
+            self._rendered = str(self.value)
+
+        return self._rendered
+
+    @rendered.setter
+    def rendered(self, value):
+        self._rendered = value
+        self.segments = [value]
+
     def __init__(
         self,
         block_name,
@@ -645,9 +967,10 @@ class repeat(object):
         else:
             self.current_reps = self.fuzz_library[self.mutant_index]
 
-        # set the current value as a multiple of the block based on the current fuzz library count.
+        # set the current value as a multiple of the block based on the current fuzz library count,
+        # left unexpanded until somebody needs the bytes.
         block = self.request.closed_blocks[self.block_name]
-        self.value = block.rendered * self.fuzz_library[self.mutant_index]
+        self.value = repetition(block.rendered, self.fuzz_library[self.mutant_index])
 
         # increment the mutation count.
         self.mutant_index += 1
@@ -663,7 +986,7 @@ class repeat(object):
         return len(self.fuzz_library)
 
     def render(self):
-        """Nothing fancy on render, simply return the value."""
+        """Nothing fancy on render, simply return the value, a repetition left unexpanded."""
         # if the target block for this sizer is not closed, raise an exception.
         if self.block_name not in self.request.closed_blocks:
             raise sex.SullyRuntimeError(
@@ -672,10 +995,11 @@ class repeat(object):
         # if a variable-bounding was specified then set the value appropriately.
         if self.variable:
             block = self.request.closed_blocks[self.block_name]
-            self.value = block.rendered * self.variable.value
+            self.value = repetition(block.rendered, self.variable.value)
 
-        self.rendered = self.value
-        return self.rendered
+        self._rendered = None
+        self.segments = [self.value]
+        return self.value
 
     def reset(self):
         """Reset the fuzz state of this primitive."""
@@ -684,12 +1008,228 @@ class repeat(object):
         self.value = self.original_value
 
 
+class combinatorial(object):
+    """Mutate several primitives at once, covering their fuzz libraries t entries at a time."""
+
+    fuzzable = primitives.invalidating_attribute("_fuzzable")
+
+    def __init__(self, names, request, strength=2, fuzzable=True, name=None):
+        """Step a set of primitives through a covering array of their fuzz libraries.
+
+        Every combination of fuzz library entries of any strength of the primitives is sent at least
+        once, in a fraction of the test cases of their cross product. The array is an orthogonal
+        array over GF(p), p the smallest prime no smaller than the second largest library and the
+        number of primitives: row r reads the strength base p digits of r as the coefficients of a
+        polynomial, primitive j takes the entry the polynomial evaluates to at j. Any strength
+        points determine the polynomial, so every combination of entries turns up. The primitive
+        with the largest library steps through it a block of p entries per copy of the array, so
+        there are ceil(largest / p) * p ** strength rows, computed on demand. When the cross product
+        is no larger, ie: two primitives pairwise, it is stepped through instead.
+
+        The primitives keep their own single field mutations. Renders to nothing, the primitives
+        render their combined values in place.
+
+        @type  names:    List
+        @param names:    Names of the primitives to combine, already defined in the request
+        @type  request:  s_request
+        @param request:  Request the primitives belong to
+        @type  strength: Integer
+        @param strength: (Optional, def=2) Number of primitives every combination spans, 2 for
+                         pairwise
+        @type  fuzzable: Boolean
+        @param fuzzable: (Optional, def=True) Enable/disable fuzzing of this combination
+        @type  name:     String
+        @param name:     (Optional, def=None) Name of this combination
+        """
+        self.request = request
+        self.strength = strength
+        self.fuzzable = fuzzable
+        self.name = name
+        self.factors = []
+
+        for factor in names:
+            if factor not in self.request.names:
+                raise sex.SullyRuntimeError("CAN NOT COMBINE NON-EXISTANT PRIMITIVE: %s" % factor)
+
+            if not isinstance(self.request.names[factor], primitives.base_primitive):
+                raise sex.SullyRuntimeError("CAN ONLY COMBINE PRIMITIVES: %s" % factor)
+
+            self.factors.append(self.request.names[factor])
+
+        if not 2 <= self.strength <= len(self.factors):
+            raise sex.SullyRuntimeError(
+                "COMBINATION STRENGTH %d OUT OF RANGE FOR %d PRIMITIVES" % (
+                    self.strength, len(self.factors)))
+
+        self.value = self.original_value = ""
+        self.rendered = ""
+        self.s_type = "combinatorial"
+        self.fuzz_complete = False
+        self.mutant_index = 0
+        self.values = None  # cached (key, values every primitive takes) pair, see libraries().
+
+    def libraries(self):
+        """The distinct values every primitive takes over its fuzz library, in library order.
+
+        A library index does not always map to a value of its own, ie: strings of a fixed size skip
+        the entries that are too long and pad the others, so a copy of every primitive is stepped
+        through its library instead. Cached until the fuzz space or a random primitive seed changes.
+
+        @rtype:  List
+        @return: List of values per primitive
+        """
+        key = (primitives.GENERATION, [getattr(factor, "seed", None) for factor in self.factors])
+
+        if self.values and self.values[0] == key:
+            return self.values[1]
+
+        libraries = []
+
+        for factor in self.factors:
+            walker = copy.copy(factor)
+            walker.reset()
+            values = []
+            seen = set()
+
+            while walker.mutate():
+                if walker.value not in seen:
+                    seen.add(walker.value)
+                    values.append(walker.value)
+
+            libraries.append(values)
+
+        self.values = (key, libraries)
+        return libraries
+
+    def exhaust(self):
+        """Exhaust the possible mutations for this combination.
+
+        @rtype:  Integer
+        @return: The number of mutations to reach exhaustion
+        """
+        num = self.num_mutations() - self.mutant_index
+        self.fuzz_complete = True
+        self.mutant_index = self.num_mutations()
+        hold(self)
+        return num
+
+    def mutate(self):
+        """Set every primitive to its entry in the next row of the covering array.
+
+        @rtype:  Boolean
+        @return: True on success, False otherwise.
+        """
+        if self.mutant_index == self.num_mutations():
+            self.fuzz_complete = True
+
+        if not self.fuzzable or self.fuzz_complete:
+            hold(self)
+            return False
+
+        libraries = self.libraries()
+
+        for factor, values, index in zip(self.factors, libraries, self.row(self.mutant_index)):
+            factor.value = values[index]
+
+        self.mutant_index += 1
+        return True
+
+    def num_mutations(self):
+        """Number of rows of the covering array.
+
+        @rtype:  Integer
+        @return: Number of mutated forms this combination can take.
+        """
+        if not all(self.libraries()):
+            return 0
+
+        return min(self.product(), self.copies() * self.order() ** self.strength)
+
+    def copies(self):
+        """Number of copies of the orthogonal array the largest library is spread over."""
+        largest = max([len(values) for values in self.libraries()])
+
+        return -(-largest // self.order())
+
+    def order(self):
+        """Size of the field the covering array is built over."""
+        lengths = sorted([len(values) for values in self.libraries()])
+
+        return next_prime(max(lengths[-2], len(self.factors)))
+
+    def product(self):
+        """Number of combinations in the cross product of the libraries."""
+        product = 1
+
+        for values in self.libraries():
+            product *= len(values)
+
+        return product
+
+    def row(self, index):
+        """Fuzz library index of every primitive in a row of the covering array.
+
+        @type  index: Integer
+        @param index: Row number
+
+        @rtype:  List
+        @return: Index into libraries() per primitive
+        """
+        order = self.order()
+        lengths = [len(values) for values in self.libraries()]
+        row = []
+
+        # mixed radix digits of the index when the cross product is the smaller array.
+        if self.product() <= self.copies() * order ** self.strength:
+            for length in lengths:
+                index, digit = divmod(index, length)
+                row.append(digit)
+
+            return row
+
+        largest = lengths.index(max(lengths))
+        replica, index = divmod(index, order ** self.strength)
+        coefficients = []
+
+        for i in xrange(self.strength):
+            index, digit = divmod(index, order)
+            coefficients.append(digit)
+
+        for point, length in enumerate(lengths):
+            level = 0
+
+            for coefficient in reversed(coefficients):
+                level = (level * point + coefficient) % order
+
+            # every copy of the array covers the next block of the largest library.
+            if point == largest:
+                level += replica * order
+
+            # libraries smaller than the field wrap around, every entry is still reached.
+            row.append(level % length)
+
+        return row
+
+    def render(self):
+        """The combined primitives render themselves."""
+        self.rendered = ""
+        return self.rendered
+
+    def reset(self):
+        """Reset the fuzz state of this combination."""
+        self.fuzz_complete = False
+        self.mutant_index = 0
+        hold(self)
+
+
 class size(object):
     """This block type is kind of special in that it is a hybrid between a block and a primitive.
 
     (it can be fuzzed). The user does not need to be wary of this fact.
     """
 
+    fuzzable = primitives.invalidating_attribute("_fuzzable")
+
     def __init__(
         self,
         block_name,
@@ -803,7 +1343,8 @@ class size(object):
 
         # if the sizer is fuzzable and we have not yet exhausted the the possible bit field values,
         # use the fuzz value.
-        if self.fuzzable and self.bit_field.mutant_index and not self.bit_field.fuzz_complete:
+        if self.fuzzable and self.bit_field.mutant_index and not self.bit_field.fuzz_complete \
+                and self.request.mutant is self:
             self.rendered = self.bit_field.render()
 
         # if the target block for this sizer is already closed, render the size.
@@ -814,7 +1355,8 @@ class size(object):
                 self_size = 0
 
             block = self.request.closed_blocks[self.block_name]
-            self.bit_field.value = self.math(len(block.rendered) + self_size + self.offset)
+            self.bit_field.value = self.math(
+                segments_length(segments_of(block)) + self_size + self.offset)
             self.rendered = self.bit_field.render()
 
         # otherwise, add this sizer block to the requests callback list.
@@ -0,0 +1,135 @@
+"""Coverage feedback.
+
+A coverage monitor (see coverage_monitor_unix.py) shares an edge hit count map with an instrumented
+target: every edge the target takes bumps the byte at its index in the map, AFL style. After each
+test case the monitor reports how many (edge, hit count bucket) pairs the test case reached which no
+earlier one had, and the session demotes primitives which stopped producing new coverage::
+
+    target.covmon = pedrpc.Client("10.0.0.1", 26004)
+    sess = sessions.session(coverage_patience=200, ...)
+
+A primitive which went coverage_patience test cases in a row without new coverage has the rest of
+its fuzz library skipped, the same way a primitive which crashed the target crash_threshold times
+is. A primitive that keeps finding new coverage is left to run through its library.
+"""
+import binascii
+import mmap
+import os
+
+MAP_SIZE = 1 << 16
+
+# lower bounds of the hit count buckets. a change of bucket counts as new coverage, a change of hit
+# count within a bucket does not, ie: loop iterations 4 to 7 all look alike.
+BUCKET_BOUNDS = (1, 2, 3, 4, 8, 16, 32, 128)
+
+
+def bucket(count):
+    """Hit count bucket of an edge as a single bit, 0 for an edge not taken."""
+    bounds = [bound for bound in BUCKET_BOUNDS if count >= bound]
+
+    return bounds and 1 << (len(bounds) - 1) or 0
+
+
+# hit count -> bucket bit, applied to the whole map at once with str.translate().
+BUCKETS = "".join([chr(bucket(count)) for count in xrange(256)])
+
+
+class bitmap(object):
+    """Edge hit count map shared with the target through a file backed mapping."""
+
+    def __init__(self, filename, size=MAP_SIZE):
+        """Create the map, or open it if it exists.
+
+        @type  filename: String
+        @param filename: File backing the map, ie: on /dev/shm. The target maps the same file
+        @type  size:     Integer
+        @param size:     (Optional, def=MAP_SIZE) Number of edge counters
+        """
+        self.filename = filename
+        self.size = size
+        self.zero = "\x00" * size
+        self.seen = 0L      # bucket bits of every edge reached so far, one byte per edge.
+        self.total = 0      # number of bits set in seen.
+
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0666)
+
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+    def reset(self):
+        """Clear the hit counts, ahead of a test case."""
+        self.map[:] = self.zero
+
+    def update(self):
+        """Fold the hit counts of the last test case into the coverage seen so far.
+
+        @rtype:  Integer
+        @return: Number of (edge, bucket) pairs the test case reached for the first time
+        """
+        current = self.map[:]
+
+        if current == self.zero:
+            return 0
+
+        current = long(binascii.hexlify(current.translate(BUCKETS)), 16)
+        new = current & ~self.seen
+
+        if not new:
+            return 0
+
+        self.seen |= new
+        count = bin(new).count("1")
+        self.total += count
+
+        return count
+
+    def close(self):
+        self.map.close()
+
+
+class scheduler(object):
+    """Tracks the coverage yield of the primitives being fuzzed."""
+
+    def __init__(self, patience=0):
+        """Initialize.
+
+        @type  patience: Integer
+        @param patience: (Optional, def=0) Test cases in a row without new coverage after which a
+                         primitive is demoted, 0 never demotes
+        """
+        self.patience = patience
+        self.stats = {}     # primitive -> [test cases, new coverage, test cases since new coverage]
+        self.total = 0
+
+    def record(self, primitive, new):
+        """Record the coverage yield of a test case.
+
+        @type  primitive: primitives.base_primitive
+        @param primitive: Primitive the test case mutated
+        @type  new:       Integer
+        @param new:       New coverage the test case reached, see bitmap.update()
+
+        @rtype:  Boolean
+        @return: True if the primitive ran out of patience and should be demoted
+        """
+        stat = self.stats.setdefault(primitive, [0, 0, 0])
+        stat[0] += 1
+
+        if new:
+            stat[1] += new
+            stat[2] = 0
+            self.total += new
+            return False
+
+        stat[2] += 1
+
+        if not self.patience or stat[2] < self.patience:
+            return False
+
+        # a primitive fuzzed again down another path gets its patience back.
+        stat[2] = 0
+
+        return True
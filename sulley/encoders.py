@@ -0,0 +1,229 @@
+"""Block encoders.
+
+Encoders take the rendered data of a block and return its encoded form. They can be attached to a
+block by reference or by the name they are registered under::
+
+    encoders.register("trend_xor", encoders.chained_dword_xor(0xA8534344))
+
+    if s_block_start("body", encoder="trend_xor"):
+        ...
+
+Every encoder works on the whole buffer at once through C level primitives (str.translate, codecs,
+long integer arithmetic) rather than looping in Python per byte or per dword, blocks holding large
+random payloads are re-encoded on every render.
+
+Encoders marked pure(), all of the ones below, only depend on their input. Blocks remember their
+last few outputs and skip encoding contents they already encoded, see blocks.block.encode().
+"""
+import array
+import base64
+import binascii
+
+import sex
+from utils import dcerpc
+
+ENCODERS = {}   # name -> encoder callable. see register().
+PURE = set()    # encoders whose output only depends on their input. see pure().
+
+# array type code of 4 byte items, used to swap the byte order of every dword in a buffer at once.
+DWORD = [code for code in "IL" if array.array(code).itemsize == 4][0]
+
+
+def register(name, encoder):
+    """Register an encoder under a name, for use as s_block_start(encoder=name).
+
+    @type  name:    String
+    @param name:    Name to register the encoder under
+    @type  encoder: Function
+    @param encoder: Function taking the rendered data of a block and returning it encoded
+
+    @rtype:  Function
+    @return: The encoder
+    """
+    ENCODERS[name] = encoder
+    return encoder
+
+
+def pure(encoder):
+    """Mark an encoder as free of side effects and state, ie: no counters, nonces or timestamps.
+
+    Blocks memoize the output of pure encoders unless told otherwise, see s_block_start(memoize).
+
+    @type  encoder: Function
+    @param encoder: Encoder to mark
+
+    @rtype:  Function
+    @return: The encoder
+    """
+    PURE.add(encoder)
+    return encoder
+
+
+def is_pure(encoder):
+    """Whether an encoder was marked pure()."""
+    try:
+        return encoder in PURE
+    except TypeError:
+        return False
+
+
+def get(name):
+    """Look up a registered encoder.
+
+    @type  name: String
+    @param name: Name the encoder was registered under
+
+    @rtype:  Function
+    @return: The encoder
+    """
+    if name not in ENCODERS:
+        raise sex.SullyRuntimeError("ENCODER NOT FOUND: %s" % name)
+
+    return ENCODERS[name]
+
+
+def resolve(encoder):
+    """Resolve the encoder argument of a block, which may be a registered name or a callable.
+
+    @type  encoder: String or Function
+    @param encoder: Encoder name, encoder function or None
+
+    @rtype:  Function
+    @return: The encoder or None
+    """
+    if isinstance(encoder, basestring):
+        return get(encoder)
+
+    return encoder
+
+
+def to_long(data):
+    """Read a buffer as one big endian integer."""
+    if not data:
+        return 0
+
+    return long(binascii.hexlify(data), 16)
+
+
+def from_long(value, length):
+    """Write an integer out as a big endian buffer of the given length."""
+    if not length:
+        return ""
+
+    return binascii.unhexlify("%0*x" % (length * 2, value))
+
+
+def swap_dwords(data):
+    """Reverse the byte order of every dword of a buffer whose length is a multiple of 4."""
+    dwords = array.array(DWORD, data)
+    dwords.byteswap()
+    return dwords.tostring()
+
+
+def xor(key):
+    """XOR with a fixed key.
+
+    @type  key: Integer or String
+    @param key: Single byte key, or a multi byte key repeated over the data
+
+    @rtype:  Function
+    @return: Encoder
+    """
+    if isinstance(key, (int, long)):
+        key = chr(key)
+
+    if len(key) == 1:
+        table = "".join([chr(i ^ ord(key)) for i in xrange(256)])
+        return pure(lambda data: data.translate(table))
+
+    def encoder(data):
+        stream = (key * (len(data) / len(key) + 1))[:len(data)]
+        return from_long(to_long(data) ^ to_long(stream), len(data))
+
+    return pure(encoder)
+
+
+def chained_dword_xor(key):
+    """XOR every little endian dword with the previous encrypted dword, the first with the key.
+
+    Data is zero padded to a 4 byte boundary. Each encrypted dword is the XOR of the key and all
+    plain dwords up to it, a prefix XOR which is computed in log2(n) shift and XOR passes over the
+    whole buffer held as one integer.
+
+    @type  key: Integer
+    @param key: Initial dword key
+
+    @rtype:  Function
+    @return: Encoder
+    """
+    def encoder(data):
+        data += "\x00" * (-len(data) % 4)
+        count = len(data) / 4
+        bits = 32 * count
+
+        # the first dword is the most significant one, shifting right carries it forward.
+        value = to_long(swap_dwords(data))
+        shift = 32
+
+        while shift < bits:
+            value ^= value >> shift
+            shift *= 2
+
+        value ^= to_long(from_long(key, 4) * count)
+
+        return swap_dwords(from_long(value, len(data)))
+
+    return pure(encoder)
+
+
+def chained_dword_xor_decode(key):
+    """Inverse of chained_dword_xor(), XOR every dword with the previous encrypted dword.
+
+    @type  key: Integer
+    @param key: Initial dword key
+
+    @rtype:  Function
+    @return: Decoder
+    """
+    def decoder(data):
+        count = len(data) / 4
+        data = data[:count * 4]
+
+        if not count:
+            return ""
+
+        value = to_long(swap_dwords(data))
+        previous = (value >> 32) | (key << (32 * (count - 1)))
+
+        return swap_dwords(from_long(value ^ previous, len(data)))
+
+    return pure(decoder)
+
+
+def utf16_le(data):
+    """Widen every byte to a little endian UTF-16 code unit."""
+    return data.decode("latin-1").encode("utf-16-le")
+
+
+def utf16_be(data):
+    """Widen every byte to a big endian UTF-16 code unit."""
+    return data.decode("latin-1").encode("utf-16-be")
+
+
+def dcerpc_request(opnum=0):
+    """Frame data as a fragmented DCE/RPC request, see utils.dcerpc.request().
+
+    @type  opnum: Integer
+    @param opnum: (Optional, def=0) Operation number of the request
+
+    @rtype:  Function
+    @return: Encoder
+    """
+    return pure(lambda data: dcerpc.request(opnum, data))
+
+
+register("base64", pure(base64.b64encode))
+register("hex", pure(binascii.hexlify))
+register("utf16_le", pure(utf16_le))
+register("utf16_be", pure(utf16_be))
+register("dcerpc_request", dcerpc_request(0))
@@ -0,0 +1,194 @@
+"""Sulley session metrics.
+
+Rolling latency histograms per fuzz loop phase, event counters and a test case rate, cheap enough to
+update on every test case and safe to snapshot from the web interface thread.
+"""
+import collections
+import threading
+import time
+
+
+class histogram(object):
+    """Rolling window of latency samples."""
+
+    def __init__(self, window=1000):
+        """Keep the most recent samples, older ones fall out of the window.
+
+        @type  window: Integer
+        @param window: (Optional, def=1000) Number of most recent samples to keep
+        """
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0      # total number of samples ever recorded.
+        self.total = 0.0    # total of all samples ever recorded.
+
+    def add(self, value):
+        """Record a sample.
+
+        @type  value: Float
+        @param value: Sample, in seconds
+        """
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent, ordered=None):
+        """Calculate a percentile over the samples in the window.
+
+        @type  percent: Float
+        @param percent: Percentile to calculate, 0 - 100
+        @type  ordered: List
+        @param ordered: (Optional, def=None) Already sorted samples, to share a sort across calls
+
+        @rtype:  Float
+        @return: Sample at the requested percentile, 0.0 if there are no samples
+        """
+        if ordered is None:
+            ordered = sorted(self.samples)
+
+        if not ordered:
+            return 0.0
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+    def summary(self):
+        """Summarize the histogram.
+
+        @rtype:  Dictionary
+        @return: count, mean, p50, p99 and max (seconds)
+        """
+        ordered = sorted(self.samples)
+
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50, ordered),
+            "p99": self.percentile(99, ordered),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+
+class timer(object):
+    """Context manager timing a block into a phase histogram of a metrics instance."""
+
+    def __init__(self, metrics, phase):
+        """Initialize.
+
+        @type  metrics: metrics.metrics
+        @param metrics: Metrics instance to record into
+        @type  phase:   String
+        @param phase:   Name of the phase being timed
+        """
+        self.metrics = metrics
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.phase, time.time() - self.start)
+        return False
+
+
+class metrics(object):
+    """Per phase latency histograms, event counters and test case throughput."""
+
+    def __init__(self, window=1000, rate_window=60.0):
+        """Initialize.
+
+        @type  window:      Integer
+        @param window:      (Optional, def=1000) Samples kept per phase histogram
+        @type  rate_window: Float
+        @param rate_window: (Optional, def=60.0) Seconds of test case completions the rate covers
+        """
+        self.window = window
+        self.rate_window = rate_window
+        self.started = time.time()
+
+        self.phases = {}    # phase name -> histogram.
+        self.counters = collections.defaultdict(int)
+        self.cases = collections.deque()    # completion time of the test cases in the rate window.
+        self.lock = threading.Lock()
+
+    def case(self):
+        """Record the completion of a test case."""
+        now = time.time()
+
+        with self.lock:
+            self.counters["cases"] += 1
+            self.cases.append(now)
+
+            while self.cases and self.cases[0] < now - self.rate_window:
+                self.cases.popleft()
+
+    def cases_per_second(self):
+        """Rolling test case rate.
+
+        @rtype:  Float
+        @return: Test cases completed per second over the rate window
+        """
+        now = time.time()
+
+        with self.lock:
+            recent = len([stamp for stamp in self.cases if stamp >= now - self.rate_window])
+
+        return recent / min(self.rate_window, max(now - self.started, 1.0))
+
+    def incr(self, counter, amount=1):
+        """Increment an event counter.
+
+        @type  counter: String
+        @param counter: Name of counter, ie: "restarts", "timeouts"
+        @type  amount:  Integer
+        @param amount:  (Optional, def=1) Amount to increment by
+        """
+        with self.lock:
+            self.counters[counter] += amount
+
+    def record(self, phase, seconds):
+        """Record the duration of a phase.
+
+        @type  phase:   String
+        @param phase:   Name of the phase, ie: "send", "recv"
+        @type  seconds: Float
+        @param seconds: Duration of the phase
+        """
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = histogram(self.window)
+
+            self.phases[phase].add(seconds)
+
+    def snapshot(self):
+        """Capture the current state of all metrics.
+
+        @rtype:  Dictionary
+        @return: uptime, cases_per_second, counters and per phase histogram summaries
+        """
+        rate = self.cases_per_second()
+
+        with self.lock:
+            counters = dict(self.counters)
+            phases = dict((name, hist.summary()) for name, hist in self.phases.items())
+
+        return {
+            "uptime": time.time() - self.started,
+            "cases_per_second": rate,
+            "counters": counters,
+            "phases": phases,
+        }
+
+    def timer(self, phase):
+        """Time a block of code into the named phase, ie::
+
+            with session.metrics.timer("send"):
+                sock.send(data)
+
+        @type  phase: String
+        @param phase: Name of the phase
+
+        @rtype:  metrics.timer
+        @return: Context manager recording the duration of the block
+        """
+        return timer(self, phase)
@@ -0,0 +1,303 @@
+"""Crash minimization.
+
+Takes a crashing test case out of the replay log (see replay.py) and shrinks it against the target:
+
+    1. every field but the crashing primitive goes back to its original value,
+    2. nodes up the session path are dropped one at a time,
+    3. the value of the crashing primitive is cut down to the shortest crashing prefix.
+
+Every candidate is sent on a fresh connection and judged by the process monitor of the target, which
+is restarted after each crash. Given more than one target, the candidates of a round are spread over
+all of them in parallel, length bisection then probes several lengths per round.
+
+Edge callbacks are not run, the nodes are sent as rendered.
+
+Usage::
+
+    sess = sessions.session(replay_filename="audits/http.replay", ...)
+    ...
+    shrink = minimize.minimizer(sess, [target_1, target_2])
+
+    for number in sess.procmon_results:
+        reproducer = shrink.minimize(number)
+
+        if reproducer:
+            reproducer.save("audits/minimized")
+"""
+import Queue
+import os
+import threading
+
+import primitives
+import sex
+
+
+class candidate(object):
+    """A variation of the test case being minimized."""
+
+    def __init__(self, path, value, revert):
+        """Initialize.
+
+        @type  path:   List
+        @param path:   Edges of the nodes to send ahead of the fuzz node
+        @type  value:  Mixed
+        @param value:  Value of the crashing primitive
+        @type  revert: Boolean
+        @param revert: Whether the other primitives of the fuzz node are reverted to their original
+                       values
+        """
+        self.path = path
+        self.value = value
+        self.revert = revert
+
+    def replace(self, **changes):
+        """Copy of this candidate with some attributes changed."""
+        attributes = dict(path=self.path, value=self.value, revert=self.revert)
+        attributes.update(changes)
+
+        return candidate(**attributes)
+
+
+class reproducer(object):
+    """Minimal reproducer of a crash."""
+
+    def __init__(self, number, path, node, primitive, value, payloads):
+        """Initialize.
+
+        @type  number:    Integer
+        @param number:    Test case the reproducer was minimized from
+        @type  path:      List
+        @param path:      Names of the nodes sent ahead of the fuzz node
+        @type  node:      String
+        @param node:      Name of the fuzz node
+        @type  primitive: String
+        @param primitive: Name of the crashing primitive, None if it is unnamed
+        @type  value:     Mixed
+        @param value:     Minimal crashing value of the primitive
+        @type  payloads:  List
+        @param payloads:  Rendered nodes, sent in order on a single connection
+        """
+        self.number = number
+        self.path = path
+        self.node = node
+        self.primitive = primitive
+        self.value = value
+        self.payloads = payloads
+
+    def save(self, directory):
+        """Store the reproducer as <directory>/<number>.bin, the payloads back to back.
+
+        @type  directory: String
+        @param directory: Directory to store the reproducer in, ie: next to the crash bin
+
+        @rtype:  String
+        @return: Filename of the reproducer
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        filename = os.path.join(directory, "%d.bin" % self.number)
+
+        with open(filename, "wb") as fh:
+            fh.write("".join(self.payloads))
+
+        return filename
+
+    def __repr__(self):
+        return "<reproducer %d %s %d bytes>" % (
+            self.number, " -> ".join(self.path + [self.node]), sum(map(len, self.payloads)))
+
+
+class minimizer(object):
+    """Delta debugs crashing test cases against a pool of targets."""
+
+    def __init__(self, session, targets=None):
+        """Initialize.
+
+        @type  session: sessions.session
+        @param session: Session which recorded the crashes, with its replay log
+        @type  targets: List
+        @param targets: (Optional, def=session targets) Targets to send candidates to, each with a
+                        process monitor
+        """
+        if not session.replay_log:
+            raise sex.SullyRuntimeError("NO REPLAY LOG SPECIFIED IN SESSION")
+
+        self.session = session
+        self.targets = targets or session.targets
+        self.number = None  # test case being minimized.
+        self.node = None    # its fuzz node.
+        self.mutant = None  # its crashing primitive.
+        self.state = []     # (primitive, value) of every primitive of the fuzz node as recorded.
+
+        for target in self.targets:
+            if not target.procmon:
+                raise sex.SullyRuntimeError(
+                    "MINIMIZING REQUIRES A PROCESS MONITOR ON EVERY TARGET: %s:%d" % (
+                        target.host, target.port))
+
+    def minimize(self, number):
+        """Shrink a crashing test case.
+
+        @type  number: Integer
+        @param number: Test case number
+
+        @rtype:  minimize.reproducer
+        @return: Minimal reproducer, None if the test case does not crash the target anymore
+        """
+        entry = self.session.replay_log.get(number)
+
+        if not entry:
+            raise sex.SullyRuntimeError("TEST CASE NOT IN REPLAY LOG: %d" % number)
+
+        self.number = number
+        self.session.reseed(self.session.replay_log.seed)
+
+        path = self.session.load_case(entry)
+        self.node = self.session.fuzz_node
+        self.mutant = self.node.mutant
+        self.state = [(item, item.value) for item in self.node.walk()
+                      if isinstance(item, primitives.base_primitive)]
+
+        try:
+            return self.shrink(path)
+        finally:
+            # leave the fuzz node as the session stepped it, candidates overwrite its values.
+            for item, value in self.state:
+                item.value = value
+
+    def shrink(self, path):
+        """Delta debug the loaded test case, see minimize().
+
+        @type  path: List
+        @param path: Edges from the root node to the fuzz node
+
+        @rtype:  minimize.reproducer
+        @return: Minimal reproducer, None if the test case does not crash the target anymore
+        """
+        number = self.number
+        best = candidate(path[:-1], self.mutant.value, False)
+
+        if not self.evaluate([best])[0]:
+            self.session.logger.warning("test case %d does not reproduce", number)
+            return None
+
+        # 1. the other fields of the fuzz node back to their original values.
+        if self.evaluate([best.replace(revert=True)])[0]:
+            best = best.replace(revert=True)
+
+        # 2. drop the nodes up the path one at a time, as long as one of them can go.
+        while best.path:
+            candidates = [best.replace(path=best.path[:i] + best.path[i + 1:])
+                          for i in xrange(len(best.path))]
+            crashed = [c for c, result in zip(candidates, self.evaluate(candidates)) if result]
+
+            if not crashed:
+                break
+
+            best = crashed[0]
+
+        # 3. bisect the length of the crashing value down to the shortest crashing prefix.
+        if isinstance(best.value, basestring):
+            best = best.replace(value=best.value[:self.bisect(best)])
+
+        self.session.logger.info("test case %d minimized to %d bytes of %s", number,
+                                 len(best.value) if isinstance(best.value, basestring) else 0,
+                                 self.node.name)
+
+        return reproducer(number,
+                          [self.session.nodes[edge.dst].name for edge in best.path],
+                          self.node.name,
+                          self.mutant.name,
+                          best.value,
+                          self.render(best))
+
+    def bisect(self, best):
+        """Find the shortest crashing prefix length of the candidate value.
+
+        Prefixes shorter than low are known not to crash, a prefix of high bytes is known to crash.
+        Every round probes as many lengths in between as there are targets.
+
+        @rtype:  Integer
+        @return: Length of the shortest crashing prefix
+        """
+        low, high = 0, len(best.value)
+
+        while low < high:
+            count = min(len(self.targets), high - low)
+            step = float(high - low) / (count + 1)
+            lengths = sorted(set([low + int(step * (i + 1)) for i in xrange(count)]))
+            results = self.evaluate([best.replace(value=best.value[:length]) for length in lengths])
+
+            for length, crashed in zip(lengths, results):
+                if crashed:
+                    high = length
+                    break
+
+                low = length + 1
+
+        return high
+
+    def render(self, case):
+        """Render the payloads of a candidate.
+
+        @rtype:  List
+        @return: Rendered nodes of the path followed by the rendered fuzz node
+        """
+        for item, value in self.state:
+            if case.revert and item is not self.mutant:
+                item.value = item.original_value
+            else:
+                item.value = value
+
+        self.mutant.value = case.value
+
+        return [self.session.nodes[edge.dst].render() for edge in case.path] + [self.node.render()]
+
+    def evaluate(self, candidates):
+        """Send candidates, spread over the targets in parallel.
+
+        Rendering shares the request objects, so the candidates are rendered up front and the worker
+        threads only send bytes.
+
+        @rtype:  List
+        @return: Whether each candidate crashed its target
+        """
+        jobs = Queue.Queue()
+        results = [False] * len(candidates)
+
+        for i, case in enumerate(candidates):
+            jobs.put((i, self.render(case)))
+
+        def worker(target):
+            while True:
+                try:
+                    i, payloads = jobs.get_nowait()
+                except Queue.Empty:
+                    return
+
+                results[i] = self.crashes(target, payloads)
+
+        threads = [threading.Thread(target=worker, args=(target,)) for target in self.targets]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def crashes(self, target, payloads):
+        """Send payloads on a single connection and ask the process monitor whether the target died,
+        restarting it if it did.
+
+        @type  target:   sessions.target
+        @param target:   Target to send to
+        @type  payloads: List
+        @param payloads: Payloads to send in order
+
+        @rtype:  Boolean
+        @return: True if the target crashed, False otherwise
+        """
+        return self.session.send_payloads(target, [[[data] for data in payloads]], self.number)
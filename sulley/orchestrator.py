@@ -0,0 +1,551 @@
+"""Sulley campaign orchestrator.
+
+Runs many fuzzing sessions, one campaign per child process, over a shared pool of target resources.
+Each campaign is handed a free resource (a target host with its monitors, a VM, ...) and its own web
+port. When a campaign finishes, or its process dies, the resource is released and the next pending
+campaign is started on it. Status of every campaign is aggregated into a single dashboard, and the
+crashes of every campaign into a single list.
+
+Example::
+
+    def http(sess, resource):
+        target = sessions.target(resource["host"], 80)
+        target.procmon = pedrpc.Client(resource["host"], 26002)
+        sess.add_target(target)
+        sess.connect(s_get("HTTP VERBS"))
+
+    orch = orchestrator.orchestrator([{"host": "10.0.0.1"}, {"host": "10.0.0.2"}])
+    orch.add_campaign("http", http, sleep_time=0.1)
+    orch.add_campaign("ftp", ftp)
+    for name, number, synopsis in orch.run():
+        print name, number, synopsis.split("\n")[0]
+"""
+import BaseHTTPServer
+import httplib
+import json
+import logging
+import multiprocessing
+import os
+import Queue
+import threading
+import time
+
+import sessions
+import sex
+
+
+def run_campaign(name, setup, resource, session_options, results):
+    """Child process entry point, build the session for a campaign, fuzz it and report its crashes.
+
+    @type  name:            String
+    @param name:            Name of campaign
+    @type  setup:           Callable
+    @param setup:           Campaign setup routine, called as setup(session, resource)
+    @type  resource:        Mixed
+    @param resource:        Resource from the orchestrator pool the campaign is running on
+    @type  session_options: Dictionary
+    @param session_options: Keyword arguments for sessions.session
+    @type  results:         multiprocessing.Queue
+    @param results:         Queue to put (name, test case number -> crash synopsis) on when done
+    """
+    sess = sessions.session(**session_options)
+    setup(sess, resource)
+
+    # fuzz() waits for a signal once every test case ran, a campaign process exits instead.
+    server_init = sess.server_init
+
+    def init():
+        server_init()
+        sess.signal_module = False
+
+    sess.server_init = init
+    sess.fuzz()
+
+    results.put((name, sess.procmon_results))
+
+
+class campaign(object):
+    """A fuzzing campaign scheduled by the orchestrator."""
+
+    def __init__(self, name, setup, session_options):
+        """Initialize.
+
+        @type  name:            String
+        @param name:            Unique name of campaign
+        @type  setup:           Callable
+        @param setup:           Setup routine, called in the child as setup(session, resource). It
+                                    should add the targets and connect the requests to fuzz.
+        @type  session_options: Dictionary
+        @param session_options: Keyword arguments for sessions.session
+        """
+        self.name = name
+        self.setup = setup
+        self.session_options = session_options
+
+        self.state = "pending"      # pending, running, finished or failed.
+        self.process = None
+        self.resource = None
+        self.web_port = None
+        self.status = {}            # last status reported by the campaigns web interface.
+        self.crashes = {}           # test case number -> crash synopsis.
+        self.started = None
+        self.ended = None
+
+    def summary(self):
+        """Summarize the campaign for the dashboard.
+
+        @rtype:  Dictionary
+        @return: Campaign state along with the last status reported by its session.
+        """
+        return {
+            "name": self.name,
+            "state": self.state,
+            "resource": repr(self.resource) if self.resource is not None else None,
+            "web_port": self.web_port,
+            "started": self.started,
+            "ended": self.ended,
+            "exitcode": self.process.exitcode if self.process else None,
+            "status": self.status,
+        }
+
+
+class orchestrator(object):
+    """Schedule campaigns over a pool of resources and aggregate their status."""
+
+    def __init__(
+        self,
+        resources,
+        web_port=26000,
+        base_port=26001,
+        session_dir=None,
+        poll_interval=5.0,
+        log_level=logging.INFO,
+    ):
+        """Initialize.
+
+        @type  resources:     List
+        @param resources:     Pool of resources campaigns run on, each campaign holds one at a time
+        @type  web_port:      Integer
+        @param web_port:      (Optional, def=26000) Port for the aggregated dashboard
+        @type  base_port:     Integer
+        @param base_port:     (Optional, def=26001) First port allocated to campaign sessions
+        @type  session_dir:   String
+        @param session_dir:   (Optional, def=None) Directory to keep campaign session files in
+        @type  poll_interval: Float
+        @param poll_interval: (Optional, def=5.0) Seconds between scheduling / status passes
+        @type  log_level:     Integer
+        @param log_level:     (Optional, def=logging.INFO) Set the log level
+        """
+        self.free_resources = list(resources)
+        self.web_port = web_port
+        self.base_port = base_port
+        self.session_dir = session_dir
+        self.poll_interval = poll_interval
+
+        self.campaigns = []
+        self.ports = set()      # campaign web ports currently in use.
+        self.lock = threading.Lock()
+        self.stop_flag = False
+        self.thread = None
+        self.results = multiprocessing.Queue()
+
+        self.logger = logging.getLogger("Sulley_orchestrator")
+        self.logger.setLevel(log_level)
+
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] -> %(message)s'))
+            self.logger.addHandler(handler)
+
+    def add_campaign(self, name, setup, **session_options):
+        """Queue a campaign, it starts as soon as a resource is free.
+
+        @type  name:            String
+        @param name:            Unique name of campaign
+        @type  setup:           Callable
+        @param setup:           Setup routine, called in the child as setup(session, resource)
+        @type  session_options: Keyword arguments
+        @param session_options: Passed to sessions.session, web_port is assigned by the orchestrator
+
+        @rtype:  campaign
+        @return: The queued campaign
+        """
+        with self.lock:
+            if self.find_campaign(name):
+                raise sex.SullyRuntimeError("CAMPAIGN ALREADY EXISTS: %s" % name)
+
+            if self.session_dir and "session_filename" not in session_options:
+                session_options["session_filename"] = os.path.join(self.session_dir, name)
+
+            new = campaign(name, setup, session_options)
+            self.campaigns.append(new)
+
+        return new
+
+    def collect(self):
+        """Pick up the crashes reported by campaigns which ran every test case."""
+        while 1:
+            try:
+                name, crashes = self.results.get_nowait()
+            except Queue.Empty:
+                return
+
+            with self.lock:
+                self.find_campaign(name).crashes.update(crashes)
+
+    def crashes(self):
+        """Merge the crashes of every campaign.
+
+        @rtype:  List
+        @return: (campaign name, test case number, crash synopsis) tuples, in campaign then test case
+                    order
+        """
+        with self.lock:
+            return [(entry.name, number, entry.crashes[number])
+                    for entry in self.campaigns for number in sorted(entry.crashes)]
+
+    def add_resource(self, resource):
+        """Add a resource to the pool, pending campaigns are scheduled onto it on the next pass.
+
+        @type  resource: Mixed
+        @param resource: Resource to add
+        """
+        with self.lock:
+            self.free_resources.append(resource)
+
+    def allocate_port(self):
+        """Allocate the lowest free campaign web port.
+
+        @rtype:  Integer
+        @return: Port number
+        """
+        port = self.base_port
+
+        while port in self.ports or port == self.web_port:
+            port += 1
+
+        self.ports.add(port)
+        return port
+
+    def find_campaign(self, name):
+        """Find a campaign by name.
+
+        @type  name: String
+        @param name: Name of campaign
+
+        @rtype:  campaign
+        @return: Campaign or None if no such campaign exists
+        """
+        for entry in self.campaigns:
+            if entry.name == name:
+                return entry
+
+        return None
+
+    def finish(self, entry, state):
+        """Mark a campaign as done and return its resource and port to the pool.
+
+        @type  entry: campaign
+        @param entry: Campaign that is done
+        @type  state: String
+        @param state: "finished" or "failed"
+        """
+        entry.state = state
+        entry.ended = time.time()
+
+        self.ports.discard(entry.web_port)
+        self.free_resources.append(entry.resource)
+
+        self.logger.info("campaign %s %s, releasing %r", entry.name, state, entry.resource)
+
+    def poll(self):
+        """Reap exited campaigns and refresh the status and crashes of running ones.
+
+        A campaign is finished once its process exits cleanly, after it ran every test case and
+        reported its crashes.
+        """
+        # a process does not exit before what it put on the queue is read.
+        self.collect()
+
+        for entry in [entry for entry in self.campaigns if entry.state == "running"]:
+            if not entry.process.is_alive():
+                self.collect()
+
+                with self.lock:
+                    self.finish(entry, "finished" if entry.process.exitcode == 0 else "failed")
+                continue
+
+            status = self.query(entry, "/api/status")
+
+            if status is None:
+                continue
+
+            entry.status = status
+
+            # pick up new crashes a page per pass, the full synopses come with the results.
+            if status.get("crashes", 0) > len(entry.crashes):
+                since = max(entry.crashes) if entry.crashes else -1
+                page = self.query(entry, "/api/crashes?since=%d" % since) or {}
+
+                with self.lock:
+                    for crash in page.get("crashes", []):
+                        entry.crashes.setdefault(crash["test_case"], crash["synopsis"])
+
+    def query(self, entry, path, timeout=2.0):
+        """Query the web interface of a running campaign.
+
+        @type  entry:   campaign
+        @param entry:   Campaign to query
+        @type  path:    String
+        @param path:    API path, ie: "/api/status"
+        @type  timeout: Float
+        @param timeout: (Optional, def=2.0) Seconds to wait for the session to respond
+
+        @rtype:  Mixed
+        @return: Decoded JSON response or None if the session did not respond
+        """
+        try:
+            conn = httplib.HTTPConnection("127.0.0.1", entry.web_port, timeout=timeout)
+            conn.request("GET", path)
+            response = conn.getresponse()
+
+            if response.status != 200:
+                return None
+
+            return json.loads(response.read())
+        except Exception, e:
+            self.logger.debug("campaign %s did not answer %s: %s", entry.name, path, e)
+            return None
+
+    def run(self):
+        """Schedule and monitor campaigns until all of them are done.
+
+        @rtype:  List
+        @return: Crashes of every campaign, see crashes()
+        """
+        self.thread = orchestrator_thread(self)
+        self.thread.start()
+
+        try:
+            while not self.stop_flag:
+                self.schedule()
+                self.poll()
+
+                if all(entry.state in ("finished", "failed") for entry in self.campaigns):
+                    break
+
+                time.sleep(self.poll_interval)
+        finally:
+            self.stop()
+
+        return self.crashes()
+
+    def schedule(self):
+        """Start pending campaigns on free resources."""
+        with self.lock:
+            for entry in self.campaigns:
+                if entry.state != "pending" or not self.free_resources:
+                    continue
+
+                entry.resource = self.free_resources.pop(0)
+                entry.web_port = self.allocate_port()
+                entry.session_options["web_port"] = entry.web_port
+
+                entry.process = multiprocessing.Process(
+                    target=run_campaign,
+                    name="sulley-%s" % entry.name,
+                    args=(entry.name, entry.setup, entry.resource, entry.session_options,
+                          self.results))
+                entry.process.daemon = True
+                entry.process.start()
+
+                entry.state = "running"
+                entry.started = time.time()
+
+                self.logger.info(
+                    "campaign %s started on %r, web port %d", entry.name, entry.resource,
+                    entry.web_port)
+
+    def status(self):
+        """Aggregate the status of all campaigns.
+
+        @rtype:  Dictionary
+        @return: Per campaign summaries and totals across campaigns
+        """
+        with self.lock:
+            campaigns = [entry.summary() for entry in self.campaigns]
+            free = len(self.free_resources)
+
+        totals = {"cases_per_second": 0.0, "crashes": 0, "total_mutant_index": 0}
+        for entry in campaigns:
+            for key in totals:
+                totals[key] += entry["status"].get(key, 0)
+
+        return {
+            "campaigns": campaigns,
+            "free_resources": free,
+            "totals": totals,
+        }
+
+    def stop(self):
+        """Terminate all running campaigns and shut the dashboard down."""
+        self.stop_flag = True
+
+        for entry in self.campaigns:
+            if entry.process and entry.process.is_alive():
+                entry.process.terminate()
+                entry.process.join()
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+INDEX_HTML = """
+<html>
+<head>
+    <title>Sulley Orchestrator</title>
+    <style>
+        a:link    {color: #FF8200; text-decoration: none;}
+        a:visited {color: #FF8200; text-decoration: none;}
+        body {background-color: #000000; font-family: Arial, Helvetica, sans-serif; font-size: 12px;
+              color: #FFFFFF;}
+        td   {font-family: Arial, Helvetica, sans-serif; font-size: 12px; color: #A0B0B0;}
+    </style>
+</head>
+<body>
+<center>
+<table border=0 cellpadding=5 cellspacing=0 width=750>
+    <tr bgcolor="#333333">
+        <td colspan=3><div style="font-size: 20px;">Sulley Orchestrator</div></td>
+        <td colspan=3 align=right id="totals"></td>
+    </tr>
+    <tr bgcolor="#111111">
+        <td>Campaign</td><td>State</td><td>Resource</td>
+        <td align=right>Progress</td><td align=right>Cases/sec</td><td align=right>Crashes</td>
+    </tr>
+    <tbody id="campaigns"></tbody>
+</table>
+</center>
+
+<script type="text/javascript">
+    function cell(row, value, align) {
+        var td = row.insertCell(-1);
+        td.textContent = value === null || value === undefined ? "" : value;
+        if (align) {
+            td.align = align;
+        }
+        return td;
+    }
+
+    function update(data) {
+        var body = document.getElementById("campaigns");
+        while (body.rows.length) {
+            body.deleteRow(0);
+        }
+
+        data.campaigns.forEach(function (campaign) {
+            var status = campaign.status;
+            var row = body.insertRow(-1);
+            var name = cell(row, "");
+
+            if (campaign.state == "running") {
+                var link = document.createElement("a");
+                link.href = "http://" + location.hostname + ":" + campaign.web_port + "/";
+                link.textContent = campaign.name;
+                name.appendChild(link);
+            } else {
+                name.textContent = campaign.name;
+            }
+
+            cell(row, campaign.state);
+            cell(row, campaign.resource);
+            var progress = "", rate = "";
+            if (status.total_num_mutations) {
+                progress = 100 * status.total_mutant_index / status.total_num_mutations;
+                progress = progress.toFixed(3) + "%";
+            }
+            if (status.cases_per_second !== undefined) {
+                rate = status.cases_per_second.toFixed(2);
+            }
+
+            cell(row, progress, "right");
+            cell(row, rate, "right");
+            cell(row, status.crashes, "right");
+        });
+
+        document.getElementById("totals").textContent =
+            data.totals.cases_per_second.toFixed(2) + " cases/sec, " + data.totals.crashes +
+            " crashes, " + data.free_resources + " free resources";
+    }
+
+    function poll() {
+        var xhr = new XMLHttpRequest();
+        xhr.onreadystatechange = function () {
+            if (xhr.readyState == 4 && xhr.status == 200) {
+                update(JSON.parse(xhr.responseText));
+            }
+        };
+        xhr.open("GET", "/api/status", true);
+        xhr.send();
+    }
+
+    poll();
+    setInterval(poll, 5000);
+</script>
+</body>
+</html>
+"""
+
+
+class orchestrator_handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Dashboard web handler."""
+
+    orchestrator = None
+
+    def do_GET(self):
+        """Get method."""
+        if self.path.startswith("/api/status"):
+            response = json.dumps(self.orchestrator.status())
+            content_type = "application/json"
+        else:
+            response = INDEX_HTML
+            content_type = "text/html"
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args, **kwargs):
+        """Log a message."""
+        pass
+
+    def version_string(self):
+        """Version string."""
+        return "Sulley Orchestrator"
+
+
+class orchestrator_thread(threading.Thread):
+    """Thread component for the dashboard."""
+
+    def __init__(self, orchestrator):
+        """Initialize."""
+        threading.Thread.__init__(self, name="SulleyOrchestratorWebServer")
+        self.daemon = True
+
+        self.orchestrator = orchestrator
+        self.server = None
+
+    def run(self):
+        """Serve the dashboard until the orchestrator stops."""
+        orchestrator_handler.orchestrator = self.orchestrator
+        self.server = BaseHTTPServer.HTTPServer(
+            ('', self.orchestrator.web_port), orchestrator_handler)
+        self.server.timeout = 0.5
+
+        while not self.orchestrator.stop_flag:
+            self.server.handle_request()
+
+        self.server.server_close()
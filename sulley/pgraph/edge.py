@@ -78,20 +78,20 @@ class edge(object):
         if not src or not dst:
             return ""
 
-        edge = '  edge [\n'
-        edge += '    source %d\n' % src.number
-        edge += '    target %d\n' % dst.number
-        edge += '    generalization 0\n'
-        edge += '    graphics [\n'
-        edge += '      type "line"\n'
-        edge += '      arrow "%s"\n' % self.gml_arrow
-        edge += '      stipple %d\n' % self.gml_stipple
-        edge += '      lineWidth %f\n' % self.gml_line_width
-        edge += '      fill "#%06x"\n' % self.color
-        edge += '    ]\n'
-        edge += '  ]\n'
-
-        return edge
+        return "".join([
+            '  edge [\n',
+            '    source %d\n' % src.number,
+            '    target %d\n' % dst.number,
+            '    generalization 0\n',
+            '    graphics [\n',
+            '      type "line"\n',
+            '      arrow "%s"\n' % self.gml_arrow,
+            '      stipple %d\n' % self.gml_stipple,
+            '      lineWidth %f\n' % self.gml_line_width,
+            '      fill "#%06x"\n' % self.color,
+            '    ]\n',
+            '  ]\n',
+        ])
 
     def render_edge_graphviz(self, graph):
         """Render an edge suitable for use in a Pydot graph using the set internal attributes.
@@ -113,6 +113,24 @@ class edge(object):
         dot_edge.color = "#%06x" % self.color
         return dot_edge
 
+    def render_edge_dot(self, graph):
+        """Render an edge statement for a graphviz DOT file using the set internal attributes.
+
+        Produces the same edge as render_edge_graphviz() without going through pydot.
+
+        @type  graph: pgraph.graph
+        @param graph: Top level graph object containing the current edge
+
+        @rtype:  String
+        @return: DOT edge statement
+        """
+        attributes = ['color="#%06x"' % self.color]
+
+        if self.label:
+            attributes.insert(0, 'label="%s"' % self.label.replace('"', '\\"'))
+
+        return '  "%s" -> "%s" [%s];\n' % (self.src, self.dst, ", ".join(attributes))
+
     def render_edge_udraw(self, graph):
         """Render an edge description suitable for use in a GML file using the set internal attributes.
 
@@ -132,16 +150,17 @@ class edge(object):
         # translate newlines for uDraw.
         self.label = self.label.replace("\n", "\\n")
 
-        udraw = 'l("%08x->%08x",' % (self.src, self.dst)
-        udraw += 'e("",'                          # open edge
-        udraw += '['                            # open attributes
-        udraw += 'a("EDGECOLOR","#%06x"),' % self.color
-        udraw += 'a("OBJECT","%s")' % self.label
-        udraw += '],'                           # close attributes
-        udraw += 'r("%08x")' % self.dst
-        udraw += ')'                              # close edge
-        udraw += ')'                                # close element
-        return udraw
+        return "".join([
+            'l("%08x->%08x",' % (self.src, self.dst),
+            'e("",',                          # open edge
+            '[',                            # open attributes
+            'a("EDGECOLOR","#%06x"),' % self.color,
+            'a("OBJECT","%s")' % self.label,
+            '],',                           # close attributes
+            'r("%08x")' % self.dst,
+            ')',                              # close edge
+            ')',                                # close element
+        ])
 
     def render_edge_udraw_update(self):
         """Render an edge update description suitable for use in a GML file using internal attributes.
@@ -152,11 +171,12 @@ class edge(object):
         # translate newlines for uDraw.
         self.label = self.label.replace("\n", "\\n")
 
-        udraw = 'new_edge("%08x->%08x","",' % (self.src, self.dst)
-        udraw += '['
-        udraw += 'a("EDGECOLOR","#%06x"),' % self.color
-        udraw += 'a("OBJECT","%s")' % self.label
-        udraw += '],'
-        udraw += '"%08x","%08x"' % (self.src, self.dst)
-        udraw += ')'
-        return udraw
+        return "".join([
+            'new_edge("%08x->%08x","",' % (self.src, self.dst),
+            '[',
+            'a("EDGECOLOR","#%06x"),' % self.color,
+            'a("OBJECT","%s")' % self.label,
+            '],',
+            '"%08x","%08x"' % (self.src, self.dst),
+            ')',
+        ])
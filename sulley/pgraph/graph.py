@@ -31,14 +31,22 @@ import cluster
 class graph(object):
     """Graph object.
 
+    Nodes and edges are kept in dictionaries keyed by id. Adjacency lists of the edges from and to
+    every node are maintained alongside, as are indexes for attribute lookups through find_node()
+    and find_edge(). All graph changes must therefore go through the add / del routines.
+
     @todo: Add support for clusters
-    @todo: Potentially swap node list with a node dictionary for increased performance
     """
 
     id = None
     clusters = []
     edges = {}
     nodes = {}
+    generation = 0
+    edges_out = {}
+    edges_in = {}
+    node_index = {}
+    edge_index = {}
 
     def __init__(self, id=None):
         """Initialize."""
@@ -46,6 +54,11 @@ class graph(object):
         self.clusters = []
         self.edges = {}
         self.nodes = {}
+        self.generation = 0     # bumped on every node / edge change, lets callers cache walks.
+        self.edges_out = {}     # node id -> list of edges from that node, in insertion order.
+        self.edges_in = {}      # node id -> list of edges to that node, in insertion order.
+        self.node_index = {}    # attribute -> {value: [nodes]}, built on first find_node().
+        self.edge_index = {}    # attribute -> {value: [edges]}, built on first find_edge().
 
     def add_cluster(self, cluster):
         """Add a pgraph cluster to the graph.
@@ -72,8 +85,13 @@ class graph(object):
                 return self
 
         # ensure the source and destination nodes exist.
-        if self.find_node("id", edge.src) and self.find_node("id", edge.dst):
-            self.edges[edge.id] = edge
+        if edge.src in self.nodes and edge.dst in self.nodes:
+            # a duplicate replaces the existing edge.
+            if edge.id in self.edges:
+                self.unlink_edge(self.edges[edge.id])
+
+            self.link_edge(edge)
+            self.generation += 1
 
         return self
 
@@ -102,6 +120,10 @@ class graph(object):
 
         if node.id not in self.nodes:
             self.nodes[node.id] = node
+            self.generation += 1
+
+            for attribute, index in self.node_index.items():
+                self.index_add(index, node, attribute)
         return self
 
     def del_cluster(self, id):
@@ -138,7 +160,8 @@ class graph(object):
             id = (src << 32) + dst
 
         if id in self.edges:
-            del self.edges[id]
+            self.unlink_edge(self.edges[id])
+            self.generation += 1
         return self
 
     def del_graph(self, other_graph):
@@ -162,7 +185,11 @@ class graph(object):
         @param node_id: Identifier of node to remove from graph
         """
         if id in self.nodes:
-            del self.nodes[id]
+            nde = self.nodes.pop(id)
+            self.generation += 1
+
+            for attribute, index in self.node_index.items():
+                self.index_del(index, nde, attribute)
         return self
 
     def edges_from(self, id):
@@ -174,7 +201,7 @@ class graph(object):
         @rtype:  List
         @return: List of edges from the specified node
         """
-        return [edge for edge in self.edges.values() if edge.src == id]
+        return list(self.edges_out.get(id, []))
 
     def edges_to(self, id):
         """Enumerate the edges to the specified node.
@@ -185,7 +212,7 @@ class graph(object):
         @rtype:  List
         @return: List of edges to the specified node
         """
-        return [edge for edge in self.edges.values() if edge.dst == id]
+        return list(self.edges_in.get(id, []))
 
     def find_cluster(self, attribute, value):
         """Find and return the cluster with the specified attribute / value pair.
@@ -235,20 +262,19 @@ class graph(object):
         @return: Edge, if attribute / value pair is matched. None otherwise.
         """
         # if the attribute to search for is the id, simply return the edge from the internal hash.
-        if attribute == "id" and value in self.edges:
-            return self.edges[value]
-
-        # step through all the edges looking for the given attribute/value pair.
-        else:
-            for edg in self.edges.values():
-                if hasattr(edg, attribute):
-                    if getattr(edg, attribute) == value:
-                        return edg
-        return None
+        if attribute == "id":
+            return self.edges.get(value)
+
+        return self.index_find(self.edge_index, self.edges, attribute, value)
 
     def find_node(self, attribute, value):
         """Find and return the node with the specified attribute / value pair.
 
+        Lookups on attributes other than id go through an index which is built on first use and
+        maintained as nodes are added and removed. Attributes looked up this way should not be
+        changed once the node is in the graph, a stale entry is only detected (and the index
+        rebuilt) when a lookup hits it.
+
         @type  attribute: String
         @param attribute: Attribute name we are looking for
         @type  value:     Mixed
@@ -258,16 +284,10 @@ class graph(object):
         @return: Node, if attribute / value pair is matched. None otherwise.
         """
         # if the attribute to search for is the id, simply return the node from the internal hash.
-        if attribute == "id" and value in self.nodes:
-            return self.nodes[value]
+        if attribute == "id":
+            return self.nodes.get(value)
 
-        # step through all the nodes looking for the given attribute/value pair.
-        else:
-            for nde in self.nodes.values():
-                if hasattr(nde, attribute):
-                    if getattr(nde, attribute) == value:
-                        return nde
-        return None
+        return self.index_find(self.node_index, self.nodes, attribute, value)
 
     def graph_cat(self, other_graph):
         """Concatenate the other graph into the current one.
@@ -405,7 +425,7 @@ class graph(object):
                 break
             for nde in level:
                 up_graph.add_node(copy.copy(nde))
-                for edg in self.edges_to(node.id):
+                for edg in self.edges_to(nde.id):
                     to_add = self.find_node("id", edg.src)
                     if not up_graph.find_node("id", edg.src):
                         next_level.append(to_add)
@@ -416,28 +436,146 @@ class graph(object):
             current_depth += 1
         return up_graph
 
-    def render_graph_gml(self):
-        """Render the GML graph description.
+    def index_add(self, index, item, attribute):
+        """Add a node or edge to an attribute index.
 
-        @rtype:  String
-        @return: GML graph description.
+        @type  index:     Dictionary
+        @param index:     Attribute index, value -> list of items
+        @type  item:      pGRAPH Node or Edge
+        @param item:      Item to index
+        @type  attribute: String
+        @param attribute: Attribute the index is keyed on
+        """
+        if hasattr(item, attribute):
+            try:
+                index.setdefault(getattr(item, attribute), []).append(item)
+            except TypeError:
+                # unhashable values can't be indexed, lookups on them fall back to a scan.
+                pass
+
+    def index_del(self, index, item, attribute):
+        """Remove a node or edge from an attribute index.
+
+        @type  index:     Dictionary
+        @param index:     Attribute index, value -> list of items
+        @type  item:      pGRAPH Node or Edge
+        @param item:      Item to remove
+        @type  attribute: String
+        @param attribute: Attribute the index is keyed on
+        """
+        try:
+            values = [getattr(item, attribute, None)] + index.keys()
+            hash(values[0])
+        except TypeError:
+            values = index.keys()
+
+        # the current value is tried first, the attribute may have been changed in place though.
+        for value in values:
+            items = index.get(value, [])
+
+            if item in items:
+                items.remove(item)
+
+                if not items:
+                    del index[value]
+                return
+
+    def index_find(self, indexes, container, attribute, value):
+        """Find the first item in container with the specified attribute / value pair.
+
+        @type  indexes:   Dictionary
+        @param indexes:   Attribute indexes for the container, attribute -> value -> list of items
+        @type  container: Dictionary
+        @param container: Nodes or edges dictionary of this graph
+        @type  attribute: String
+        @param attribute: Attribute name we are looking for
+        @type  value:     Mixed
+        @param value:     Value of attribute we are looking for
+
+        @rtype:  Mixed
+        @return: Item, if attribute / value pair is matched. None otherwise.
         """
-        gml = 'Creator "pGRAPH - Pedram Amini <pedram.amini@gmail.com>"\n'
-        gml += 'directed 1\n'
+        try:
+            hash(value)
+        except TypeError:
+            for item in container.values():
+                if hasattr(item, attribute) and getattr(item, attribute) == value:
+                    return item
+            return None
+
+        if attribute not in indexes:
+            index = indexes[attribute] = {}
+
+            for item in sorted(container.values(), key=lambda x: x.id):
+                self.index_add(index, item, attribute)
+
+        for item in indexes[attribute].get(value, []):
+            # an attribute was changed in place since the item was indexed, rebuild and retry.
+            if getattr(item, attribute, None) != value:
+                del indexes[attribute]
+                return self.index_find(indexes, container, attribute, value)
+
+            return item
+
+        return None
+
+    def link_edge(self, edg):
+        """Store an edge and add it to the adjacency lists and attribute indexes.
+
+        @type  edg: pGRAPH Edge
+        @param edg: Edge to store
+        """
+        self.edges[edg.id] = edg
+        self.edges_out.setdefault(edg.src, []).append(edg)
+        self.edges_in.setdefault(edg.dst, []).append(edg)
+
+        for attribute, index in self.edge_index.items():
+            self.index_add(index, edg, attribute)
+
+    def unlink_edge(self, edg):
+        """Remove an edge along with its adjacency list and attribute index entries.
+
+        @type  edg: pGRAPH Edge
+        @param edg: Edge to remove
+        """
+        del self.edges[edg.id]
+        self.edges_out[edg.src].remove(edg)
+        self.edges_in[edg.dst].remove(edg)
+
+        if not self.edges_out[edg.src]:
+            del self.edges_out[edg.src]
+
+        if not self.edges_in[edg.dst]:
+            del self.edges_in[edg.dst]
+
+        for attribute, index in self.edge_index.items():
+            self.index_del(index, edg, attribute)
+
+    def iter_graph_gml(self):
+        """Generate the GML graph description in chunks, nodes are emitted in id order.
+
+        @rtype:  Generator
+        @return: Chunks of the GML graph description.
+        """
+        yield 'Creator "pGRAPH - Pedram Amini <pedram.amini@gmail.com>"\n'
+        yield 'directed 1\n'
 
         # open the graph tag.
-        gml += 'graph [\n'
+        yield 'graph [\n'
+
+        nodes = self.sorted_nodes()
 
         # add the nodes to the GML definition.
-        for nde in self.nodes.values():
-            gml += nde.render_node_gml(self)
+        for nde in nodes:
+            yield nde.render_node_gml(self)
 
-        # add the edges to the GML definition.
-        for edg in self.edges.values():
-            gml += edg.render_edge_gml(self)
+        # add the edges to the GML definition, grouped by source node.
+        for nde in nodes:
+            for edg in self.edges_out.get(nde.id, []):
+                yield edg.render_edge_gml(self)
 
         # close the graph tag.
-        gml += ']\n'
+        yield ']\n'
 
         """
         TODO: Complete cluster rendering
@@ -458,11 +596,83 @@ class graph(object):
             # close the rootcluster tag.
             gml += ']\n'
         """
-        return gml
+
+    def iter_graph_graphviz(self):
+        """Generate the graphviz DOT graph description in chunks, nodes are emitted in id order.
+
+        Unlike render_graph_graphviz() this does not require pydot.
+
+        @rtype:  Generator
+        @return: Chunks of the DOT graph description.
+        """
+        yield 'digraph G {\n'
+
+        nodes = self.sorted_nodes()
+
+        for nde in nodes:
+            yield nde.render_node_dot(self)
+
+        for nde in nodes:
+            for edg in self.edges_out.get(nde.id, []):
+                yield edg.render_edge_dot(self)
+
+        yield '}\n'
+
+    def iter_graph_udraw(self):
+        """Generate the uDraw graph description in chunks, nodes are emitted in id order.
+
+        @rtype:  Generator
+        @return: Chunks of the uDraw graph description.
+        """
+        yield '['
+
+        # render each of the nodes in the graph.
+        # the individual nodes will handle their own edge rendering.
+        for i, nde in enumerate(self.sorted_nodes()):
+            if i:
+                yield ','
+
+            yield nde.render_node_udraw(self)
+
+        yield ']'
+
+    def iter_graph_udraw_update(self):
+        """Generate the uDraw graph update description in chunks, nodes are emitted in id order.
+
+        @rtype:  Generator
+        @return: Chunks of the uDraw graph update description.
+        """
+        yield '['
+
+        nodes = self.sorted_nodes()
+        separator = ''
+
+        for nde in nodes:
+            yield separator + nde.render_node_udraw_update()
+            separator = ','
+
+        for nde in nodes:
+            for edg in self.edges_out.get(nde.id, []):
+                yield separator + edg.render_edge_udraw_update()
+                separator = ','
+
+        yield ']'
+
+    def render_graph_gml(self):
+        """Render the GML graph description.
+
+        @see: iter_graph_gml()
+
+        @rtype:  String
+        @return: GML graph description.
+        """
+        return "".join(self.iter_graph_gml())
 
     def render_graph_graphviz(self):
         """Render the graphviz graph structure.
 
+        @see: iter_graph_graphviz()
+
         @rtype:  pydot.Dot
         @return: Pydot object representing entire graph
         """
@@ -470,50 +680,61 @@ class graph(object):
 
         dot_graph = pydot.Dot()
 
-        for nde in self.nodes.values():
+        for nde in self.sorted_nodes():
             dot_graph.add_node(nde.render_node_graphviz(self))
 
-        for edg in self.edges.values():
-            dot_graph.add_edge(edg.render_edge_graphviz(self))
+            for edg in self.edges_out.get(nde.id, []):
+                dot_graph.add_edge(edg.render_edge_graphviz(self))
         return dot_graph
 
     def render_graph_udraw(self):
         """Render the uDraw graph description.
 
+        @see: iter_graph_udraw()
+
         @rtype:  String
         @return: uDraw graph description.
         """
-        udraw = '['
-
-        # render each of the nodes in the graph.
-        # the individual nodes will handle their own edge rendering.
-        for nde in self.nodes.values():
-            udraw += nde.render_node_udraw(self)
-            udraw += ','
-
-        # trim the extraneous comment and close the graph.
-        udraw = udraw[0:-1] + ']'
-        return udraw
+        return "".join(self.iter_graph_udraw())
 
     def render_graph_udraw_update(self):
         """Render the uDraw graph update description.
 
+        @see: iter_graph_udraw_update()
+
         @rtype:  String
         @return: uDraw graph description.
         """
-        udraw = '['
+        return "".join(self.iter_graph_udraw_update())
 
-        for nde in self.nodes.values():
-            udraw += nde.render_node_udraw_update()
-            udraw += ','
+    def write_graph(self, fh, format="gml"):
+        """Stream the graph description to a file-like object, without building it in memory.
 
-        for edg in self.edges.values():
-            udraw += edg.render_edge_udraw_update()
-            udraw += ','
+        @type  fh:     File
+        @param fh:     File-like object to write to
+        @type  format: String
+        @param format: (Optional, def="gml") One of "gml", "graphviz", "udraw" or "udraw_update"
+
+        @rtype:  Integer
+        @return: Number of bytes written
+        """
+        renderers = {
+            "gml": self.iter_graph_gml,
+            "graphviz": self.iter_graph_graphviz,
+            "udraw": self.iter_graph_udraw,
+            "udraw_update": self.iter_graph_udraw_update,
+        }
+
+        if format not in renderers:
+            raise Exception("unknown graph format: %s" % format)
+
+        written = 0
 
-        # trim the extraneous comment and close the graph.
-        udraw = udraw[0:-1] + ']'
-        return udraw
+        for chunk in renderers[format]():
+            fh.write(chunk)
+            written += len(chunk)
+
+        return written
 
     def update_node_id(self, current_id, new_id):
         """Simply updating the id attribute of a node will sever the edges to / from the given node.
@@ -533,20 +754,37 @@ class graph(object):
         del self.nodes[current_id]
         nde.id = new_id
         self.nodes[nde.id] = nde
+        self.generation += 1
+
+        # update the edges, a self referencing edge shows up in both adjacency lists.
+        edges = list(self.edges_out.get(current_id, []))
+        edges += [edg for edg in self.edges_in.get(current_id, []) if edg not in edges]
 
-        # update the edges.
-        for edg in [edg for edg in self.edges.values() if current_id in (edg.src, edg.dst)]:
+        for edg in edges:
             del self.edges[edg.id]
 
+            for attribute, index in self.edge_index.items():
+                self.index_del(index, edg, attribute)
+
             if edg.src == current_id:
                 edg.src = new_id
             if edg.dst == current_id:
                 edg.dst = new_id
 
-            edg.id = (edge.src << 32) + edg.dst
+            edg.id = (edg.src << 32) + edg.dst
 
             self.edges[edg.id] = edg
 
+            for attribute, index in self.edge_index.items():
+                self.index_add(index, edg, attribute)
+
+        # the adjacency lists hold the edges themselves, they only need to move to the new id.
+        if current_id in self.edges_out:
+            self.edges_out[new_id] = self.edges_out.pop(current_id)
+
+        if current_id in self.edges_in:
+            self.edges_in[new_id] = self.edges_in.pop(current_id)
+
     def sorted_nodes(self):
         """Return a list of the nodes within the graph, sorted by id.
 
@@ -79,7 +79,7 @@ class node(object):
         # GDE does not like lines longer then approx 250 bytes. within their their own GML files
         # you won't find lines longer then approx 210 bytes. wo we are forced to break long lines
         # into chunks.
-        chunked_label = ""
+        chunks = []
         cursor = 0
 
         while cursor < len(self.label):
@@ -90,7 +90,7 @@ class node(object):
                 while self.label[cursor + amount] == '\\' or self.label[cursor + amount] == '"':
                     amount -= 1
 
-            chunked_label += self.label[cursor:cursor + amount] + "\\\n"
+            chunks.append(self.label[cursor:cursor + amount] + "\\\n")
             cursor += amount
 
         # if node width and height were not explicitly specified, make a best effort guess
@@ -101,25 +101,26 @@ class node(object):
             self.gml_height = len(self.label.split()) * 20
 
         # construct the node definition.
-        node = '  node [\n'
-        node += '    id %d\n' % self.number
-        node += '    template "oreas:std:rect"\n'
-        node += '    label "'
-        node += '<!--%08x-->\\\n' % self.id
-        node += chunked_label + '"\n'
-        node += '    graphics [\n'
-        node += '      w %f\n' % self.gml_width
-        node += '      h %f\n' % self.gml_height
-        node += '      fill "#%06x"\n' % self.color
-        node += '      line "#%06x"\n' % self.border_color
-        node += '      pattern "%s"\n' % self.gml_pattern
-        node += '      stipple %d\n' % self.gml_stipple
-        node += '      lineWidth %f\n' % self.gml_line_width
-        node += '      type "%s"\n' % self.gml_type
-        node += '      width %f\n' % self.gml_width_shape
-        node += '    ]\n'
-        node += '  ]\n'
-        return node
+        return "".join([
+            '  node [\n',
+            '    id %d\n' % self.number,
+            '    template "oreas:std:rect"\n',
+            '    label "',
+            '<!--%08x-->\\\n' % self.id,
+            "".join(chunks) + '"\n',
+            '    graphics [\n',
+            '      w %f\n' % self.gml_width,
+            '      h %f\n' % self.gml_height,
+            '      fill "#%06x"\n' % self.color,
+            '      line "#%06x"\n' % self.border_color,
+            '      pattern "%s"\n' % self.gml_pattern,
+            '      stipple %d\n' % self.gml_stipple,
+            '      lineWidth %f\n' % self.gml_line_width,
+            '      type "%s"\n' % self.gml_type,
+            '      width %f\n' % self.gml_width_shape,
+            '    ]\n',
+            '  ]\n',
+        ])
 
     def render_node_graphviz(self, graph):
         """Render a node suitable for use in a Pydot graph using the set internal attributes.
@@ -141,6 +142,23 @@ class node(object):
         dot_node.fillcolor = "#%06x" % self.color
         return dot_node
 
+    def render_node_dot(self, graph):
+        """Render a node statement for a graphviz DOT file using the set internal attributes.
+
+        Produces the same node as render_node_graphviz() without going through pydot.
+
+        @type  graph: pgraph.graph
+        @param graph: Top level graph object containing the current node
+
+        @rtype:  String
+        @return: DOT node statement.
+        """
+        label = '<font face="lucida console">%s</font>' % self.label.rstrip("\r\n")
+        label = label.replace("\\n", '<br/>')
+
+        return '  "%s" [label=<%s>, shape="%s", color="#%06x", fillcolor="#%06x"];\n' % (
+            self.id, label, self.shape, self.color, self.color)
+
     def render_node_udraw(self, graph):
         """Render a node description suitable for use in uDraw file using the set internal attributes.
 
@@ -160,31 +178,22 @@ class node(object):
         else:
             udraw_image = ""
 
-        udraw = 'l("%08x",' % self.id
-        udraw += 'n("",'  # open node
-        udraw += '['      # open attributes
-        udraw += udraw_image
-        udraw += 'a("_GO","%s"),' % self.shape
-        udraw += 'a("COLOR","#%06x"),' % self.color
-        udraw += 'a("OBJECT","%s"),' % self.label
-        udraw += 'a("FONTFAMILY","courier"),'
-        udraw += 'a("INFO","%s"),' % self.udraw_info
-        udraw += 'a("BORDER","none")'
-        udraw += '],'     # close attributes
-        udraw += '['      # open edges
-
-        edges = graph.edges_from(self.id)
-
-        for edge in edges:
-            udraw += edge.render_edge_udraw(graph)
-            udraw += ','
-
-        if edges:
-            udraw = udraw[0:-1]
-
-        udraw += ']))'
-
-        return udraw
+        return "".join([
+            'l("%08x",' % self.id,
+            'n("",',  # open node
+            '[',      # open attributes
+            udraw_image,
+            'a("_GO","%s"),' % self.shape,
+            'a("COLOR","#%06x"),' % self.color,
+            'a("OBJECT","%s"),' % self.label,
+            'a("FONTFAMILY","courier"),',
+            'a("INFO","%s"),' % self.udraw_info,
+            'a("BORDER","none")',
+            '],',     # close attributes
+            '[',      # open edges
+            ",".join([edge.render_edge_udraw(graph) for edge in graph.edges_from(self.id)]),
+            ']))',
+        ])
 
     def render_node_udraw_update(self):
         """Render a node update description suitable for use in a uDraw using the set internal attributes.
@@ -202,15 +211,16 @@ class node(object):
         else:
             udraw_image = ""
 
-        udraw = 'new_node("%08x","",' % self.id
-        udraw += '['
-        udraw += udraw_image
-        udraw += 'a("_GO","%s"),' % self.shape
-        udraw += 'a("COLOR","#%06x"),' % self.color
-        udraw += 'a("OBJECT","%s"),' % self.label
-        udraw += 'a("FONTFAMILY","courier"),'
-        udraw += 'a("INFO","%s"),' % self.udraw_info
-        udraw += 'a("BORDER","none")'
-        udraw += ']'
-        udraw += ')'
-        return udraw
+        return "".join([
+            'new_node("%08x","",' % self.id,
+            '[',
+            udraw_image,
+            'a("_GO","%s"),' % self.shape,
+            'a("COLOR","#%06x"),' % self.color,
+            'a("OBJECT","%s"),' % self.label,
+            'a("FONTFAMILY","courier"),',
+            'a("INFO","%s"),' % self.udraw_info,
+            'a("BORDER","none")',
+            ']',
+            ')',
+        ])
@@ -1,13 +1,46 @@
 """Sulley primitives."""
+import binascii
+import hashlib
 import struct
 import random
 
 import os
 
+# bumped whenever the shape of the fuzz space changes (items pushed, fuzzable toggled). containers
+# cache their mutation counts against this value, see blocks.request.num_mutations().
+GENERATION = 0
+
+
+def invalidate_mutations():
+    """Discard all cached mutation counts, they are recalculated on next access."""
+    global GENERATION
+    GENERATION += 1
+
+
+def invalidating_attribute(attr):
+    """Create a property backed by the named attribute which invalidates mutation counts on write.
+
+    @type  attr: String
+    @param attr: Name of the instance attribute the property value is stored in
+
+    @rtype:  property
+    @return: Property to assign to a class attribute
+    """
+    def getter(self):
+        return getattr(self, attr)
+
+    def setter(self, value):
+        setattr(self, attr, value)
+        invalidate_mutations()
+
+    return property(getter, setter)
+
 
 class base_primitive(object):
     """The primitive base class implements common functionality shared across most primitives."""
 
+    fuzzable = invalidating_attribute("_fuzzable")
+
     def __init__(self):
         """Initialize."""
         self.fuzz_complete = False     # this flag is raised when the mutations are exhausted.
@@ -221,6 +254,23 @@ class group(base_primitive):
         return len(self.values)
 
 
+def random_bytes(generator, length):
+    """Generate a buffer of random bytes in one go.
+
+    @type  generator: random.Random
+    @param generator: Generator to draw the bytes from
+    @type  length:    Integer
+    @param length:    Number of bytes to generate
+
+    @rtype:  Raw
+    @return: Random bytes
+    """
+    if length <= 0:
+        return ""
+
+    return binascii.unhexlify("%0*x" % (length * 2, generator.getrandbits(length * 8)))
+
+
 class random_data (base_primitive):
     """Random data."""
 
@@ -269,10 +319,25 @@ class random_data (base_primitive):
         self.rendered = ""             # rendered value
         self.fuzz_complete = False          # flag if this primitive has been completely fuzzed
         self.mutant_index = 0              # current mutation number
+        self.seed = name               # seeds the mutations, assigned per node by the session.
 
         if self.step:
             self.max_mutations = (self.max_length - self.min_length) / self.step + 1
 
+    def generator(self, mutant_index):
+        """Random generator for a single mutation, seeded from the primitive seed and mutant index.
+
+        Mutation N of a primitive always renders the same bytes, in this run and the next.
+
+        @type  mutant_index: Integer
+        @param mutant_index: Mutation number
+
+        @rtype:  random.Random
+        @return: Seeded generator
+        """
+        digest = hashlib.sha1("%r:%d" % (self.seed, mutant_index)).hexdigest()
+        return random.Random(long(digest, 16))
+
     def mutate(self):
         """Mutate the primitive value returning False on completion.
 
@@ -288,17 +353,17 @@ class random_data (base_primitive):
             self.value = self.original_value
             return False
 
+        generator = self.generator(self.mutant_index)
+
         # select a random length for this string.
         if not self.step:
-            length = random.randint(self.min_length, self.max_length)
+            length = generator.randint(self.min_length, self.max_length)
         # select a length function of the mutant index and the step.
         else:
             length = self.min_length + self.mutant_index * self.step
 
-        # reset the value and generate a random string of the determined length.
-        self.value = ""
-        for i in range(length):
-            self.value += chr(random.randint(0, 255))
+        # generate a random string of the determined length.
+        self.value = random_bytes(generator, length)
 
         # increment the mutation count.
         self.mutant_index += 1
@@ -558,8 +623,12 @@ class string(base_primitive):
                 self.value = self.original_value
                 return False
 
-            # update the current value from the fuzz library.
-            self.value = (self.fuzz_library + self.this_library)[self.mutant_index]
+            # update the current value from the fuzz library, followed by the primitive specific
+            # library. index into them directly, concatenating copies the whole shared library.
+            if self.mutant_index < len(self.fuzz_library):
+                self.value = self.fuzz_library[self.mutant_index]
+            else:
+                self.value = self.this_library[self.mutant_index - len(self.fuzz_library)]
 
             # increment the mutation count.
             self.mutant_index += 1
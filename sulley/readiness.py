@@ -0,0 +1,223 @@
+"""Target readiness probes.
+
+A probe answers one question, "is the target ready yet?", and wait_ready() polls a set of probes with
+exponential backoff until they all agree or a timeout expires. Restarting a target then costs as long as the
+target actually takes to come back instead of a fixed sleep.
+"""
+import os
+import re
+import socket
+import time
+
+
+class probe(object):
+    """Base probe, always ready."""
+
+    def reset(self):
+        """Called once at the start of every wait, before the first poll."""
+        pass
+
+    def ready(self):
+        """Poll the target.
+
+        @rtype:  Boolean
+        @return: True if the target is ready, False otherwise
+        """
+        return True
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+
+class port_open(probe):
+    """Ready once a TCP port accepts connections."""
+
+    def __init__(self, host, port, timeout=1.0):
+        """Initialize.
+
+        @type  host:    String
+        @param host:    Hostname or IP address of target service
+        @type  port:    Integer
+        @param port:    Port of target service
+        @type  timeout: Float
+        @param timeout: (Optional, def=1.0) Seconds to wait for each connection attempt
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def connect(self):
+        return socket.create_connection((self.host, self.port), self.timeout)
+
+    def ready(self):
+        try:
+            self.connect().close()
+        except socket.error:
+            return False
+
+        return True
+
+    def __repr__(self):
+        return "<port_open %s:%d>" % (self.host, self.port)
+
+
+class banner_match(port_open):
+    """Ready once a TCP port accepts connections and greets with a banner matching a regular expression."""
+
+    def __init__(self, host, port, pattern, timeout=1.0, max_bytes=4096):
+        """Initialize.
+
+        @type  host:      String
+        @param host:      Hostname or IP address of target service
+        @type  port:      Integer
+        @param port:      Port of target service
+        @type  pattern:   String
+        @param pattern:   Regular expression searched for in the banner, ie: "^220 "
+        @type  timeout:   Float
+        @param timeout:   (Optional, def=1.0) Seconds to wait for the connection and for the banner
+        @type  max_bytes: Integer
+        @param max_bytes: (Optional, def=4096) Maximum number of banner bytes to read
+        """
+        port_open.__init__(self, host, port, timeout)
+        self.pattern = re.compile(pattern)
+        self.max_bytes = max_bytes
+
+    def ready(self):
+        banner = ""
+
+        try:
+            sock = self.connect()
+        except socket.error:
+            return False
+
+        try:
+            while len(banner) < self.max_bytes:
+                chunk = sock.recv(self.max_bytes - len(banner))
+                if not chunk:
+                    break
+
+                banner += chunk
+                if self.pattern.search(banner):
+                    return True
+        except socket.error:
+            pass
+        finally:
+            sock.close()
+
+        return False
+
+    def __repr__(self):
+        return "<banner_match %s:%d %r>" % (self.host, self.port, self.pattern.pattern)
+
+
+class callback(probe):
+    """Ready once a user supplied function returns True."""
+
+    def __init__(self, function):
+        """Initialize.
+
+        @type  function: Function
+        @param function: Function taking no arguments and returning True once the target is ready
+        """
+        self.function = function
+
+    def ready(self):
+        return bool(self.function())
+
+    def __repr__(self):
+        return "<callback %s>" % getattr(self.function, "__name__", self.function)
+
+
+class log_line(probe):
+    """Ready once a line matching a regular expression is appended to a log file."""
+
+    def __init__(self, filename, pattern):
+        """Initialize. Only lines written after the start of a wait are considered.
+
+        @type  filename: String
+        @param filename: Log file written by the target
+        @type  pattern:  String
+        @param pattern:  Regular expression searched for in new lines, ie: "listening on port"
+        """
+        self.filename = filename
+        self.pattern = re.compile(pattern)
+        self.offset = 0
+        self.partial = ""
+
+    def reset(self):
+        # skip over everything logged so far, the file may be truncated or rotated by the restart.
+        try:
+            self.offset = os.path.getsize(self.filename)
+        except OSError:
+            self.offset = 0
+
+        self.partial = ""
+
+    def ready(self):
+        try:
+            if os.path.getsize(self.filename) < self.offset:
+                self.offset = 0
+
+            with open(self.filename, "rb") as fh:
+                fh.seek(self.offset)
+                data = fh.read()
+                self.offset = fh.tell()
+        except (IOError, OSError):
+            return False
+
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+
+        for line in lines:
+            if self.pattern.search(line):
+                return True
+
+        return False
+
+    def __repr__(self):
+        return "<log_line %s %r>" % (self.filename, self.pattern.pattern)
+
+
+def wait_ready(probes, timeout=30.0, delay=0.05, max_delay=1.0, backoff=2.0, reset=True):
+    """Poll probes until all of them report ready, backing off exponentially between polls.
+
+    @type  probes:    readiness.probe or List
+    @param probes:    Probe, or list of probes which must all be ready
+    @type  timeout:   Float
+    @param timeout:   (Optional, def=30.0) Seconds to wait before giving up
+    @type  delay:     Float
+    @param delay:     (Optional, def=0.05) Seconds to wait after the first failed poll
+    @type  max_delay: Float
+    @param max_delay: (Optional, def=1.0) Upper bound on the wait between polls
+    @type  backoff:   Float
+    @param backoff:   (Optional, def=2.0) Factor the wait between polls grows by
+    @type  reset:     Boolean
+    @param reset:     (Optional, def=True) Reset the probes first. Pass False when they were reset
+                      before the target was started, so nothing it logs on the way up is missed
+
+    @rtype:  Boolean
+    @return: True if every probe was ready within the timeout, False otherwise
+    """
+    if isinstance(probes, probe):
+        probes = [probes]
+
+    deadline = time.time() + timeout
+    pending = list(probes)
+
+    if reset:
+        for p in pending:
+            p.reset()
+
+    while True:
+        # probes stay ready once they have been seen ready, ie: a log line only appears once.
+        pending = [p for p in pending if not p.ready()]
+
+        if not pending:
+            return True
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
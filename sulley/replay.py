@@ -0,0 +1,175 @@
+"""Replay log.
+
+Every test case a session sends is recorded as one compact line, enough to send it again without
+replaying the campaign up to it::
+
+    seed <session seed>
+    <case> <path edge ids> <node id> <node mutant index> <callback data hashes>
+    exhaust <path edge ids> <node mutant index> <mutations skipped>
+
+The edge ids along the path and the callback hashes are comma separated, "-" stands for an empty
+list. Fuzz nodes are deterministic given the session seed (see primitives.random_data), so stepping
+a fresh node to the recorded mutant index renders the recorded test case. Edge callbacks may inject
+data sulley has no control over, the hash of what they returned flags replays that diverged.
+Primitives cut short by the session, ie: on reaching the crash threshold, are recorded as the
+mutations skipped.
+"""
+import hashlib
+import os
+import threading
+
+
+def digest(data):
+    """Short hash of data injected by an edge callback.
+
+    @type  data: Raw
+    @param data: Data returned by the callback
+
+    @rtype:  String
+    @return: Hex digest
+    """
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+class case(object):
+    """Replay record of a single test case."""
+
+    def __init__(self, number, path, node, mutant_index, callback_hashes=()):
+        """Initialize.
+
+        @type  number:          Integer
+        @param number:          Global test case number, session.total_mutant_index
+        @type  path:            List
+        @param path:            Ids of the edges walked from the root node to the fuzz node
+        @type  node:            Integer
+        @param node:            Id of the fuzz node
+        @type  mutant_index:    Integer
+        @param mutant_index:    Number of mutations of the fuzz node up to and including this case
+        @type  callback_hashes: List
+        @param callback_hashes: (Optional, def=()) Digests of the data returned by edge callbacks
+        """
+        self.number = number
+        self.path = list(path)
+        self.node = node
+        self.mutant_index = mutant_index
+        self.callback_hashes = list(callback_hashes)
+
+    def __repr__(self):
+        return "<case %d node %d mutant %d>" % (self.number, self.node, self.mutant_index)
+
+
+def join(values):
+    return ",".join([str(value) for value in values]) or "-"
+
+
+def split(field):
+    if field == "-":
+        return []
+
+    return field.split(",")
+
+
+class log(object):
+    """Append only replay log, indexed by test case number."""
+
+    def __init__(self, filename):
+        """Open the log, picking up the records of earlier runs.
+
+        @type  filename: String
+        @param filename: Replay log file
+        """
+        self.filename = filename
+        self.seed = None
+        self.cases = {}     # test case number -> case. the last record of a number wins.
+        self.exhausts = {}  # tuple of path edge ids -> {node mutant index: mutations skipped}.
+        self.lock = threading.Lock()
+
+        if os.path.exists(filename):
+            for line in open(filename):
+                fields = line.split()
+
+                try:
+                    if fields[0] == "seed":
+                        # records under an earlier seed no longer render the same test cases.
+                        if fields[1] != self.seed:
+                            self.cases = {}
+                            self.exhausts = {}
+
+                        self.seed = fields[1]
+                        continue
+
+                    if fields[0] == "exhaust":
+                        path, mutant_index, skipped = fields[1:]
+                        path = tuple([long(edge) for edge in split(path)])
+                        self.exhausts.setdefault(path, {})[int(mutant_index)] = int(skipped)
+                        continue
+
+                    number, path, node, mutant_index, hashes = fields
+                    entry = case(int(number), [long(edge) for edge in split(path)], int(node),
+                                 int(mutant_index), split(hashes))
+                except (IndexError, ValueError):
+                    # a line cut short by a crash of the fuzzer.
+                    continue
+
+                self.cases[entry.number] = entry
+
+        self.fh = open(filename, "a")
+
+    def set_seed(self, seed):
+        """Record the session seed, the records that follow are only valid under it.
+
+        @type  seed: String
+        @param seed: Session seed
+        """
+        with self.lock:
+            if str(seed) == self.seed:
+                return
+
+            self.seed = str(seed)
+            self.cases = {}
+            self.exhausts = {}
+            self.fh.write("seed %s\n" % self.seed)
+            self.fh.flush()
+
+    def append(self, entry):
+        """Record a test case.
+
+        @type  entry: replay.case
+        @param entry: Test case to record
+        """
+        with self.lock:
+            self.cases[entry.number] = entry
+            self.fh.write("%d %s %d %d %s\n" % (
+                entry.number, join(entry.path), entry.node, entry.mutant_index,
+                join(entry.callback_hashes)))
+            self.fh.flush()
+
+    def exhaust(self, path, mutant_index, skipped):
+        """Record mutations of the fuzz node skipped by the session.
+
+        @type  path:         List
+        @param path:         Ids of the edges walked from the root node to the fuzz node
+        @type  mutant_index: Integer
+        @param mutant_index: Mutation of the fuzz node after which the rest of its primitive was
+                             skipped
+        @type  skipped:      Integer
+        @param skipped:      Number of mutations skipped
+        """
+        with self.lock:
+            self.exhausts.setdefault(tuple(path), {})[mutant_index] = skipped
+            self.fh.write("exhaust %s %d %d\n" % (join(path), mutant_index, skipped))
+            self.fh.flush()
+
+    def get(self, number):
+        """Look up a recorded test case.
+
+        @type  number: Integer
+        @param number: Test case number
+
+        @rtype:  replay.case
+        @return: The test case record, None if it was never recorded
+        """
+        return self.cases.get(number)
+
+    def close(self):
+        self.fh.close()
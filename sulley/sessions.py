@@ -1,10 +1,15 @@
 """Sessions module for Sulley."""
+import bisect
+import collections
 import httplib
+import json
 import logging
+import random
 import socket
 import sys
 import time
 import threading
+import urlparse
 import zlib
 import cPickle
 import BaseHTTPServer
@@ -14,11 +19,17 @@ import re
 
 
 import blocks
+import coverage
+import metrics
 import pedrpc
 import pgraph
+import readiness
+import replay
 import sex
 import primitives
 
+SEND_CHUNK = 64 * 1024  # small segments are coalesced into writes of about this size.
+
 
 class target(object):
     """Target descriptor container."""
@@ -38,9 +49,22 @@ class target(object):
         self.netmon = None
         self.procmon = None
         self.vmcontrol = None
+        self.covmon = None
         self.netmon_options = {}
         self.procmon_options = {}
         self.vmcontrol_options = {}
+        self.covmon_options = {}
+
+        # set when the process monitor pushes crashes through wait_for_crash(), ie:
+        # process_monitor_unix.py. the delay between test cases is then cut short by a crash.
+        self.procmon_push = False
+
+        # probes telling when the target is ready after a restart, see sulley.readiness. when left
+        # as None the session probes the target port for tcp and ssl.
+        self.readiness = None
+
+        # (test case number, payloads) of the last test cases sent, see session(crash_history).
+        self.history = collections.deque()
 
     def pedrpc_connect(self):
         """Pass specified target parameters to the PED-RPC server."""
@@ -72,6 +96,20 @@ class target(object):
             for key in self.netmon_options.keys():
                 eval('self.netmon.set_%s(self.netmon_options["%s"])' % (key, key))
 
+        # If the coverage monitor is alive, set it's options
+        if self.covmon:
+            while 1:
+                try:
+                    if self.covmon.alive():
+                        break
+                except:
+                    pass
+                time.sleep(1)
+
+            # connection established.
+            for key in self.covmon_options.keys():
+                eval('self.covmon.set_%s(self.covmon_options["%s"])' % (key, key))
+
 
 class connection(pgraph.edge):
     """Connection class."""
@@ -123,6 +161,12 @@ class session(pgraph.graph):
         crash_threshold=3,
         restart_sleep_time=300,
         tls_version=None,
+        scatter_gather=True,
+        seed=None,
+        replay_filename=None,
+        crash_history=0,
+        coverage_patience=500,
+        interleave=False,
     ):
         """Extend pgraph.graph and provides a container for architecting protocol dialogs.
 
@@ -153,11 +197,33 @@ class session(pgraph.graph):
         @kwarg crash_threshold     (Optional, def=3) Maximum number of crashes allowed before a node
                                     is exhaust
         @type  restart_sleep_time: Integer
-        @kwarg restart_sleep_time: Optional, def=300) Time in seconds to sleep when target can't be
-                                    restarted
+        @kwarg restart_sleep_time: (Optional, def=300) Maximum time in seconds to wait for the
+                                    target to become ready after a restart
         @type  web_port:	   Integer
         @kwarg web_port:           (Optional, def=26000) Port for monitoring fuzzing campaign via a
                                     web browser
+        @type  scatter_gather:     Boolean
+        @kwarg scatter_gather:     (Optional, def=True) Write stream test cases straight from the
+                                    rendered segments instead of concatenating them first
+        @type  seed:               String
+        @kwarg seed:               (Optional, def=random) Seed every random mutation is derived
+                                    from, a resumed session keeps the seed it was started with
+        @type  replay_filename:    String
+        @kwarg replay_filename:    (Optional, def=None) Filename to record every test case to, see
+                                    replay()
+        @type  crash_history:      Integer
+        @kwarg crash_history:      (Optional, def=0) Number of recent test cases to keep per target.
+                                    If set, every crash is verified by replaying the crashing test
+                                    case on its own, and the history is bisected when it does not
+                                    reproduce, see attribute_crash()
+        @type  coverage_patience:  Integer
+        @kwarg coverage_patience:  (Optional, def=500) With a coverage monitor on the target, the
+                                    rest of the mutations of a primitive are skipped after this
+                                    many test cases in a row without new coverage, 0 to disable
+        @type  interleave:         Boolean
+        @kwarg interleave:         (Optional, def=False) Mutate the fields of every request in
+                                    turns instead of one after the other, see
+                                    blocks.request.mutate_interleaved()
         """
         # run the parent classes initialization routine first.
         pgraph.graph.__init__(self)
@@ -172,8 +238,25 @@ class session(pgraph.graph):
         self.timeout = timeout
         self.web_port = web_port
         self.crash_threshold = crash_threshold
+        self.crash_history = crash_history
         self.restart_sleep_time = restart_sleep_time
         self.tls_version = tls_version
+        self.scatter_gather = scatter_gather
+        self.interleave = interleave
+        self.seed = seed
+        self.replay_log = None
+        self.callback_hashes = []   # digests of the data edge callbacks returned for this case.
+        self.case_payloads = []     # segments of every node sent for this case.
+        self.crash_sequences = {}   # test case number -> test cases needed to reproduce the crash.
+        self.replaying = False      # set while replay() resends recorded test cases.
+        self.replay_results = {}    # test case number -> crash synopsis of a replayed test case.
+        self.coverage = coverage.scheduler(coverage_patience)
+
+        if self.seed is None:
+            self.seed = "%016x" % random.SystemRandom().getrandbits(64)
+
+        if replay_filename:
+            self.replay_log = replay.log(replay_filename)
         # Initialize logger
         self.logger = logging.getLogger("Sulley_logger")
         self.logger.setLevel(log_level)
@@ -193,12 +276,17 @@ class session(pgraph.graph):
         self.total_num_mutations = 0
         self.total_mutant_index = 0
         self.fuzz_node = None
+        self.fuzz_path = None       # edges from the root node to the fuzz node.
         self.targets = []
         self.netmon_results = {}
         self.procmon_results = {}
         self.protmon_results = {}
         self.pause_flag = False
         self.crashing_primitives = {}
+        self.mutation_total = None  # cached ((primitives gen, graph gen), total) pair.
+        self.metrics = metrics.metrics()
+        self.crash_keys = []        # sorted test case numbers in procmon_results, for paging.
+        self.current_path = ""
 
         if self.proto == "tcp":
             self.proto = socket.SOCK_STREAM
@@ -240,10 +328,36 @@ class session(pgraph.graph):
         node.number = len(self.nodes)
         node.id = len(self.nodes)
 
-        if node.id not in self.nodes:
-            self.nodes[node.id] = node
+        if isinstance(node, blocks.request):
+            self.seed_node(node)
+
+            if self.interleave:
+                node.interleave = True
+
+        return pgraph.graph.add_node(self, node)
+
+    def reseed(self, seed):
+        """Switch the session to another seed and reseed every request in the graph.
+
+        @type  seed: String
+        @param seed: Session seed
+        """
+        self.seed = seed
+
+        for node in self.nodes.values():
+            if isinstance(node, blocks.request):
+                self.seed_node(node)
 
-        return self
+    def seed_node(self, node):
+        """Seed the random data primitives of a request from the session seed, the request name and
+        their position.
+
+        @type  node: Request (Node)
+        @param node: Request to seed
+        """
+        for position, item in enumerate(node.walk()):
+            if isinstance(item, primitives.random_data):
+                item.seed = "%s:%s:%d" % (self.seed, node.name, position)
 
     def add_target(self, target):
         """Add a target to the session. Multiple targets can be added for parallel fuzzing.
@@ -254,6 +368,8 @@ class session(pgraph.graph):
         # pass specified target parameters to the PED-RPC server.
         target.pedrpc_connect()
 
+        target.history = collections.deque(maxlen=self.crash_history)
+
         # add target to internal list.
         self.targets.append(target)
 
@@ -302,12 +418,13 @@ class session(pgraph.graph):
             dst = src
             src = self.root
 
-        # if source or destination is a name, resolve the actual node.
+        # if source or destination is a name, resolve the actual node. requests which are not yet in
+        # the graph are looked up (and built, if lazily defined) in the request registry.
         if type(src) is str:
-            src = self.find_node("name", src)
+            src = self.find_node("name", src) or self.resolve_request(src)
 
         if type(dst) is str:
-            dst = self.find_node("name", dst)
+            dst = self.find_node("name", dst) or self.resolve_request(dst)
 
         # if source or destination is not in the graph, add it.
         if src != self.root and not self.find_node("name", src.name):
@@ -322,6 +439,225 @@ class session(pgraph.graph):
 
         return edge
 
+    def attribute_crash(self, target, history):
+        """Find out which of the recent test cases a crash of the target is down to.
+
+        The crashing test case is sent on its own to the restarted target. If that does not crash
+        it, the crash built up over earlier test cases, ie: heap corruption surfacing later, and the
+        shortest run of recent test cases which still crashes the target is bisected out of the
+        history. It is recorded in crash_sequences, empty if even the whole history does not crash
+        the target. Such a crash is still put down to the crashing test case, there is nothing else
+        to blame it on.
+
+        @type  target:  session.target
+        @param target:  Crashed and restarted target, with a process monitor
+        @type  history: List
+        @param history: (test case number, payloads) of the test cases sent before the crash
+
+        @rtype:  Boolean
+        @return: False if the crash is down to earlier test cases, True otherwise
+        """
+        number = self.total_mutant_index
+
+        if not history or history[-1][0] != number:
+            return True
+
+        def crashes(cases):
+            # every attempt starts out from a freshly restarted target.
+            if self.send_payloads(target, [payloads for case, payloads in cases], number):
+                return True
+
+            self.restart_target(target, stop_first=True)
+            return False
+
+        if crashes(history[-1:]):
+            self.logger.info("test case #%d reproduces the crash on its own", number)
+            return True
+
+        if not crashes(history):
+            self.logger.warning(
+                "crash on test case #%d does not reproduce with the last %d test cases",
+                number, len(history))
+            self.crash_sequences[number] = []
+            return True
+
+        # history[low:] crashes the target, history[high:] does not.
+        low, high = 0, len(history) - 1
+
+        while high - low > 1:
+            middle = (low + high) / 2
+
+            if crashes(history[middle:]):
+                low = middle
+            else:
+                high = middle
+
+        self.crash_sequences[number] = [case for case, payloads in history[low:]]
+        self.logger.warning("crash on test case #%d takes test cases %s", number,
+                            ", ".join(["#%d" % case for case in self.crash_sequences[number]]))
+
+        return False
+
+    def case_error(self, e, msg, target, sock=None):
+        """Exception error handling routine, log the failure and restart the target.
+
+        @type  e:      Exception
+        @param e:      Exception caught
+        @type  msg:    String
+        @param msg:    Description of the failed step
+        @type  target: session.target
+        @param target: Target to restart
+        @type  sock:   Socket
+        @param sock:   (Optional, def=None) Socket to close
+        """
+        if sock:
+            sock.close()
+
+        msg += "\nException caught: %s" % repr(e)
+        msg += "\nRestarting target and trying again"
+
+        self.metrics.incr("errors")
+        self.logger.critical(msg)
+        self.restart_target(target)
+
+    def transmit_case(self, target, path):
+        """Connect to the target and send a test case, the nodes up the path then the fuzz node.
+
+        Keeps trying until the test case was sent, whenever a failure occurs the target is
+        restarted.
+
+        @type  target: session.target
+        @param target: Target to send the test case to
+        @type  path:   List
+        @param path:   Edges from the root node to the fuzz node
+
+        @rtype:  Socket
+        @return: Socket the test case was sent on
+        """
+        while 1:
+            self.callback_hashes = []
+            self.case_payloads = []
+
+            # instruct the debugger/sniffer that we are about to send a new fuzz.
+            if target.procmon:
+                try:
+                    with self.metrics.timer("monitor"):
+                        target.procmon.pre_send(self.total_mutant_index)
+                except Exception, e:
+                    self.case_error(e, "failed on procmon.pre_send()", target)
+                    continue
+
+            if target.netmon:
+                try:
+                    with self.metrics.timer("monitor"):
+                        target.netmon.pre_send(self.total_mutant_index)
+                except Exception, e:
+                    self.case_error(e, "failed on netmon.pre_send()", target)
+                    continue
+
+            if target.covmon:
+                try:
+                    with self.metrics.timer("monitor"):
+                        target.covmon.pre_send(self.total_mutant_index)
+                except Exception, e:
+                    self.case_error(e, "failed on covmon.pre_send()", target)
+                    continue
+
+            try:
+                # establish a connection to the target.
+                (family, socktype, proto, canonname, sockaddr) = socket.getaddrinfo(
+                    target.host, target.port)[0]
+                sock = socket.socket(family, self.proto)
+            except Exception, e:
+                self.case_error(e, "failed creating socket", target)
+                continue
+
+            if self.bind:
+                try:
+                    sock.bind(self.bind)
+                except Exception, e:
+                    self.case_error(e, "failed binding on socket", target, sock)
+                    continue
+
+            try:
+                sock.settimeout(self.timeout)
+                # Connect is needed only for TCP stream
+                if self.proto == socket.SOCK_STREAM:
+                    with self.metrics.timer("connect"):
+                        sock.connect((target.host, target.port))
+            except Exception, e:
+                self.case_error(e, "failed connecting on socket", target, sock)
+                continue
+
+            # if SSL is requested, then enable it.
+            if self.ssl:
+                try:
+                    import ssl
+                    ctx = ssl.SSLContext(self.tls_version)
+                    with self.metrics.timer("tls"):
+                        sock = ctx.wrap_socket(
+                            sock,
+                            server_hostname=target.host,
+                        )
+                    # sock = httplib.FakeSocket(sock, ssl)
+                except Exception, e:
+                    self.case_error(e, "failed ssl setup", target, sock)
+                    continue
+
+            # if the user registered a pre-send function, pass it the sock and
+            # let it do the deed.
+            try:
+                self.pre_send(sock)
+            except Exception, e:
+                self.case_error(e, "pre_send() failed", target, sock)
+                continue
+
+            # send out valid requests for each node in the current path up to the node
+            # we are fuzzing.
+            try:
+                with self.metrics.timer("path"):
+                    for e in path[:-1]:
+                        node = self.nodes[e.dst]
+                        self.transmit(sock, node, e, target)
+            except Exception, e:
+                self.case_error(e, "failed transmitting a node up the path", target, sock)
+                continue
+
+            # now send the current node we are fuzzing.
+            try:
+                self.transmit(sock, self.fuzz_node, path[-1], target)
+            except Exception, e:
+                self.case_error(e, "failed transmitting fuzz node", target, sock)
+                continue
+
+            # if we reach this point the send was successful
+            return sock
+
+    def exhaust_mutant(self):
+        """Skip the remaining mutations of the primitive being fuzzed.
+
+        Groups and repeats are left alone. The skipped mutations are recorded in the replay log, so
+        replay() steps the fuzz node the same way.
+
+        @rtype:  Integer
+        @return: Number of mutations skipped
+        """
+        mutant = self.fuzz_node.mutant
+
+        if isinstance(mutant, (primitives.group, blocks.repeat)):
+            return 0
+
+        mutant_index = self.fuzz_node.mutant_index
+        skipped = mutant.exhaust()
+        self.total_mutant_index += skipped
+        self.fuzz_node.mutant_index += skipped
+
+        # test cases sent by replay() are not part of the recorded campaign.
+        if self.replay_log and self.fuzz_path:
+            self.replay_log.exhaust([e.id for e in self.fuzz_path], mutant_index, skipped)
+
+        return skipped
+
     def export_file(self):
         """Dump various object values to disk.
 
@@ -347,6 +683,8 @@ class session(pgraph.graph):
         data['protmon_results'] = self.protmon_results
         data["pause_flag"] = self.pause_flag
         data["tls_version"] = self.tls_version
+        data["seed"] = self.seed
+        data["crash_sequences"] = self.crash_sequences
         with open(self.session_filename, "wb+") as fh:
             fh.write(zlib.compress(cPickle.dumps(data, protocol=2)))
 
@@ -372,6 +710,9 @@ class session(pgraph.graph):
 
             this_node = self.root
 
+            if self.replay_log:
+                self.replay_log.set_seed(self.seed)
+
             try:
                 self.server_init()
             except:
@@ -390,13 +731,15 @@ class session(pgraph.graph):
             # we keep track of edges as opposed to nodes because if there is more then one path
             # through a set of given nodes we don't want any ambiguity.
             path.append(edge)
+            self.fuzz_path = list(path)
 
             current_path = " -> ".join([self.nodes[e.src].name for e in path[1:]])
             current_path += " -> %s" % self.fuzz_node.name
 
-            self.logger.info("current fuzz path: %s" % current_path)
-            self.logger.info("fuzzed %d of %d total cases" % (
-                self.total_mutant_index, self.total_num_mutations))
+            self.current_path = current_path
+            self.logger.info("current fuzz path: %s", current_path)
+            self.logger.info(
+                "fuzzed %d of %d total cases", self.total_mutant_index, self.total_num_mutations)
 
             done_with_fuzz_node = False
             # crash_count = 0
@@ -409,7 +752,10 @@ class session(pgraph.graph):
                 # if we have exhausted the mutations of the fuzz node, break out of the while(1).
                 # note: when mutate() returns False, the node has been reverted to the default
                 # (valid) state.
-                if not self.fuzz_node.mutate():
+                with self.metrics.timer("mutate"):
+                    mutated = self.fuzz_node.mutate()
+
+                if not mutated:
                     self.logger.error("all possible mutations for current fuzz node exhausted")
                     done_with_fuzz_node = True
                     continue
@@ -419,109 +765,26 @@ class session(pgraph.graph):
 
                 # if we've hit the restart interval, restart the target.
                 if self.restart_interval and self.total_mutant_index % self.restart_interval == 0:
-                    self.logger.error("restart interval of %d reached" % self.restart_interval)
+                    self.logger.error("restart interval of %d reached", self.restart_interval)
                     self.restart_target(target)
 
-                # exception error handling routine, print log message and restart target.
-                def error_handler(e, msg, target, sock=None):
-                    if sock:
-                        sock.close()
+                # if we don't need to skip the current test case.
+                if self.total_mutant_index > self.skip:
+                    self.logger.info("fuzzing %d of %d", self.fuzz_node.mutant_index, num_mutations)
 
-                    msg += "\nException caught: %s" % repr(e)
-                    msg += "\nRestarting target and trying again"
+                    # attempt to complete a fuzz transmission, restarting the target on failure.
+                    sock = self.transmit_case(target, path)
 
-                    self.logger.critical(msg)
-                    self.restart_target(target)
+                    if self.crash_history:
+                        target.history.append((self.total_mutant_index, self.case_payloads))
 
-                # if we don't need to skip the current test case.
-                if self.total_mutant_index > self.skip:
-                    self.logger.info("fuzzing %d of %d" % (
-                        self.fuzz_node.mutant_index, num_mutations))
-
-                    # attempt to complete a fuzz transmission. keep trying until we are successful,
-                    # whenever a failure occurs, restart the target.
-                    while 1:
-                        # instruct the debugger/sniffer that we are about to send a new fuzz.
-                        if target.procmon:
-                            try:
-                                target.procmon.pre_send(self.total_mutant_index)
-                            except Exception, e:
-                                error_handler(e, "failed on procmon.pre_send()", target)
-                                continue
-
-                        if target.netmon:
-                            try:
-                                target.netmon.pre_send(self.total_mutant_index)
-                            except Exception, e:
-                                error_handler(e, "failed on netmon.pre_send()", target)
-                                continue
-
-                        try:
-                            # establish a connection to the target.
-                            (family, socktype, proto, canonname, sockaddr) = socket.getaddrinfo(
-                                target.host, target.port)[0]
-                            sock = socket.socket(family, self.proto)
-                        except Exception, e:
-                            error_handler(e, "failed creating socket", target)
-                            continue
-
-                        if self.bind:
-                            try:
-                                sock.bind(self.bind)
-                            except Exception, e:
-                                error_handler(e, "failed binding on socket", target, sock)
-                                continue
-
-                        try:
-                            sock.settimeout(self.timeout)
-                            # Connect is needed only for TCP stream
-                            if self.proto == socket.SOCK_STREAM:
-                                sock.connect((target.host, target.port))
-                        except Exception, e:
-                            error_handler(e, "failed connecting on socket", target, sock)
-                            continue
-
-                        # if SSL is requested, then enable it.
-                        if self.ssl:
-                            try:
-                                import ssl
-                                ctx = ssl.SSLContext(self.tls_version)
-                                sock = ctx.wrap_socket(
-                                    sock,
-                                    server_hostname=target.host,
-                                )
-                                # sock = httplib.FakeSocket(sock, ssl)
-                            except Exception, e:
-                                error_handler(e, "failed ssl setup", target, sock)
-                                continue
-
-                        # if the user registered a pre-send function, pass it the sock and
-                        # let it do the deed.
-                        try:
-                            self.pre_send(sock)
-                        except Exception, e:
-                            error_handler(e, "pre_send() failed", target, sock)
-                            continue
-
-                        # send out valid requests for each node in the current path up to the node
-                        # we are fuzzing.
-                        try:
-                            for e in path[:-1]:
-                                node = self.nodes[e.dst]
-                                self.transmit(sock, node, e, target)
-                        except Exception, e:
-                            error_handler(e, "failed transmitting a node up the path", target, sock)
-                            continue
-
-                        # now send the current node we are fuzzing.
-                        try:
-                            self.transmit(sock, self.fuzz_node, edge, target)
-                        except Exception, e:
-                            error_handler(e, "failed transmitting fuzz node", target, sock)
-                            continue
-
-                        # if we reach this point the send was successful
-                        break
+                    if self.replay_log:
+                        self.replay_log.append(replay.case(
+                            self.total_mutant_index,
+                            [e.id for e in path],
+                            self.fuzz_node.id,
+                            self.fuzz_node.mutant_index,
+                            self.callback_hashes))
 
                     # if the user registered a post-send function, pass it the sock
                     # we do this outside the try/except loop if our fuzz causes a crash then
@@ -529,20 +792,28 @@ class session(pgraph.graph):
                     try:
                         self.post_send(sock)
                     except Exception, e:
-                        error_handler(e, "post_send() failed", target, sock)
+                        self.case_error(e, "post_send() failed", target, sock)
 
                     # done with the socket.
                     sock.close()
 
                     # delay in between test cases.
-                    self.logger.info("sleeping for %f seconds" % self.sleep_time)
-                    time.sleep(self.sleep_time)
+                    self.logger.info("sleeping for %f seconds", self.sleep_time)
+                    with self.metrics.timer("sleep"):
+                        if target.procmon and target.procmon_push:
+                            target.procmon.wait_for_crash(self.sleep_time)
+                        else:
+                            time.sleep(self.sleep_time)
 
                     # poll the PED-RPC endpoints (netmon, procmon etc...) for the target.
-                    self.poll_pedrpc(target)
+                    with self.metrics.timer("monitor"):
+                        self.poll_pedrpc(target)
 
                     # serialize the current session state to disk.
-                    self.export_file()
+                    with self.metrics.timer("export"):
+                        self.export_file()
+
+                    self.metrics.case()
 
             # recursively fuzz the remainder of the nodes in the session graph.
             self.fuzz(self.fuzz_node, path)
@@ -570,6 +841,9 @@ class session(pgraph.graph):
 
         @see: export_file()
         """
+        if not self.session_filename:
+            return
+
         with open(self.session_filename, "rb") as fh:
             data = cPickle.loads(zlib.decompress(fh.read()))
 
@@ -588,9 +862,12 @@ class session(pgraph.graph):
         self.total_mutant_index = data["total_mutant_index"]
         self.netmon_results = data["netmon_results"]
         self.procmon_results = data["procmon_results"]
+        self.crash_keys = sorted(self.procmon_results)
         self.protmon_results = data["protmon_results"]
         self.pause_flag = data["pause_flag"]
         self.tls_version = data["tls_version"]
+        self.seed = data.get("seed", self.seed)
+        self.crash_sequences = data.get("crash_sequences", {})
 
     """
     ####################################################################################################################
@@ -617,6 +894,10 @@ class session(pgraph.graph):
         for inline comments. The member varialbe self.total_num_mutations is updated appropriately
         by this routine.
 
+        The total is cached until the graph, or the mutation count of any request, changes.
+        Exhausting a primitive does not change the total, the skipped mutants are credited to
+        total_mutant_index instead.
+
         @type  this_node: request (node)
         @param this_node: (Optional, def=None) Current node that is being fuzzed.
         @type  path:      List
@@ -626,8 +907,16 @@ class session(pgraph.graph):
         @return: Total number of mutations in this session.
         """
         if not this_node:
-            this_node = self.root
+            key = (primitives.GENERATION, self.generation)
+
+            if self.mutation_total and self.mutation_total[0] == key:
+                self.total_num_mutations = self.mutation_total[1]
+                return self.total_num_mutations
+
             self.total_num_mutations = 0
+            self.num_mutations(self.root, [])
+            self.mutation_total = (key, self.total_num_mutations)
+            return self.total_num_mutations
 
         for edge in self.edges_from(this_node.id):
             next_node = self.nodes[edge.dst]
@@ -661,19 +950,49 @@ class session(pgraph.graph):
         # kill the pcap thread and see how many bytes the sniffer recorded.
         if target.netmon:
             bytes = target.netmon.post_send()
-            self.logger.info("netmon captured %d bytes for test case #%d" % (
-                bytes, self.total_mutant_index))
-            self.netmon_results[self.total_mutant_index] = bytes
+            self.logger.info(
+                "netmon captured %d bytes for test case #%d", bytes, self.total_mutant_index)
+
+            if not self.replaying:
+                self.netmon_results[self.total_mutant_index] = bytes
+
+        # drop primitives which stopped reaching new code.
+        if target.covmon and self.replaying:
+            target.covmon.post_send()
+
+        elif target.covmon:
+            new = target.covmon.post_send()
+            self.metrics.incr("coverage", new)
+
+            if new:
+                self.logger.info("test case #%d reached %d new edges", self.total_mutant_index, new)
+
+            if self.coverage.record(self.fuzz_node.mutant, new):
+                skipped = self.exhaust_mutant()
+
+                if skipped:
+                    self.logger.warning(
+                        "no new coverage in %d test cases, exhausting %d mutants.",
+                        self.coverage.patience, skipped)
 
         # check if our fuzz crashed the target. procmon.post_send() returns False if the
         # target access violated.
         if target.procmon and not target.procmon.post_send():
-            self.logger.info(
-                "procmon detected access violation on test case #%d" % self.total_mutant_index)
+            # replayed test cases leave the crash accounting of the campaign alone.
+            if self.replaying:
+                self.replay_results[self.total_mutant_index] = target.procmon.get_crash_synopsis()
+                self.logger.info("test case #%d crashed the target on replay: %s",
+                                 self.total_mutant_index,
+                                 self.replay_results[self.total_mutant_index].split("\n")[0])
 
-            # retrieve the primitive that caused the crash and increment it's individual crash count
-            self.crashing_primitives[self.fuzz_node.mutant] = self.crashing_primitives.get(
-                self.fuzz_node.mutant, 0) + 1
+                if self.restart_target(target, stop_first=False) is False:
+                    self.logger.critical("Restarting the target failed.")
+
+                return
+
+            self.metrics.incr("crashes")
+            self.logger.info(
+                "procmon detected access violation on test case #%d", self.total_mutant_index)
 
             # notify with as much information as possible.
             if self.fuzz_node.mutant.name:
@@ -686,20 +1005,18 @@ class session(pgraph.graph):
             self.logger.info(msg)
 
             # print crash synopsis
+            if self.total_mutant_index not in self.procmon_results:
+                bisect.insort(self.crash_keys, self.total_mutant_index)
+
             self.procmon_results[self.total_mutant_index] = target.procmon.get_crash_synopsis()
             self.logger.info(self.procmon_results[self.total_mutant_index].split("\n")[0])
 
-            # if the user-supplied crash threshold is reached, exhaust this node.
-            if self.crashing_primitives[self.fuzz_node.mutant] >= self.crash_threshold:
-                # as long as we're not a group and not a repeat.
-                if not isinstance(self.fuzz_node.mutant, primitives.group):
-                    if not isinstance(self.fuzz_node.mutant, blocks.repeat):
-                        skipped = self.fuzz_node.mutant.exhaust()
-                        self.logger.warning(
-                            "crash threshold reached for this primitive, exhausting %d mutants." % (
-                                skipped))
-                        self.total_mutant_index += skipped
-                        self.fuzz_node.mutant_index += skipped
+            # have a network monitor capturing into a ring save the packets leading up to the crash.
+            if target.netmon:
+                target.netmon.persist(self.total_mutant_index)
+
+            # the restart forgets the test cases leading up to the crash.
+            history = list(target.history)
 
             # start the target back up.
             # If it returns False, stop the test
@@ -712,6 +1029,23 @@ class session(pgraph.graph):
                     self.logger.debug("No server launched")
                 sys.exit(0)
 
+            # only charge the primitive if the test case crashes the target on its own.
+            if self.crash_history and not self.attribute_crash(target, history):
+                return
+
+            # retrieve the primitive that caused the crash and increment it's individual crash count
+            self.crashing_primitives[self.fuzz_node.mutant] = self.crashing_primitives.get(
+                self.fuzz_node.mutant, 0) + 1
+
+            # if the user-supplied crash threshold is reached, exhaust this node.
+            if self.crashing_primitives[self.fuzz_node.mutant] >= self.crash_threshold:
+                skipped = self.exhaust_mutant()
+
+                if skipped:
+                    self.logger.warning(
+                        "crash threshold reached for this primitive, exhausting %d mutants.",
+                        skipped)
+
     def post_send(self, sock):
         """Overload or replace this routine to specify actions to run after to each fuzz request.
 
@@ -746,43 +1080,222 @@ class session(pgraph.graph):
         # default to doing nothing.
         pass
 
+    def replay(self, case_numbers, target=None):
+        """Send recorded test cases again, without replaying the campaign leading up to them.
+
+        Meant for a fresh session built from the same script as the one that recorded the replay
+        log, the fuzz nodes are stepped to the recorded mutations and left there. Crashes go to
+        replay_results instead of procmon_results, and no primitive is charged or exhausted.
+
+        @type  case_numbers: List
+        @param case_numbers: Test case numbers to send, ie: the crashes from procmon_results
+        @type  target:       session.target
+        @param target:       (Optional, def=first target) Target to send the test cases to
+
+        @rtype:  List
+        @return: Test case numbers whose edge callbacks returned different data than recorded
+        """
+        if not self.replay_log:
+            raise sex.SullyRuntimeError("NO REPLAY LOG SPECIFIED IN SESSION")
+
+        if target is None:
+            target = self.targets[0]
+
+        cases = []
+
+        for number in case_numbers:
+            entry = self.replay_log.get(number)
+
+            if not entry:
+                raise sex.SullyRuntimeError("TEST CASE NOT IN REPLAY LOG: %d" % number)
+
+            cases.append(entry)
+
+        # the random primitives must draw from the streams of the recording session.
+        self.reseed(self.replay_log.seed)
+
+        # stepping a node forwards is cheap, stepping it backwards means starting over.
+        cases.sort(key=lambda entry: (entry.node, entry.mutant_index))
+        diverged = []
+        self.fuzz_path = None
+        total_mutant_index = self.total_mutant_index
+        self.replaying = True
+
+        try:
+            for entry in cases:
+                path = self.load_case(entry)
+                self.total_mutant_index = entry.number
+
+                self.logger.info("replaying test case %d", entry.number)
+                sock = self.transmit_case(target, path)
+
+                if self.callback_hashes != entry.callback_hashes:
+                    self.logger.warning(
+                        "test case %d diverged, edge callbacks sent different data", entry.number)
+                    diverged.append(entry.number)
+
+                try:
+                    self.post_send(sock)
+                except Exception, e:
+                    self.case_error(e, "post_send() failed", target, sock)
+
+                sock.close()
+
+                if target.procmon and target.procmon_push:
+                    target.procmon.wait_for_crash(self.sleep_time)
+                else:
+                    time.sleep(self.sleep_time)
+
+                self.poll_pedrpc(target)
+        finally:
+            self.replaying = False
+            self.total_mutant_index = total_mutant_index
+
+        return diverged
+
+    def load_case(self, entry):
+        """Bring the graph into the state it was in when a recorded test case was sent.
+
+        @type  entry: replay.case
+        @param entry: Recorded test case
+
+        @rtype:  List
+        @return: Edges from the root node to the fuzz node, which is made the current fuzz_node
+        """
+        path = [self.edges[edge_id] for edge_id in entry.path]
+
+        # the nodes up the path were exhausted, ie: back to their original values, by the time the
+        # recording session fuzzed the node.
+        for edge in path[:-1]:
+            self.nodes[edge.dst].reset()
+
+            # request.reset() leaves mutant_index at 1, seek() counts from 0.
+            self.nodes[edge.dst].mutant_index = 0
+
+        self.fuzz_node = self.nodes[entry.node]
+        self.seek(self.fuzz_node, entry.mutant_index,
+                  self.replay_log.exhausts.get(tuple(entry.path)))
+
+        return path
+
+    def seek(self, node, mutant_index, exhausts=None):
+        """Step a request to the state it was in after a number of mutations.
+
+        @type  node:         Request (Node)
+        @param node:         Request to step
+        @type  mutant_index: Integer
+        @param mutant_index: Number of mutations, request.mutant_index after the wanted mutation
+        @type  exhausts:     Dictionary
+        @param exhausts:     (Optional, def=None) Mutation index -> number of mutations skipped at
+                             that point by exhaust_mutant(), see replay.log.exhaust()
+        """
+        exhausts = exhausts or {}
+        exhausted = None
+
+        if node.mutant_index > mutant_index:
+            node.reset()
+            node.mutant_index = 0
+
+        while node.mutant_index < mutant_index:
+            if node.mutant_index in exhausts and node.mutant_index != exhausted:
+                exhausted = node.mutant_index
+                node.mutant_index += node.mutant.exhaust()
+                continue
+
+            if not node.mutate():
+                raise sex.SullyRuntimeError(
+                    "MUTATION %d OF %s OUT OF RANGE" % (mutant_index, node.name))
+
+    def resolve_request(self, name):
+        """Look up a request by name in the request registry, building lazily defined ones.
+
+        @type  name: String
+        @param name: Name of request
+
+        @rtype:  blocks.request
+        @return: The named request.
+        """
+        req = blocks.materialize(name)
+
+        if req is None:
+            raise sex.SullyRuntimeError("blocks.REQUESTS NOT FOUND: %s" % name)
+
+        return req
+
     def restart_target(self, target, stop_first=True):
         """Restart the fuzz target.
 
-        If a VMControl is available revert the snapshot, if a process monitor is available
-        restart the target process. Otherwise, do nothing.
+        If a VMControl is available revert the snapshot (or swap in a warm standby VM and follow
+        it to its endpoint), if a process monitor is available restart the target process.
+        Otherwise, do nothing.
 
         @type  target: session.target
         @param target: Target we are restarting
         """
-        # vm restarting is the preferred method so try that first.
-        if target.vmcontrol:
-            self.logger.warning("restarting target virtual machine")
-            target.vmcontrol.restart_target()
+        self.metrics.incr("restarts")
 
-        # if we have a connected process monitor, restart the target process.
-        elif target.procmon:
-            self.logger.warning("restarting target process")
-            if stop_first:
-                target.procmon.stop_target()
+        # whatever state the recent test cases built up in the target is gone.
+        target.history.clear()
 
-            if not target.procmon.start_target():
-                return False
+        with self.metrics.timer("restart"):
+            # vm restarting is the preferred method so try that first.
+            if target.vmcontrol:
+                self.logger.warning("restarting target virtual machine")
+                endpoint = target.vmcontrol.restart_target()
 
-            # give the process a few seconds to settle in.
-            time.sleep(3)
+                # a warm standby may have been swapped in, follow it to its service endpoint.
+                if endpoint:
+                    target.host, target.port = endpoint
+                    self.logger.info("target endpoint is now %s:%d", target.host, target.port)
 
-        # otherwise all we can do is wait a while for the target to recover on its own.
-        else:
-            self.logger.error(
-                "no vmcontrol or procmon channel available ... sleeping for %d seconds" % (
-                    self.restart_sleep_time))
-            time.sleep(self.restart_sleep_time)
-            # TODO: should be good to relaunch test for crash before returning False
-            return False
+            # if we have a connected process monitor, restart the target process.
+            elif target.procmon:
+                self.logger.warning("restarting target process")
+                if stop_first:
+                    target.procmon.stop_target()
 
-        # pass specified target parameters to the PED-RPC server to re-establish connections.
-        target.pedrpc_connect()
+                if not target.procmon.start_target():
+                    return False
+
+                if not self.wait_for_target(target, settle=3):
+                    self.logger.warning("target not ready after %d seconds, continuing",
+                                        self.restart_sleep_time)
+
+            # otherwise all we can do is wait a while for the target to recover on its own.
+            else:
+                self.logger.error(
+                    "no vmcontrol or procmon channel available ... waiting up to %d seconds",
+                    self.restart_sleep_time)
+
+                # TODO: should be good to relaunch test for crash before returning False
+                if not self.wait_for_target(target, settle=self.restart_sleep_time):
+                    return False
+
+            # pass specified target parameters to the PED-RPC server to re-establish connections.
+            target.pedrpc_connect()
+
+    def wait_for_target(self, target, settle):
+        """Wait for a restarted target to become ready, for at most restart_sleep_time seconds.
+
+        @type  target: session.target
+        @param target: Target we are waiting on
+        @type  settle: Float
+        @param settle: Seconds to sleep instead when there is nothing to probe, ie: UDP targets
+
+        @rtype:  Boolean
+        @return: True if the target is ready (or the settle time passed), False if it timed out
+        """
+        probes = target.readiness
+
+        if probes is None and self.proto != socket.SOCK_DGRAM:
+            probes = [readiness.port_open(target.host, target.port)]
+
+        if not probes:
+            time.sleep(settle)
+            return True
+
+        self.logger.info("waiting for target to become ready: %r", probes)
+        return readiness.wait_ready(probes, timeout=self.restart_sleep_time)
 
     def server_init(self):
         """Initialize.
@@ -820,6 +1333,109 @@ class session(pgraph.graph):
         self.thread = web_interface_thread(self)
         self.thread.start()
 
+    def send_payloads(self, target, cases, number):
+        """Send already rendered test cases, each on its own connection, and ask the process monitor
+        whether they crashed the target, restarting it if they did. The pre_send() and post_send()
+        hooks run around every test case, as they do when fuzzing.
+
+        @type  target: session.target
+        @param target: Target to send to, with a process monitor
+        @type  cases:  List
+        @param cases:  Test cases to send in order, each a list of segment lists, one per node
+        @type  number: Integer
+        @param number: Test case number to report to the process monitor
+
+        @rtype:  Boolean
+        @return: True if the target crashed, False otherwise
+        """
+        target.procmon.pre_send(number)
+
+        for payloads in cases:
+            sock = None
+
+            try:
+                family = socket.getaddrinfo(target.host, target.port)[0][0]
+                sock = socket.socket(family, self.proto)
+                sock.settimeout(self.timeout)
+
+                if self.proto == socket.SOCK_STREAM:
+                    sock.connect((target.host, target.port))
+
+                if self.ssl:
+                    import ssl
+                    sock = ssl.SSLContext(self.tls_version).wrap_socket(
+                        sock, server_hostname=target.host)
+
+                self.pre_send(sock)
+
+                for segments in payloads:
+                    if self.proto == socket.SOCK_STREAM:
+                        self.send_segments(sock, segments)
+                    else:
+                        sock.sendto("".join([str(segment) for segment in segments]),
+                                    (target.host, target.port))
+
+                    try:
+                        sock.recv(10000)
+                    except socket.timeout:
+                        pass
+
+                self.post_send(sock)
+            except Exception, e:
+                # the target may well die half way through, the process monitor has the final say.
+                self.logger.debug("failed sending test case: %r", e)
+            finally:
+                if sock:
+                    sock.close()
+
+        time.sleep(self.sleep_time)
+
+        if target.procmon.post_send():
+            return False
+
+        self.restart_target(target, stop_first=False)
+        return True
+
+    def send_segments(self, sock, segments):
+        """Write rendered segments to a stream socket, repetitions in chunks without expanding them.
+
+        Every write goes through sendall(), short writes are carried on instead of being dropped.
+
+        @type  sock:     Socket
+        @param sock:     Stream socket to write to
+        @type  segments: List
+        @param segments: List of Raw and blocks.repetition segments, see request.render_segments()
+        """
+        pending = []
+        pending_length = 0
+
+        for segment in segments:
+            if isinstance(segment, blocks.repetition):
+                pieces = segment.chunks(SEND_CHUNK)
+            else:
+                pieces = [segment]
+
+            for piece in pieces:
+                # large pieces go out as they are, without a copy. small ones, ie: the rendered
+                # primitives, are gathered so a test case still leaves in as few writes as possible.
+                if len(piece) >= SEND_CHUNK / 2:
+                    if pending:
+                        sock.sendall("".join(pending))
+                        pending, pending_length = [], 0
+
+                    sock.sendall(piece)
+                    continue
+
+                pending.append(piece)
+                pending_length += len(piece)
+
+                if pending_length >= SEND_CHUNK:
+                    sock.sendall("".join(pending))
+                    pending, pending_length = [], 0
+
+        if pending:
+            sock.sendall("".join(pending))
+
     def transmit(self, sock, node, edge, target):
         """Render and transmit a node, process callbacks accordingly.
 
@@ -839,11 +1455,24 @@ class session(pgraph.graph):
         if edge.callback:
             data = edge.callback(self, node, edge, sock)
 
-        self.logger.info("xmitting: [%d.%d]" % (node.id, self.total_mutant_index))
+            # the callback is beyond our control, remember what it sent so replays can be checked.
+            self.callback_hashes.append(replay.digest(data or ""))
+
+        self.logger.info("xmitting: [%d.%d]", node.id, self.total_mutant_index)
 
-        # if no data was returned by the callback, render the node here.
+        # if no data was returned by the callback, render the node here. repeated blocks are kept
+        # as (segment, count) repetitions and only expanded where a single buffer is unavoidable.
         if not data:
-            data = node.render()
+            with self.metrics.timer("render"):
+                segments = node.render_segments()
+        else:
+            segments = [data]
+
+        # datagrams have to leave as a single buffer.
+        if self.proto != socket.SOCK_STREAM or not self.scatter_gather:
+            segments = ["".join([str(segment) for segment in segments])]
+
+        data = segments[0] if len(segments) == 1 else None
 
         # if data length is > 65507 and proto is UDP, truncate it.
         # TODO: this logic does not prevent duplicate test cases, need to address this in the future
@@ -857,40 +1486,315 @@ class session(pgraph.graph):
                 MAX_UDP = 9216
 
             if len(data) > MAX_UDP:
-                self.logger.debug("Too much data for UDP, truncating to %d bytes" % MAX_UDP)
+                self.logger.debug("Too much data for UDP, truncating to %d bytes", MAX_UDP)
                 data = data[:MAX_UDP]
 
+        self.case_payloads.append(segments if data is None else [data])
+
         try:
-            if self.proto == socket.SOCK_STREAM:
-                sock.send(data)
-            else:
-                sock.sendto(data, (self.targets[0].host, self.targets[0].port))
-            self.logger.debug("Packet sent : " + repr(data))
+            with self.metrics.timer("send"):
+                if self.proto == socket.SOCK_STREAM:
+                    self.send_segments(sock, segments)
+                else:
+                    sock.sendto(data, (self.targets[0].host, self.targets[0].port))
+            self.logger.debug("Packet sent : %r", segments if data is None else data)
         except Exception, inst:
-            self.logger.error("Socket error, send: %s" % inst)
+            self.logger.error("Socket error, send: %s", inst)
 
         if self.proto == (socket.SOCK_STREAM or socket.SOCK_DGRAM):
             # TODO: might have a need to increase this at some point.
             # (possibly make it a class parameter)
             try:
-                self.last_recv = sock.recv(10000)
+                with self.metrics.timer("recv"):
+                    self.last_recv = sock.recv(10000)
+            except socket.timeout:
+                self.metrics.incr("timeouts")
+                self.last_recv = ""
             except Exception:
                 self.last_recv = ""
         else:
             self.last_recv = ""
 
         if len(self.last_recv) > 0:
-            self.logger.debug("received: [%d] %s" % (len(self.last_recv), repr(self.last_recv)))
+            self.logger.debug("received: [%d] %r", len(self.last_recv), self.last_recv)
         else:
             self.logger.warning("Nothing received on socket.")
+
+            # replayed test cases leave the crash accounting of the campaign alone.
+            if self.replaying:
+                return
+
             # Increment individual crash count
             self.crashing_primitives[self.fuzz_node.mutant] = self.crashing_primitives.get(
                 self.fuzz_node.mutant, 0) + 1
             # Note crash information
+            if data is None:
+                data = "".join([str(segment) for segment in segments])
+
             self.protmon_results[self.total_mutant_index] = data
             # print self.protmon_results
 
 
+INDEX_HTML = """
+<html>
+<head>
+    <title>Sulley Fuzz Control</title>
+    <style>
+        a:link    {color: #FF8200; text-decoration: none;}
+        a:visited {color: #FF8200; text-decoration: none;}
+        a:hover   {color: #C5C5C5; text-decoration: none;}
+
+        body
+        {
+            background-color: #000000;
+            font-family:      Arial, Helvetica, sans-serif;
+            font-size:        12px;
+            color:            #FFFFFF;
+        }
+
+        td
+        {
+            font-family:      Arial, Helvetica, sans-serif;
+            font-size:        12px;
+            color:            #A0B0B0;
+        }
+
+        .fixed
+        {
+            font-family:      Courier New;
+            font-size:        12px;
+            color:            #A0B0B0;
+        }
+
+        .input
+        {
+            font-family:      Arial, Helvetica, sans-serif;
+            font-size:        11px;
+            color:            #FFFFFF;
+            background-color: #333333;
+            border:           thin none;
+            height:           20px;
+        }
+    </style>
+</head>
+<body>
+<center>
+<table border=0 cellpadding=5 cellspacing=0 width=750><tr><td>
+<!-- begin bounding table -->
+
+<table border=0 cellpadding=5 cellspacing=0 width="100%">
+<tr bgcolor="#333333">
+    <td><div style="font-size: 20px;">Sulley Fuzz Control</div></td>
+    <td align=right><div id="status" style="font-weight: bold; font-size: 20px;"></div></td>
+</tr>
+<tr bgcolor="#111111">
+    <td colspan=2 align="center">
+        <table border=0 cellpadding=0 cellspacing=5>
+            <tr bgcolor="#111111">
+                <td><b>Total:</b></td>
+                <td id="total_mutant_index"></td>
+                <td>of</td>
+                <td id="total_num_mutations"></td>
+                <td class="fixed" id="progress_total_bar"></td>
+                <td id="progress_total"></td>
+            </tr>
+            <tr bgcolor="#111111">
+                <td><b id="current_name"></b></td>
+                <td id="current_mutant_index"></td>
+                <td>of</td>
+                <td id="current_num_mutations"></td>
+                <td class="fixed" id="progress_current_bar"></td>
+                <td id="progress_current"></td>
+            </tr>
+        </table>
+    </td>
+</tr>
+<tr>
+    <td>
+        <form method=get action="/pause">
+            <input class="input" type="submit" value="Pause">
+        </form>
+    </td>
+    <td align=right>
+        <form method=get action="/resume">
+            <input class="input" type="submit" value="Resume">
+        </form>
+    </td>
+</tr>
+</table>
+
+<!-- begin metrics -->
+<table border=0 cellpadding=5 cellspacing=0 width="100%">
+    <tr bgcolor="#333333"><td colspan=4 id="rates"></td></tr>
+    <tbody id="phases"></tbody>
+</table>
+<!-- end metrics -->
+
+<!-- begin procmon results -->
+<table border=0 cellpadding=5 cellspacing=0 width="100%">
+    <tr bgcolor="#333333">
+        <td nowrap>Test Case #</td>
+        <td>Crash Synopsis</td>
+        <td nowrap>Captured Bytes</td>
+    </tr>
+    <tbody id="crashes"></tbody>
+</table>
+<!-- end procmon results -->
+
+<!-- end bounding table -->
+</td></tr></table>
+</center>
+
+<script type="text/javascript">
+    var since = -1;
+    var fetching = false;
+
+    // callback receives the decoded response, or null if the request failed.
+    function get(url, callback) {
+        var xhr = new XMLHttpRequest();
+        xhr.onreadystatechange = function () {
+            if (xhr.readyState == 4) {
+                callback(xhr.status == 200 ? JSON.parse(xhr.responseText) : null);
+            }
+        };
+        xhr.open("GET", url, true);
+        xhr.send();
+    }
+
+    function text(id, value) {
+        document.getElementById(id).textContent = value;
+    }
+
+    function commify(number) {
+        if (number === null || number === undefined) {
+            return "";
+        }
+        return String(number).replace(/\B(?=(\d{3})+(?!\d))/g, ",");
+    }
+
+    function bar(done, total) {
+        var progress = total ? done / total : 0;
+        var bars = Math.floor(progress * 50);
+        return ["[" + new Array(bars + 1).join("=") + new Array(51 - bars).join("\u00a0") + "]",
+                (progress * 100).toFixed(3) + "%"];
+    }
+
+    function cell(row, value, align) {
+        var td = row.insertCell(-1);
+        td.textContent = value;
+        if (align) {
+            td.align = align;
+        }
+        return td;
+    }
+
+    function status(data) {
+        if (data === null) {
+            return;
+        }
+
+        var colors = {running: "green", paused: "red", unavailable: "yellow"};
+        var el = document.getElementById("status");
+        el.textContent = data.status.toUpperCase();
+        el.style.color = colors[data.status];
+
+        var current = data.current;
+        var total = bar(data.total_mutant_index, data.total_num_mutations);
+
+        text("total_mutant_index", commify(data.total_mutant_index));
+        text("total_num_mutations", commify(data.total_num_mutations));
+        text("progress_total_bar", total[0]);
+        text("progress_total", total[1]);
+
+        if (current.name !== undefined) {
+            var progress = bar(current.mutant_index, current.num_mutations);
+            text("current_name", current.name + ":");
+            text("current_mutant_index", commify(current.mutant_index));
+            text("current_num_mutations", commify(current.num_mutations));
+            text("progress_current_bar", progress[0]);
+            text("progress_current", progress[1]);
+        }
+
+        var counters = data.counters;
+        text("rates", data.cases_per_second.toFixed(2) + " cases/sec, " +
+             commify(counters.restarts || 0) + " restarts, " +
+             commify(counters.timeouts || 0) + " timeouts, " +
+             commify(counters.errors || 0) + " errors, " +
+             commify(data.crashes) + " crashes");
+
+        var phases = document.getElementById("phases");
+        while (phases.rows.length) {
+            phases.deleteRow(0);
+        }
+
+        var header = phases.insertRow(-1);
+        cell(header, "Phase");
+        cell(header, "Count", "right");
+        cell(header, "p50 (ms)", "right");
+        cell(header, "p99 (ms)", "right");
+
+        Object.keys(data.phases).sort().forEach(function (name) {
+            var phase = data.phases[name];
+            var row = phases.insertRow(-1);
+            cell(row, name);
+            cell(row, commify(phase.count), "right");
+            cell(row, (phase.p50 * 1000).toFixed(3), "right");
+            cell(row, (phase.p99 * 1000).toFixed(3), "right");
+        });
+
+        // only pull the crash list when there is something new.
+        if (!fetching && data.crashes > document.getElementById("crashes").rows.length) {
+            fetching = true;
+            get("/api/crashes?since=" + since, crashes);
+        }
+    }
+
+    function crashes(data) {
+        var body = document.getElementById("crashes");
+
+        if (data === null) {
+            fetching = false;
+            return;
+        }
+
+        data.crashes.forEach(function (crash) {
+            var row = body.insertRow(-1);
+            var link = document.createElement("a");
+            link.href = "/view_crash/" + crash.test_case;
+            link.textContent = ("000000" + crash.test_case).slice(-6);
+
+            var td = row.insertCell(-1);
+            td.className = "fixed";
+            td.appendChild(link);
+            cell(row, crash.synopsis);
+            cell(row, commify(crash.bytes), "right");
+        });
+
+        if (data.next !== null && body.rows.length < data.total) {
+            since = data.next;
+            get("/api/crashes?since=" + since, crashes);
+            return;
+        }
+
+        if (data.next !== null) {
+            since = data.next;
+        }
+
+        fetching = false;
+    }
+
+    function poll() {
+        get("/api/status", status);
+    }
+
+    poll();
+    setInterval(poll, 2000);
+</script>
+</body>
+</html>
+"""
+
+
 class web_interface_handler (BaseHTTPServer.BaseHTTPRequestHandler):
     """Web handler."""
 
@@ -899,17 +1803,6 @@ class web_interface_handler (BaseHTTPServer.BaseHTTPRequestHandler):
         BaseHTTPServer.BaseHTTPRequestHandler.__init__(self, request, client_address, server)
         self.session = None
 
-    def commify(self, number):
-        """Commify a number."""
-        number = str(number)
-        processing = 1
-        regex = re.compile(r"^(-?\d+)(\d{3})")
-
-        while processing:
-            (number, processing) = regex.subn(r"\1,\2", number)
-
-        return number
-
     def do_GET(self):
         """Get method."""
         self.do_everything()
@@ -930,6 +1823,18 @@ class web_interface_handler (BaseHTTPServer.BaseHTTPRequestHandler):
         if "resume" in self.path:
             self.session.pause_flag = False
 
+        url = urlparse.urlparse(self.path)
+
+        # machine readable endpoints.
+        if url.path == "/api/status":
+            return self.send_json(self.view_status())
+
+        if url.path == "/api/crashes":
+            return self.send_json(self.view_crashes(urlparse.parse_qs(url.query)))
+
+        if url.path == "/api/metrics":
+            return self.send_json(self.session.metrics.snapshot())
+
         self.send_response(200)
         self.send_header('Content-type', 'text/html')
         self.end_headers()
@@ -951,6 +1856,21 @@ class web_interface_handler (BaseHTTPServer.BaseHTTPRequestHandler):
         """Log a message."""
         pass
 
+    def send_json(self, data):
+        """Send a JSON response.
+
+        @type  data: Mixed
+        @param data: JSON serializable response
+        """
+        # crash synopses hold raw target output, keep any non UTF-8 bytes as latin-1 escapes.
+        response = json.dumps(data, ensure_ascii=True, encoding="latin-1")
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
     def version_string(self):
         """Version string."""
         return "Sulley Fuzz Session"
@@ -960,188 +1880,94 @@ class web_interface_handler (BaseHTTPServer.BaseHTTPRequestHandler):
         test_number = int(path.split("/")[-1])
         return "<html><pre>%s</pre></html>" % self.session.procmon_results[test_number]
 
+    def view_crashes(self, query):
+        """List crashes in test case order, a page at a time.
+
+        Supported query parameters are "since", only list test cases after this one (default -1),
+        and "limit", the maximum number of crashes to list (default 100).
+
+        @type  query: Dictionary
+        @param query: Parsed query string
+
+        @rtype:  Dictionary
+        @return: crashes, list of test_case / synopsis / bytes and next, the since cursor to resume
+                    from or None if there are no more crashes yet.
+        """
+        try:
+            since = int(query.get("since", [-1])[0])
+        except ValueError:
+            since = -1
+
+        try:
+            limit = int(query.get("limit", [100])[0])
+        except ValueError:
+            limit = 100
+
+        keys = self.session.crash_keys
+        start = bisect.bisect_right(keys, since)
+        page = keys[start:start + limit]
+
+        crashes = []
+        for key in page:
+            crashes.append({
+                "test_case": key,
+                "synopsis": self.session.procmon_results[key].split("\n")[0],
+                "bytes": self.session.netmon_results.get(key),
+            })
+
+        return {
+            "crashes": crashes,
+            "next": page[-1] if page else None,
+            "total": len(keys),
+        }
+
+    def view_status(self):
+        """Summarize the state of the fuzzing session.
+
+        @rtype:  Dictionary
+        @return: Fuzzing counters, the current node and path, and rate metrics.
+        """
+        session = self.session
+        snapshot = session.metrics.snapshot()
+
+        if session.fuzz_node is None:
+            status = "unavailable"
+        elif session.pause_flag:
+            status = "paused"
+        else:
+            status = "running"
+
+        current = {}
+        if session.fuzz_node is not None:
+            current = {
+                "name": session.fuzz_node.name or "[N/A]",
+                "path": session.current_path,
+                "mutant_index": session.fuzz_node.mutant_index,
+                "num_mutations": session.fuzz_node.num_mutations(),
+            }
+
+        return {
+            "status": status,
+            "total_mutant_index": session.total_mutant_index,
+            "total_num_mutations": session.total_num_mutations,
+            "current": current,
+            "crashes": len(session.crash_keys),
+            "cases_per_second": snapshot["cases_per_second"],
+            "counters": snapshot["counters"],
+            "phases": snapshot["phases"],
+        }
+
     def view_pcap(self, path):
         """View pcaps."""
         return path
 
     def view_index(self):
-        """View the index.html."""
-        response = """
-                    <html>
-                    <head>
-                    <meta http-equiv="refresh" content="5">
-                        <title>Sulley Fuzz Control</title>
-                        <style>
-                            a:link    {color: #FF8200; text-decoration: none;}
-                            a:visited {color: #FF8200; text-decoration: none;}
-                            a:hover   {color: #C5C5C5; text-decoration: none;}
-
-                            body
-                            {
-                                background-color: #000000;
-                                font-family:      Arial, Helvetica, sans-serif;
-                                font-size:        12px;
-                                color:            #FFFFFF;
-                            }
-
-                            td
-                            {
-                                font-family:      Arial, Helvetica, sans-serif;
-                                font-size:        12px;
-                                color:            #A0B0B0;
-                            }
-
-                            .fixed
-                            {
-                                font-family:      Courier New;
-                                font-size:        12px;
-                                color:            #A0B0B0;
-                            }
-
-                            .input
-                            {
-                                font-family:      Arial, Helvetica, sans-serif;
-                                font-size:        11px;
-                                color:            #FFFFFF;
-                                background-color: #333333;
-                                border:           thin none;
-                                height:           20px;
-                            }
-                        </style>
-                    </head>
-                    <body>
-                    <center>
-                    <table border=0 cellpadding=5 cellspacing=0 width=750><tr><td>
-                    <!-- begin bounding table -->
-
-                    <table border=0 cellpadding=5 cellspacing=0 width="100%%">
-                    <tr bgcolor="#333333">
-                        <td><div style="font-size: 20px;">Sulley Fuzz Control</div></td>
-                        <td align=right><div style="font-weight: bold; font-size: 20px;">%(status)s
-                        </div></td>
-                    </tr>
-                    <tr bgcolor="#111111">
-                        <td colspan=2 align="center">
-                            <table border=0 cellpadding=0 cellspacing=5>
-                                <tr bgcolor="#111111">
-                                    <td><b>Total:</b></td>
-                                    <td>%(total_mutant_index)s</td>
-                                    <td>of</td>
-                                    <td>%(total_num_mutations)s</td>
-                                    <td class="fixed">%(progress_total_bar)s</td>
-                                    <td>%(progress_total)s</td>
-                                </tr>
-                                <tr bgcolor="#111111">
-                                    <td><b>%(current_name)s:</b></td>
-                                    <td>%(current_mutant_index)s</td>
-                                    <td>of</td>
-                                    <td>%(current_num_mutations)s</td>
-                                    <td class="fixed">%(progress_current_bar)s</td>
-                                    <td>%(progress_current)s</td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                    <tr>
-                        <td>
-                            <form method=get action="/pause">
-                                <input class="input" type="submit" value="Pause">
-                            </form>
-                        </td>
-                        <td align=right>
-                            <form method=get action="/resume">
-                                <input class="input" type="submit" value="Resume">
-                            </form>
-                        </td>
-                    </tr>
-                    </table>
-
-                    <!-- begin procmon results -->
-                    <table border=0 cellpadding=5 cellspacing=0 width="100%%">
-                        <tr bgcolor="#333333">
-                            <td nowrap>Test Case #</td>
-                            <td>Crash Synopsis</td>
-                            <td nowrap>Captured Bytes</td>
-                        </tr>
-                    """
-
-        keys = self.session.procmon_results.keys()
-        keys.sort()
-        for key in keys:
-            val = self.session.procmon_results[key]
-            bytes = "&nbsp;"
-
-            if key in self.session.netmon_results:
-                bytes = self.commify(self.session.netmon_results[key])
-
-            response += '<tr><td class="fixed"><a href="/view_crash/%d">%06d</a></td><td>%s</td>' \
-                '<td align=right>%s</td></tr>' % (key, key, val.split("\n")[0], bytes)
-
-        response += """
-                    <!-- end procmon results -->
-                    </table>
-
-                    <!-- end bounding table -->
-                    </td></tr></table>
-                    </center>
-                    </body>
-                    </html>
-                   """
-
-        # what is the fuzzing status.
-        if self.session.pause_flag:
-            status = "<font color=red>PAUSED</font>"
-        else:
-            status = "<font color=green>RUNNING</font>"
-
-        # if there is a current fuzz node.
-        if self.session.fuzz_node:
-            # which node (request) are we currently fuzzing.
-            if self.session.fuzz_node.name:
-                current_name = self.session.fuzz_node.name
-            else:
-                current_name = "[N/A]"
-
-            # render sweet progress bars.
-            progress_current = float(self.session.fuzz_node.mutant_index) / float(
-                self.session.fuzz_node.num_mutations())
-            num_bars = int(progress_current * 50)
-            progress_current_bar = "[" + "=" * num_bars + "&nbsp;" * (50 - num_bars) + "]"
-            progress_current = "%.3f%%" % (progress_current * 100)
-
-            progress_total = float(self.session.total_mutant_index) / float(
-                self.session.total_num_mutations)
-            num_bars = int(progress_total * 50)
-            progress_total_bar = "[" + "=" * num_bars + "&nbsp;" * (50 - num_bars) + "]"
-            progress_total = "%.3f%%" % (progress_total * 100)
-
-            response %= {
-                "current_mutant_index": self.commify(self.session.fuzz_node.mutant_index),
-                "current_name": current_name,
-                "current_num_mutations": self.commify(self.session.fuzz_node.num_mutations()),
-                "progress_current": progress_current,
-                "progress_current_bar": progress_current_bar,
-                "progress_total": progress_total,
-                "progress_total_bar": progress_total_bar,
-                "status": status,
-                "total_mutant_index": self.commify(self.session.total_mutant_index),
-                "total_num_mutations": self.commify(self.session.total_num_mutations),
-            }
-        else:
-            response %= {
-                "current_mutant_index": "",
-                "current_name": "",
-                "current_num_mutations": "",
-                "progress_current": "",
-                "progress_current_bar": "",
-                "progress_total": "",
-                "progress_total_bar": "",
-                "status": "<font color=yellow>UNAVAILABLE</font>",
-                "total_mutant_index": "",
-                "total_num_mutations": "",
-            }
+        """View the index.html.
 
-        return response
+        The page is static, it polls /api/status and pulls new crashes from /api/crashes so a
+        refresh costs the fuzzing process a small JSON response rather than the whole crash table.
+        """
+        return INDEX_HTML
 
 
 class web_interface_server(BaseHTTPServer.HTTPServer):
@@ -3,5 +3,10 @@
 import unit_tests
 
 unit_tests.blocks.run()
+unit_tests.coverage.run()
+unit_tests.encoders.run()
 unit_tests.legos.run()
-unit_tests.primitives.run()
\ No newline at end of file
+unit_tests.minimize.run()
+unit_tests.orchestrator.run()
+unit_tests.primitives.run()
+unit_tests.sessions.run()
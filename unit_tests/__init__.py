@@ -1,3 +1,8 @@
 import blocks
+import coverage
+import encoders
 import legos
-import primitives
\ No newline at end of file
+import minimize
+import orchestrator
+import primitives
+import sessions
@@ -1,14 +1,24 @@
 from sulley import *
 
+import itertools
+import struct
+
 def run ():
     groups_and_num_test_cases()
     dependencies()
     repeaters()
+    lazy_repeaters()
     return_current_mutant()
     exhaustion()
+    lazy_definitions()
+    cached_mutation_counts()
+    interleaved()
+    combinations()
+    mixed_combinations()
 
     # clear out the requests.
     blocks.REQUESTS = {}
+    blocks.BUILDERS = {}
     blocks.CURRENT  = None
 
 
@@ -123,6 +133,35 @@ def repeaters ():
     assert(len(data) == length)
 
 
+########################################################################################################################
+def lazy_repeaters ():
+    s_initialize("REP TEST 2")
+    s_size("OUTER", length=4, name="sizer", fuzzable=False)
+    if s_block_start("OUTER"):
+        if s_block_start("BLOCK"):
+            s_static("AB")
+        s_block_end()
+        s_repeat("BLOCK", min_reps=0, max_reps=5000, step=5000, name="repeat")
+    s_block_end()
+
+    req = s_get("REP TEST 2")
+
+    s_mutate()
+    s_mutate()
+
+    # the repetitions are kept as a single (segment, count) descriptor, sized without expanding them.
+    segments = req.render_segments()
+    assert(blocks.repetition in [type(segment) for segment in segments])
+    assert(req.names["OUTER"]._rendered is None)
+    assert(struct.unpack("<L", segments[0])[0] == 2 + 2 * 5000)
+    assert(sum(map(len, segments)) == 4 + 2 + 2 * 5000)
+
+    # chunked output and the expanded rendering agree.
+    repetition = [segment for segment in segments if isinstance(segment, blocks.repetition)][0]
+    assert("".join(repetition.chunks(size=333)) == "AB" * 5000)
+    assert(s_render() == "".join([str(segment) for segment in segments]))
+
+
 ########################################################################################################################
 def return_current_mutant ():
     s_initialize("RETURN CURRENT MUTANT TEST 1")
@@ -206,3 +245,261 @@ def exhaustion ():
     req1.mutant.exhaust()
     assert(req1.mutant.name == "danny_glover_is_the_man")
 
+
+########################################################################################################################
+def lazy_definitions ():
+    built = []
+
+    @s_define("LAZY 1")
+    def lazy_1 ():
+        built.append("LAZY 1")
+        s_string("lazy", name="string")
+
+    s_initialize("EAGER 1")
+    s_static("eager")
+
+    # defining a request must not build it.
+    assert(built == [])
+    assert("LAZY 1" not in blocks.REQUESTS)
+
+    # first access builds the request, without disturbing the currently selected one.
+    sess = sessions.session()
+    sess.connect("LAZY 1")
+    assert(built == ["LAZY 1"])
+    assert(s_get().name == "EAGER 1")
+
+    # subsequent access re-uses the built request.
+    req = s_get("LAZY 1")
+    assert(built == ["LAZY 1"])
+    assert(req.names["string"].value == "lazy")
+
+    # names are shared between lazy and eager definitions.
+    try:
+        s_initialize("LAZY 1")
+        assert(False)
+    except sex.SullyRuntimeError:
+        pass
+
+    # opt-in validation surfaces definition errors immediately.
+    def broken ():
+        s_block_start("never closed")
+
+    try:
+        s_define("LAZY 2", broken, validate=True)
+        assert(False)
+    except sex.SullyRuntimeError:
+        pass
+
+
+########################################################################################################################
+def cached_mutation_counts ():
+    s_initialize("CACHED 1")
+    s_string("cached", name="string")
+    if s_block_start("BLOCK"):
+        s_byte(0, name="byte")
+    s_block_end()
+
+    s_initialize("CACHED 2")
+    s_static("static")
+
+    req = s_get("CACHED 1")
+    block = req.names["BLOCK"]
+
+    num_str_mutations  = req.names["string"].num_mutations()
+    num_byte_mutations = req.names["byte"].num_mutations()
+    assert(req.num_mutations() == num_str_mutations + num_byte_mutations)
+
+    # session totals follow the graph.
+    sess = sessions.session()
+    sess.connect("CACHED 1")
+    assert(sess.num_mutations() == req.num_mutations())
+    sess.connect("CACHED 1", "CACHED 2")
+    assert(sess.num_mutations() == req.num_mutations())
+
+    # toggling a fuzzable flag invalidates the cached counts all the way up to the session.
+    req.names["byte"].fuzzable = False
+    assert(block.num_mutations() == 0)
+    assert(req.num_mutations() == num_str_mutations)
+    assert(sess.num_mutations() == num_str_mutations)
+
+    req.names["byte"].fuzzable = True
+    assert(sess.num_mutations() == num_str_mutations + num_byte_mutations)
+
+    # exhausting a primitive leaves the total untouched.
+    req.mutate()
+    req.mutant.exhaust()
+    assert(sess.num_mutations() == num_str_mutations + num_byte_mutations)
+
+    # the string walks its shared library followed by its own.
+    req.reset()
+    values = []
+    while req.names["string"].mutate():
+        values.append(req.names["string"].value)
+    assert(len(values) == num_str_mutations)
+    assert(values[-1] == "cached" * 100 + "\xfe")
+
+
+########################################################################################################################
+def interleaved ():
+    def define (name):
+        s_initialize(name)
+        s_delim(" ", name="delim")
+        s_size("BLOCK", length=2, fuzzable=True, name="sizer")
+        s_group("verb", values=["GET", "PUT"])
+        if s_block_start("BLOCK", group="verb"):
+            s_byte(0x41, name="byte")
+        s_block_end()
+        s_dword(0x42, name="dword")
+
+        return s_get(name)
+
+    sequential = define("SEQUENTIAL 1")
+    interleave = define("INTERLEAVED 1")
+    interleave.interleave = True
+
+    # the fields take turns, every one of them is mutated within the first round.
+    mutants = []
+    for i in xrange(5):
+        interleave.mutate()
+        mutants.append(interleave.mutant.name)
+    assert(mutants == ["delim", "sizer", "verb", "byte", "dword"])
+
+    # only the field whose turn it is differs from the original rendering.
+    interleave.mutate()
+    assert(interleave.mutant.name == "delim")
+    assert(interleave.names["dword"].value == 0x42)
+    assert(interleave.names["verb"].value == "GET")
+    interleave.reset()
+
+    # the same test cases come out, in another order.
+    def cases (req):
+        rendered = []
+        while req.mutate():
+            rendered.append(req.render())
+        return rendered
+
+    expected = cases(sequential)
+    rendered = cases(interleave)
+    assert(len(rendered) == sequential.num_mutations() == interleave.num_mutations())
+    assert(sorted(rendered) == sorted(expected))
+    assert(rendered != expected)
+
+
+########################################################################################################################
+def combinations ():
+    s_initialize("COMBINATORIAL 1")
+    s_group("a", values=["a1", "a2", "a3"])
+    s_group("b", values=["b1", "b2", "b3", "b4"])
+    if s_block_start("BLOCK"):
+        s_group("c", values=["c1", "c2", "c3", "c4", "c5"])
+    s_block_end()
+    s_combinatorial(["a", "b", "c"], name="pairs")
+
+    req      = s_get("COMBINATORIAL 1")
+    pairs    = req.names["pairs"]
+    factors  = ["a", "b", "c"]
+
+    # pairwise over GF(5), instead of the 60 combinations of the cross product.
+    assert(pairs.num_mutations() == 25)
+    assert(req.num_mutations() == 3 + 4 + 5 + 25)
+
+    # the single field mutations come first.
+    for i in xrange(3 + 4 + 5):
+        req.mutate()
+
+    seen = set()
+    while req.mutate():
+        assert(req.mutant is pairs)
+        values = [req.names[factor].value for factor in factors]
+        assert(s_render() == "".join(values))
+
+        for i in xrange(3):
+            for j in xrange(i + 1, 3):
+                seen.add((values[i], values[j]))
+
+    # every pair of values of every two primitives was sent, and the originals were restored.
+    assert(len(seen) == 3 * 4 + 3 * 5 + 4 * 5)
+    assert(s_render() == "a1b1c1")
+
+    # rows are computed on demand.
+    assert(pairs.row(7) == pairs.row(7))
+    req.reset()
+    assert(req.mutate() and req.names["a"].value == "a1")
+
+    # t-wise, every combination of all three.
+    s_initialize("COMBINATORIAL 2")
+    s_group("a", values=["a1", "a2", "a3"])
+    s_group("b", values=["b1", "b2", "b3", "b4"])
+    s_group("c", values=["c1", "c2", "c3", "c4", "c5"])
+    s_combinatorial(["a", "b", "c"], strength=3, name="triples")
+
+    triples = s_get("COMBINATORIAL 2").names["triples"]
+    seen    = set()
+    while triples.mutate():
+        seen.add(tuple([s_get().names[factor].value for factor in factors]))
+    assert(len(seen) == 3 * 4 * 5)
+
+    try:
+        s_combinatorial(["a"])
+        assert(False)
+    except sex.SullyRuntimeError:
+        pass
+
+    # fixed size strings skip the long library entries and pad the short ones onto the same values.
+    s_initialize("COMBINATORIAL 3")
+    s_string("ab", size=4, name="sized")
+    s_group("verb", values=["GET", "PUT", "HEAD"])
+    s_combinatorial(["sized", "verb"], name="pairs")
+
+    req    = s_get("COMBINATORIAL 3")
+    sized  = req.names["sized"]
+    values = set()
+    while sized.mutate():
+        values.add(sized.value)
+    sized.reset()
+
+    assert(len(values) < sized.num_mutations())
+    assert(len(req.names["pairs"].libraries()[0]) == len(values))
+
+    seen = set()
+    while req.names["pairs"].mutate():
+        assert(len(sized.value) == 4 and sized.value in values)
+        seen.add((sized.value, req.names["verb"].value))
+
+    assert(len(seen) == len(values) * 3)
+
+
+########################################################################################################################
+def mixed_combinations ():
+    # two fields pairwise is their cross product, never more.
+    s_initialize("COMBINATORIAL 4")
+    s_string("hello", name="s")
+    s_dword(1, name="d")
+    s_combinatorial(["s", "d"], name="pairs")
+
+    pairs   = s_get("COMBINATORIAL 4").names["pairs"]
+    lengths = [len(values) for values in pairs.libraries()]
+    assert(pairs.num_mutations() == lengths[0] * lengths[1])
+
+    # libraries of mixed sizes, every combination of any strength fields is covered by fewer rows than their product.
+    sizes = [23, 3, 2, 5, 4]
+
+    for strength in (2, 3):
+        s_initialize("COMBINATORIAL MIXED %d" % strength)
+        for i, size in enumerate(sizes):
+            s_group("f%d" % i, values=["%d.%d" % (i, value) for value in xrange(size)])
+        s_combinatorial(["f%d" % i for i in xrange(len(sizes))], strength=strength, name="mixed")
+
+        req   = s_get("COMBINATORIAL MIXED %d" % strength)
+        mixed = req.names["mixed"]
+        rows  = []
+
+        while mixed.mutate():
+            rows.append([req.names["f%d" % i].value for i in xrange(len(sizes))])
+
+        assert(len(rows) == mixed.num_mutations() <= mixed.product())
+        assert(len(rows) < reduce(lambda x, y: x * y, sizes))
+
+        for fields in itertools.combinations(xrange(len(sizes)), strength):
+            seen = set([tuple([row[field] for field in fields]) for row in rows])
+            assert(len(seen) == reduce(lambda x, y: x * y, [sizes[field] for field in fields]))
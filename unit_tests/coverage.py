@@ -0,0 +1,61 @@
+from sulley import coverage
+
+import os
+import tempfile
+
+def run ():
+    buckets()
+    bitmap()
+    patience()
+
+
+########################################################################################################################
+def buckets ():
+    assert([coverage.bucket(count) for count in (0, 1, 2, 3, 4, 7, 8, 15, 16, 31, 32, 127, 128, 255)] ==
+           [0, 1, 2, 4, 8, 8, 16, 16, 32, 32, 64, 64, 128, 128])
+
+
+########################################################################################################################
+def bitmap ():
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+
+    try:
+        edges = coverage.bitmap(filename, 1024)
+
+        # no edges taken.
+        edges.reset()
+        assert(edges.update() == 0)
+
+        edges.map[5]   = "\x01"
+        edges.map[100] = "\x05"
+        assert(edges.update() == 2)
+
+        # edge 5 moves to a new hit count bucket, edge 100 stays in the 4-7 bucket.
+        edges.reset()
+        edges.map[5]   = "\x02"
+        edges.map[100] = "\x06"
+        assert(edges.update() == 1)
+
+        # nothing new.
+        edges.reset()
+        edges.map[5] = "\x01"
+        assert(edges.update() == 0)
+        assert(edges.total == 3)
+
+        edges.close()
+    finally:
+        os.remove(filename)
+
+
+########################################################################################################################
+def patience ():
+    schedule = coverage.scheduler(3)
+
+    assert([schedule.record("a", new) for new in (0, 0, 5, 0, 0, 0)] == [False, False, False, False, False, True])
+    assert(schedule.record("b", 0) == False)
+    assert(schedule.total == 5)
+
+    # disabled.
+    schedule = coverage.scheduler(0)
+    assert(not any([schedule.record("a", 0) for i in xrange(10)]))
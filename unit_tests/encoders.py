@@ -0,0 +1,127 @@
+from sulley import *
+
+import random
+import struct
+
+def run ():
+    xor()
+    chained_dword_xor()
+    utf16()
+    named()
+    memoized()
+
+    # clear out the requests.
+    blocks.REQUESTS = {}
+    blocks.CURRENT  = None
+
+
+########################################################################################################################
+def xor ():
+    data = "".join([chr(random.randint(0, 255)) for i in xrange(1000)])
+
+    assert(encoders.xor(0xAA)(data) == "".join([chr(ord(c) ^ 0xAA) for c in data]))
+    assert(encoders.xor("key")(data) == "".join([chr(ord(c) ^ ord("key"[i % 3])) for i, c in enumerate(data)]))
+    assert(encoders.xor("key")("") == "")
+
+
+########################################################################################################################
+def chained_dword_xor ():
+    key = 0xA8534344
+
+    # reference loop implementation, as originally found in requests/trend.py.
+    def reference (data, key=key):
+        data += "\x00" * (-len(data) % 4)
+        ret   = ""
+
+        while data:
+            dword  = struct.unpack("<L", data[:4])[0] ^ key
+            data   = data[4:]
+            ret   += struct.pack("<L", dword)
+            key    = dword
+
+        return ret
+
+    encode = encoders.chained_dword_xor(key)
+    decode = encoders.chained_dword_xor_decode(key)
+
+    for length in [0, 1, 3, 4, 5, 8, 17, 64, 1001]:
+        data = "".join([chr(random.randint(0, 255)) for i in xrange(length)])
+
+        assert(encode(data) == reference(data))
+        assert(decode(encode(data)) == data + "\x00" * (-len(data) % 4))
+
+
+########################################################################################################################
+def utf16 ():
+    data = "".join([chr(i) for i in xrange(256)])
+
+    assert(encoders.utf16_be(data) == "".join(["\x00" + c for c in data]))
+    assert(encoders.utf16_le(data) == "".join([c + "\x00" for c in data]))
+
+
+########################################################################################################################
+def named ():
+    s_initialize("UNIT TEST ENCODERS 1")
+
+    if s_block_start("hex", encoder="hex"):
+        s_static("\x01\xff")
+    s_block_end()
+
+    assert(s_render() == "01ff")
+
+    try:
+        s_block_start("bogus", encoder="no such encoder")
+    except sex.SullyRuntimeError:
+        pass
+    else:
+        assert(False)
+
+
+########################################################################################################################
+def memoized ():
+    calls = []
+
+    def counting (data):
+        calls.append(data)
+        return data.upper()
+
+    s_initialize("UNIT TEST ENCODERS 2")
+    s_group("verbs", values=["get", "put"])
+
+    if s_block_start("sibling"):
+        s_string("fuzzme")
+    s_block_end()
+
+    if s_block_start("encoded", encoder=counting, memoize=True):
+        s_static("static")
+    s_block_end()
+
+    if s_block_start("stateful", encoder=counting):
+        s_static("nonce")
+    s_block_end()
+
+    if s_block_start("hexed", encoder="hex"):
+        s_static("hex")
+    s_block_end()
+
+    req = s_get("UNIT TEST ENCODERS 2")
+
+    # user encoders may keep state, they are only memoized when asked to. built-in ones are pure.
+    assert(req.names["encoded"].memoize and not req.names["stateful"].memoize)
+    assert(req.names["hexed"].memoize)
+    assert(s_render().endswith("STATICNONCE" + "hex".encode("hex")))
+
+    # mutating the sibling leaves the encoded blocks untouched, the memoizing one is encoded only once.
+    for i in xrange(10):
+        s_mutate()
+        assert(s_render().endswith("STATICNONCE" + "hex".encode("hex")))
+
+    assert(calls.count("static") == 1)
+    assert(calls.count("nonce") >= 11)
+
+    # the cache is bounded and keyed on digests, not on the block contents.
+    for i in xrange(blocks.ENCODER_CACHE_SIZE * 2):
+        req.names["encoded"].encode(str(i) * 1000)
+
+    assert(len(req.names["encoded"].encoded) == blocks.ENCODER_CACHE_SIZE)
+    assert(max([len(key) for key in req.names["encoded"].encoded]) == 20)
@@ -0,0 +1,129 @@
+from sulley import *
+from sulley import minimize
+from sulley import replay
+
+import logging
+import os
+import tempfile
+
+def run ():
+    bisect()
+    evaluate()
+    shrink()
+
+    # clear out the requests.
+    blocks.REQUESTS = {}
+    blocks.CURRENT  = None
+
+
+class fake_procmon:
+    pass
+
+
+def setup (targets=1):
+    '''
+    Session over two requests with a replay log, and a minimizer whose targets crash on any test case containing
+    the first 37 bytes of a long string. Returns (session, minimizer, long string, test case number, sent test cases).
+    '''
+
+    # every test starts over from the same requests.
+    blocks.REQUESTS = {}
+    blocks.BUILDERS = {}
+    blocks.CURRENT  = None
+
+    s_initialize("MIN A")
+    s_static("A:")
+
+    s_initialize("MIN B")
+    s_static("B:")
+    s_string("hello", name="body")
+    s_delim("\r\n", name="end")
+
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    os.remove(filename)
+
+    sess = sessions.session(replay_filename=filename, log_level=logging.CRITICAL, web_port=0)
+    sess.add_target(sessions.target("127.0.0.1", 1))
+
+    for target in sess.targets:
+        target.procmon = fake_procmon()
+
+    edge_a = sess.connect("MIN A")
+    edge_b = sess.connect("MIN A", "MIN B")
+    sess.replay_log.set_seed(sess.seed)
+
+    # record the first test case of "MIN B" carrying a long string.
+    node = s_get("MIN B")
+    while node.mutate():
+        if len(node.names["body"].value) >= 100:
+            break
+
+    value = node.names["body"].value
+    sess.replay_log.append(replay.case(7, [edge_a.id, edge_b.id], node.id, node.mutant_index))
+    node.reset()
+    node.mutant_index = 0
+
+    sent = []
+
+    def send_payloads (target, cases, number):
+        data = "".join([str(segment) for case in cases for payload in case for segment in payload])
+        sent.append((target, data))
+        return value[:37] in data
+
+    sess.send_payloads = send_payloads
+    targets = [sessions.target("127.0.0.1", i) for i in xrange(targets)]
+
+    for target in targets:
+        target.procmon = fake_procmon()
+
+    return sess, minimize.minimizer(sess, targets), value, 7, sent
+
+
+########################################################################################################################
+def bisect ():
+    sess, shrink, value, number, sent = setup(targets=3)
+
+    shrink.minimize(number)
+    del sent[:]
+
+    best = minimize.candidate([], value, True)
+    assert(shrink.bisect(best) == 37)
+
+    # three probes per round, every round cuts the range of 5000 odd lengths to a quarter.
+    assert(len(sent) <= 3 * 7)
+    os.remove(sess.replay_log.filename)
+
+
+########################################################################################################################
+def evaluate ():
+    sess, shrink, value, number, sent = setup(targets=2)
+
+    shrink.minimize(number)
+    del sent[:]
+
+    lengths    = [10, 36, 37, 80, 5]
+    candidates = [minimize.candidate([], value[:length], True) for length in lengths]
+
+    assert(shrink.evaluate(candidates) == [False, False, True, True, False])
+    assert(len(sent) == len(candidates))
+    assert(set([target for target, data in sent]) <= set(shrink.targets))
+    os.remove(sess.replay_log.filename)
+
+
+########################################################################################################################
+def shrink ():
+    sess, shrink, value, number, sent = setup()
+
+    reproducer = shrink.minimize(number)
+
+    # the path up to "MIN B" is dropped, the string is cut down to the crashing prefix.
+    assert(reproducer.path == [])
+    assert(reproducer.node == "MIN B")
+    assert(reproducer.primitive == "body")
+    assert(reproducer.value == value[:37])
+    assert(reproducer.payloads == ["B:" + value[:37] + "\r\n"])
+
+    # the fuzz node is left as the session stepped it.
+    assert(s_get("MIN B").names["body"].value == value)
+    os.remove(sess.replay_log.filename)
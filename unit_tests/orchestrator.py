@@ -0,0 +1,85 @@
+from sulley import *
+from sulley import orchestrator
+from sulley import readiness
+
+import logging
+
+def run ():
+    merged_crashes()
+
+    # clear out the requests.
+    blocks.REQUESTS = {}
+    blocks.CURRENT  = None
+
+
+class fake_procmon:
+    '''
+    Process monitor reporting a crash on the given test cases.
+    '''
+
+    def __init__ (self, crashes):
+        self.crashes = crashes
+        self.number  = None
+
+    def alive (self):
+        return True
+
+    def pre_send (self, number):
+        self.number = number
+
+    def post_send (self):
+        return self.number not in self.crashes
+
+    def get_crash_synopsis (self):
+        return "crash on test case %d\ndetails" % self.number
+
+    def start_target (self):
+        return True
+
+    def stop_target (self):
+        pass
+
+
+def campaign (crashes):
+    '''
+    Campaign setup routine, three test cases against a target crashing on the given ones.
+    '''
+
+    def setup (sess, resource):
+        blocks.REQUESTS = {}
+        blocks.CURRENT  = None
+
+        s_initialize("ORCHESTRATED")
+        s_group("verb", values=["GET", "PUT", "POST"])
+
+        target = sessions.target("127.0.0.1", 9)
+        target.procmon   = fake_procmon(crashes)
+        target.readiness = [readiness.callback(lambda: True)]
+
+        sess.web_port = 0
+        sess.add_target(target)
+        sess.connect(s_get("ORCHESTRATED"))
+
+    return setup
+
+
+########################################################################################################################
+def merged_crashes ():
+    orch = orchestrator.orchestrator(["vm"], web_port=0, poll_interval=0.05, log_level=logging.CRITICAL)
+    options = {"proto": "udp", "sleep_time": 0, "timeout": 0.01, "log_level": logging.CRITICAL}
+
+    first  = orch.add_campaign("first", campaign([2]), **options)
+    second = orch.add_campaign("second", campaign([1, 3]), **options)
+
+    crashes = orch.run()
+
+    assert(crashes == [
+        ("first",  2, "crash on test case 2\ndetails"),
+        ("second", 1, "crash on test case 1\ndetails"),
+        ("second", 3, "crash on test case 3\ndetails"),
+    ])
+
+    # one resource, the campaigns took turns on it and gave it back.
+    assert(first.state == second.state == "finished")
+    assert(first.ended <= second.started)
+    assert(orch.free_resources == ["vm"])
@@ -4,6 +4,7 @@ def run ():
     signed_tests()
     string_tests()
     fuzz_extension_tests()
+    random_data_tests()
 
     # clear out the requests.
     blocks.REQUESTS = {}
@@ -68,6 +69,38 @@ def string_tests ():
         assert(len(req.names["sized_string"].render()) == 200)
 
 
+########################################################################################################################
+def random_data_tests ():
+    s_initialize("UNIT TEST RANDOM 1")
+    s_random("", 0, 5000, num_mutations=10, name="random")
+
+    # the session seeds the primitive from the request.
+    sess = sessions.session()
+    sess.connect("UNIT TEST RANDOM 1")
+
+    req = s_get("UNIT TEST RANDOM 1")
+    assert(req.names["random"].seed == "%s:UNIT TEST RANDOM 1:0" % sess.seed)
+
+    values = []
+    while req.names["random"].mutate():
+        values.append(req.names["random"].value)
+
+    assert(len(values) == 10)
+    assert(all([0 <= len(value) <= 5000 for value in values]))
+
+    # the same mutation always renders the same bytes, whatever came before it.
+    req.names["random"].reset()
+    req.names["random"].mutant_index = 7
+    req.names["random"].mutate()
+    assert(req.names["random"].value == values[7])
+
+    # while distinct mutations and seeds differ.
+    assert(len(set(values)) == 10)
+    req.names["random"].seed = "other"
+    req.names["random"].mutant_index = 7
+    req.names["random"].mutate()
+    assert(req.names["random"].value != values[7])
+
 ########################################################################################################################
 def fuzz_extension_tests ():
     import shutil
@@ -0,0 +1,307 @@
+from sulley import *
+from sulley import readiness
+
+import json
+import logging
+import os
+import socket
+import tempfile
+import urlparse
+
+from cStringIO import StringIO
+
+def run ():
+    udp_settle()
+    early_ready_line()
+    replay_round_trip()
+    crash_api()
+    crash_attribution()
+
+    # clear out the requests.
+    blocks.REQUESTS = {}
+    blocks.CURRENT  = None
+
+
+########################################################################################################################
+def udp_settle ():
+    sess   = sessions.session(proto="udp", restart_sleep_time=300, log_level=logging.CRITICAL, web_port=0)
+    target = sessions.target("127.0.0.1", 53)
+    slept  = []
+
+    def wait_ready (probes, timeout):
+        assert(False)
+
+    # udp targets have nothing to probe, a restart only sleeps the settle time.
+    sleep, probe = sessions.time.sleep, sessions.readiness.wait_ready
+    sessions.time.sleep, sessions.readiness.wait_ready = slept.append, wait_ready
+
+    try:
+        assert(sess.wait_for_target(target, settle=3))
+    finally:
+        sessions.time.sleep, sessions.readiness.wait_ready = sleep, probe
+
+    assert(slept == [3])
+
+
+########################################################################################################################
+def early_ready_line ():
+    fd, filename = tempfile.mkstemp()
+    os.write(fd, "starting\n")
+
+    try:
+        probe = readiness.log_line(filename, "^listening")
+
+        # the probe is reset before the target starts, which logs its ready line straight away.
+        probe.reset()
+        os.write(fd, "listening on port 80\n")
+        assert(readiness.wait_ready(probe, timeout=1, reset=False))
+
+        # resetting after the fact skips the line.
+        assert(not readiness.wait_ready(probe, timeout=0.1))
+    finally:
+        os.close(fd)
+        os.remove(filename)
+
+
+class fake_procmon:
+    '''
+    Process monitor reporting a crash on the given test cases.
+    '''
+
+    def __init__ (self, crashes):
+        self.crashes = crashes
+        self.number  = None
+
+    def alive (self):
+        return True
+
+    def pre_send (self, number):
+        self.number = number
+
+    def post_send (self):
+        return self.number not in self.crashes
+
+    def get_crash_synopsis (self):
+        return "crash on test case %d\ndetails" % self.number
+
+    def start_target (self):
+        return True
+
+    def stop_target (self):
+        pass
+
+
+def replay_session (seed, filename, port):
+    '''
+    Fresh session from the same script, over a seeded random request.
+    '''
+
+    blocks.REQUESTS = {}
+    blocks.CURRENT  = None
+
+    s_initialize("REPLAY A")
+    s_group("verb", values=["GET", "PUT"])
+
+    s_initialize("REPLAY B")
+    s_static("B:")
+    s_random("xyz", 2, 16, num_mutations=6, name="random")
+
+    sess = sessions.session(proto="udp", seed=seed, replay_filename=filename, sleep_time=0, timeout=0.01,
+                            log_level=logging.CRITICAL, web_port=0)
+    sess.add_target(sessions.target("127.0.0.1", port))
+    sess.connect("REPLAY A")
+    sess.connect("REPLAY A", "REPLAY B")
+
+    return sess
+
+
+########################################################################################################################
+def replay_round_trip ():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.setblocking(0)
+    port = listener.getsockname()[1]
+
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    os.remove(filename)
+
+    def drain ():
+        data = []
+        while 1:
+            try:
+                data.append(listener.recv(65536))
+            except socket.error:
+                return data
+
+    try:
+        # record a campaign, keeping what the target received for every test case.
+        sess = replay_session("recorded", filename, port)
+        sent = {}
+        sess.post_send     = lambda sock: sent.__setitem__(sess.total_mutant_index, drain())
+        sess.server_init   = lambda: setattr(sess, "total_num_mutations", sess.num_mutations())
+        sess.signal_module = False
+        sess.fuzz()
+
+        assert(sorted(sent.keys()) == range(1, 2 + 6 + 1))
+
+        # a differently seeded session replays the recorded test cases byte for byte, from the log alone.
+        sess   = replay_session("other", filename, port)
+        target = sess.targets[0]
+        target.procmon   = fake_procmon([5])
+        target.readiness = [readiness.callback(lambda: True)]
+        replayed = {}
+        sess.post_send = lambda sock: replayed.__setitem__(sess.total_mutant_index, drain())
+
+        assert(sess.replay([7, 2, 5]) == [])
+        assert(replayed == dict([(number, sent[number]) for number in (2, 5, 7)]))
+
+        # the crash is reported apart from the campaign, no primitive is charged for it.
+        assert(sess.replay_results.keys() == [5])
+        assert(sess.procmon_results == {} and sess.crash_keys == [])
+        assert(sess.crashing_primitives == {} and sess.protmon_results == {})
+        assert(sess.total_mutant_index == 0 and not sess.replaying)
+
+        # loading a case renders the fuzz node as sent.
+        for number in (1, 3, 8):
+            path = sess.load_case(sess.replay_log.get(number))
+            assert(sess.fuzz_node.render() == sent[number][-1])
+            assert(len(path) == len(sent[number]))
+    finally:
+        listener.close()
+
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+class offline_handler (sessions.web_interface_handler):
+    '''
+    Web handler answering into a buffer, without a server or a connection.
+    '''
+
+    def __init__ (self, session):
+        self.session         = session
+        self.request_version = "HTTP/1.0"
+        self.requestline     = "GET / HTTP/1.0"
+        self.wfile           = StringIO()
+
+
+########################################################################################################################
+def crash_api ():
+    sess = sessions.session(log_level=logging.CRITICAL, web_port=0)
+
+    for number in (3, 5, 8):
+        sess.procmon_results[number] = "crash at \xff\xfe%d\nstack" % number
+        sess.crash_keys.append(number)
+
+    handler = offline_handler(sess)
+
+    # malformed paging parameters fall back to the defaults.
+    page = handler.view_crashes(urlparse.parse_qs("since=abc&limit=1x"))
+    assert([crash["test_case"] for crash in page["crashes"]] == [3, 5, 8])
+
+    page = handler.view_crashes(urlparse.parse_qs("since=3&limit=1"))
+    assert([crash["test_case"] for crash in page["crashes"]] == [5] and page["next"] == 5)
+
+    # synopses of raw target output are not UTF-8.
+    handler.send_json(page)
+    body = handler.wfile.getvalue().split("\r\n\r\n", 1)[1]
+    assert(json.loads(body)["crashes"][0]["synopsis"] == u"crash at \xff\xfe5")
+
+
+class stateful_procmon:
+    '''
+    Process monitor of a udp target which crashes once what it received since its start matches a rule.
+    '''
+
+    def __init__ (self, listener, rule):
+        self.listener = listener
+        self.rule     = rule
+        self.received = []
+        self.starts   = 0
+        self.down     = False
+
+    def alive (self):
+        return True
+
+    def pre_send (self, number):
+        pass
+
+    def post_send (self):
+        while 1:
+            try:
+                self.received.append(self.listener.recv(65536))
+            except socket.error:
+                break
+
+        crashed   = self.down or self.rule(self.received)
+        self.down = False
+
+        return not crashed
+
+    def get_crash_synopsis (self):
+        return "crash after %r" % self.received
+
+    def start_target (self):
+        self.starts  += 1
+        self.received = []
+        return True
+
+    def stop_target (self):
+        pass
+
+
+########################################################################################################################
+def crash_attribution ():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.setblocking(0)
+    address = listener.getsockname()
+
+    def attribute (rule, history):
+        sess = sessions.session(proto="udp", crash_history=4, crash_threshold=1, sleep_time=0, timeout=0.01,
+                                log_level=logging.CRITICAL, web_port=0)
+
+        # the target only takes requests after a login, sent by the pre_send() hook.
+        sess.pre_send = lambda sock: sock.sendto("LOGIN", address)
+
+        target = sessions.target(*address)
+        target.procmon   = stateful_procmon(listener, rule)
+        target.readiness = [readiness.callback(lambda: True)]
+        sess.add_target(target)
+        target.history.extend([(number, [[data]]) for number, data in history])
+
+        s_initialize("ATTRIBUTION %d" % len(blocks.REQUESTS))
+        s_string("fuzz", name="fuzz")
+        sess.fuzz_node = s_get()
+        sess.fuzz_node.mutate()
+        sess.total_mutant_index = history[-1][0]
+
+        # the target went down on the last test case of the history.
+        target.procmon.down = True
+        sess.poll_pedrpc(target)
+
+        return sess, target.procmon
+
+    def after (data, first):
+        return lambda received: data in received and first in received[:received.index(data)]
+
+    try:
+        # the crashing test case crashes the target on its own, given the login of the hook.
+        sess, procmon = attribute(after("BOOM", "LOGIN"), [(1, "a"), (2, "BOOM")])
+        assert(sess.crash_sequences == {} and procmon.starts == 2)
+        assert(sess.crashing_primitives == {sess.fuzz_node.mutant: 1})
+        assert(sess.fuzz_node.mutant.fuzz_complete)
+
+        # the crash takes an earlier test case, the last three of the history are bisected out.
+        sess, procmon = attribute(after("Y", "X"), [(1, "a"), (2, "X"), (3, "b"), (4, "Y")])
+        assert(sess.crash_sequences == {4: [2, 3, 4]})
+        assert(sess.crashing_primitives == {})
+
+        # a crash which does not reproduce at all is still charged, crash_threshold keeps working.
+        sess, procmon = attribute(lambda received: False, [(1, "a"), (2, "b")])
+        assert(sess.crash_sequences == {2: []})
+        assert(sess.crashing_primitives == {sess.fuzz_node.mutant: 1})
+        assert(sess.procmon_results.keys() == [2])
+    finally:
+        listener.close()
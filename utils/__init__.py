@@ -1 +1,2 @@
-import crash_binning
\ No newline at end of file
+import crash_binning
+import pcap_ring
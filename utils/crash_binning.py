@@ -24,8 +24,12 @@
 
 import sys
 import zlib
+import hashlib
 import cPickle
 
+# number of innermost stack unwind frames hashed into a stack bucket.
+STACK_DEPTH = 5
+
 class __crash_bin_struct__:
     exception_module    = None
     exception_address   = 0
@@ -46,18 +50,22 @@ class crash_binning:
     @todo: Add MySQL import/export.
     '''
 
-    bins       = {}
-    last_crash = None
-    pydbg      = None
+    bins          = {}
+    test_index    = {}
+    stack_buckets = {}
+    last_crash    = None
+    pydbg         = None
 
     ####################################################################################################################
     def __init__ (self):
         '''
         '''
 
-        self.bins       = {}
-        self.last_crash = None
-        self.pydbg      = None
+        self.bins          = {}     # exception address -> list of crashes.
+        self.test_index    = {}     # extra (the test case number when recorded by sulley) -> crash.
+        self.stack_buckets = {}     # stack hash -> list of crashes, see stack_hash().
+        self.last_crash    = None
+        self.pydbg         = None
 
 
     ####################################################################################################################
@@ -128,9 +136,82 @@ class crash_binning:
             self.bins[crash.exception_address] = []
 
         self.bins[crash.exception_address].append(crash)
+        self.index_crash(crash)
         self.last_crash = crash
 
 
+    ####################################################################################################################
+    def index_crash (self, crash):
+        '''
+        Add a crash to the test number index and to its stack bucket.
+
+        @type  crash: __crash_bin_struct__
+        @param crash: Crash to index
+        '''
+
+        if crash.extra is not None:
+            self.test_index[crash.extra] = crash
+
+        self.stack_buckets.setdefault(self.stack_hash(crash), []).append(crash)
+
+
+    ####################################################################################################################
+    def rebuild_indexes (self):
+        '''
+        Rebuild the test number index and the stack buckets from the bins.
+        '''
+
+        self.test_index    = {}
+        self.stack_buckets = {}
+
+        for crashes in self.bins.itervalues():
+            for crash in crashes:
+                self.index_crash(crash)
+
+
+    ####################################################################################################################
+    def stack_hash (self, crash, depth=STACK_DEPTH):
+        '''
+        Hash the faulting module and the innermost frames of the stack unwind of a crash. Crashes at different
+        exception addresses reached through the same call stack end up in the same bucket.
+
+        @type  crash: __crash_bin_struct__
+        @param crash: Crash to hash
+        @type  depth: Integer
+        @param depth: (Optional, def=STACK_DEPTH) Number of innermost frames to hash
+
+        @rtype:  String
+        @return: Stack hash
+        '''
+
+        frames = [crash.exception_module] + list(crash.stack_unwind[:depth])
+
+        return hashlib.sha1("|".join([str(frame) for frame in frames])).hexdigest()[:16]
+
+
+    ####################################################################################################################
+    def find_test (self, test_number):
+        '''
+        @type  test_number: Integer
+        @param test_number: Test case number (crash extra) to look up
+
+        @rtype:  __crash_bin_struct__
+        @return: Crash recorded for the test case, None if there is none
+        '''
+
+        return self.test_index.get(test_number)
+
+
+    ####################################################################################################################
+    def crashing_tests (self):
+        '''
+        @rtype:  Set
+        @return: Test case numbers (crash extras) of all recorded crashes
+        '''
+
+        return set(self.test_index)
+
+
     ####################################################################################################################
     def crash_synopsis (self, crash=None):
         '''
@@ -198,18 +279,24 @@ class crash_binning:
         @return:            self
         '''
 
-        # null out what we don't serialize but save copies to restore after dumping to disk.
-        last_crash = self.last_crash
-        pydbg      = self.pydbg
+        # null out what we don't serialize but save copies to restore after dumping to disk. the indexes are rebuilt
+        # on import, which keeps the file format unchanged.
+        last_crash    = self.last_crash
+        pydbg         = self.pydbg
+        test_index    = self.test_index
+        stack_buckets = self.stack_buckets
 
         self.last_crash = self.pydbg = None
+        self.test_index = self.stack_buckets = {}
 
         fh = open(file_name, "wb+")
         fh.write(zlib.compress(cPickle.dumps(self, protocol=2)))
         fh.close()
 
-        self.last_crash = last_crash
-        self.pydbg      = pydbg
+        self.last_crash    = last_crash
+        self.pydbg         = pydbg
+        self.test_index    = test_index
+        self.stack_buckets = stack_buckets
 
         return self
 
@@ -233,6 +320,7 @@ class crash_binning:
         fh.close()
 
         self.bins = tmp.bins
+        self.rebuild_indexes()
 
         return self
 
@@ -9,6 +9,7 @@ import pgraph
 
 USAGE = "\nUSAGE: crashbin_explorer.py <xxx.crashbin>"                                      \
         "\n    [-t|--test #]     dump the crash synopsis for a specific test case number"   \
+        "\n    [-b|--buckets]    group crashes by call stack instead of exception address"  \
         "\n    [-g|--graph name] generate a graph of all crash paths, save to 'name'.udg\n"
 
 #
@@ -19,16 +20,18 @@ try:
     if len(sys.argv) < 2:
         raise Exception
 
-    opts, args = getopt.getopt(sys.argv[2:], "t:g:", ["test=", "graph="])
+    opts, args = getopt.getopt(sys.argv[2:], "t:g:b", ["test=", "graph=", "buckets"])
 except:
     print USAGE
     sys.exit(1)
 
 test_number = graph_name = graph = None
+buckets     = False
 
 for opt, arg in opts:
     if opt in ("-t", "--test"):  test_number = int(arg)
     if opt in ("-g", "--graph"): graph_name  = arg
+    if opt in ("-b", "--buckets"): buckets   = True
 
 try:
     crashbin = utils.crash_binning.crash_binning()
@@ -42,11 +45,24 @@ except:
 #
 
 if test_number:
-    for bin, crashes in crashbin.bins.iteritems():
-        for crash in crashes:
-            if test_number == crash.extra:
-                print crashbin.crash_synopsis(crash)
-                sys.exit(0)
+    crash = crashbin.find_test(test_number)
+
+    if crash:
+        print crashbin.crash_synopsis(crash)
+        sys.exit(0)
+
+#
+# display an overview of the crashes grouped by the innermost frames of their call stack.
+#
+
+if buckets:
+    for stack, crashes in sorted(crashbin.stack_buckets.iteritems(), key=lambda (stack, crashes): -len(crashes)):
+        synopsis = crashbin.crash_synopsis(crashes[0]).split("\n")[0]
+
+        print "[%d] %s %s" % (len(crashes), stack, synopsis)
+        print "\t" + ", ".join(["%d" % crash.extra for crash in crashes]) + "\n"
+
+    sys.exit(0)
 
 #
 # display an overview of all recorded crashes.
@@ -92,5 +108,5 @@ for bin, crashes in crashbin.bins.iteritems():
 
 if graph:
     fh = open("%s.udg" % graph_name, "w+")
-    fh.write(graph.render_graph_udraw())
+    graph.write_graph(fh, "udraw")
     fh.close()
\ No newline at end of file
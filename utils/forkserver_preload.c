@@ -0,0 +1,69 @@
+/*
+ * Stand-in AFL style fork server for targets not built with afl-gcc/afl-clang, see process_monitor_unix.py -f.
+ *
+ *     gcc -shared -fPIC -O2 -o forkserver_preload.so forkserver_preload.c
+ *     process_monitor_unix.py -c crashes.bin -f --preload ./forkserver_preload.so
+ *
+ * Loaded through LD_PRELOAD, the constructor below runs once the dynamic linker has loaded and relocated the target
+ * and before its main(). When the process monitor holds the fork server pipes it parks there: it says hello on the
+ * status descriptor, then forks a child for every 4 byte request on the control descriptor, answers with the child
+ * pid and, once the child exits, with its waitpid() status. Children return from the constructor and run main().
+ *
+ * Forking before main() only saves the exec and the dynamic linking. Targets with a long initialization of their
+ * own are better served by an afl-gcc/afl-clang build with a deferred fork server.
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+#define FORKSRV_FD 198
+
+static int write_all (int fd, int32_t value) {
+    return write(fd, &value, 4) == 4;
+}
+
+__attribute__((constructor))
+static void forkserver (void) {
+    int32_t request;
+    int status;
+    pid_t pid;
+
+    /* not started by the process monitor, or a child of the fork server. */
+    if (fcntl(FORKSRV_FD, F_GETFD) == -1 || fcntl(FORKSRV_FD + 1, F_GETFD) == -1)
+        return;
+
+    /* the target's own children do not get a fork server. */
+    unsetenv("LD_PRELOAD");
+
+    if (!write_all(FORKSRV_FD + 1, 0))
+        return;
+
+    while (1) {
+        if (read(FORKSRV_FD, &request, 4) != 4)
+            _exit(1);
+
+        pid = fork();
+
+        if (pid < 0)
+            _exit(1);
+
+        if (!pid) {
+            close(FORKSRV_FD);
+            close(FORKSRV_FD + 1);
+            return;
+        }
+
+        if (!write_all(FORKSRV_FD + 1, pid))
+            _exit(1);
+
+        if (waitpid(pid, &status, 0) < 0)
+            _exit(1);
+
+        if (!write_all(FORKSRV_FD + 1, status))
+            _exit(1);
+    }
+}
@@ -24,15 +24,16 @@ except:
     print "unable to open crashbin: '%s'." % sys.argv[1]
     sys.exit(1)
 
-test_cases = []
-for bin, crashes in crashbin.bins.iteritems():
-    for crash in crashes:
-        test_cases.append("%d.pcap" % crash.extra)
+test_cases = set(["%d.pcap" % test_number for test_number in crashbin.crashing_tests()])
 
 #
-# step through the pcap directory and erase all files not pertaining to a crash.
+# step through the pcap directory and erase all per test case pcaps not pertaining to a crash. the pcapng store
+# (capture.*) is left alone, use the network monitor's export() to pull the crashing test cases out of it.
 #
 
 for filename in os.listdir(sys.argv[2]):
+    if not filename.endswith(".pcap") or not filename[:-5].isdigit():
+        continue
+
     if filename not in test_cases:
         os.unlink("%s/%s" % (sys.argv[2], filename))
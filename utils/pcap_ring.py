@@ -0,0 +1,133 @@
+'''
+Continuous packet capture into a bounded in-memory ring.
+
+One long lived capture handle feeds every packet into the ring, tagged with the test case in flight when it was
+seen. The network monitors mark test case boundaries from pre_send()/post_send() and only store the packets around
+test cases that crashed the target, instead of opening a capture handle for every test case.
+'''
+
+import collections
+import threading
+
+
+class ring:
+    def __init__ (self, max_bytes=64 * 1024 * 1024):
+        '''
+        @type  max_bytes: Integer
+        @param max_bytes: (Optional, def=64MB) Captured bytes to hold on to, the oldest packets are dropped first
+        '''
+
+        self.max_bytes  = max_bytes
+
+        self.packets    = collections.deque()   # (test number, seconds, microseconds, length, data)
+        self.bytes      = 0
+        self.current    = None                  # test case in flight, None between test cases.
+        self.last       = None                  # most recent test case, owns the packets trailing it.
+        self.case_bytes = 0
+        self.lock       = threading.Lock()
+
+
+    def add (self, seconds, useconds, length, data):
+        '''
+        Add a captured packet to the ring, evicting the oldest packets once the ring is full.
+
+        @type  seconds:  Integer
+        @param seconds:  Capture timestamp, seconds part
+        @type  useconds: Integer
+        @param useconds: Capture timestamp, microseconds part
+        @type  length:   Integer
+        @param length:   Length of the packet on the wire
+        @type  data:     Raw
+        @param data:     Captured bytes of the packet
+        '''
+
+        with self.lock:
+            if self.current is not None:
+                test_number = self.current
+                self.case_bytes += len(data)
+            else:
+                test_number = self.last
+
+            self.packets.append((test_number, seconds, useconds, length, data))
+            self.bytes += len(data)
+
+            while self.bytes > self.max_bytes:
+                self.bytes -= len(self.packets.popleft()[4])
+
+
+    def mark_start (self, test_number):
+        '''
+        Mark the start of a test case, packets seen from now on belong to it.
+
+        @type  test_number: Integer
+        @param test_number: Test case about to be transmitted
+        '''
+
+        with self.lock:
+            self.current    = test_number
+            self.last       = test_number
+            self.case_bytes = 0
+
+
+    def mark_end (self):
+        '''
+        Mark the end of the test case in flight.
+
+        @rtype:  Integer
+        @return: Number of bytes captured during the test case
+        '''
+
+        with self.lock:
+            self.current = None
+            return self.case_bytes
+
+
+    def window (self, test_number, before=0, after=0):
+        '''
+        Packets captured during a range of test cases, oldest first.
+
+        @type  test_number: Integer
+        @param test_number: Test case to center the window on
+        @type  before:      Integer
+        @param before:      (Optional, def=0) Number of preceding test cases to include
+        @type  after:       Integer
+        @param after:       (Optional, def=0) Number of following test cases to include
+
+        @rtype:  List
+        @return: List of (test number, seconds, microseconds, length, data) packets
+        '''
+
+        low, high = test_number - before, test_number + after
+
+        with self.lock:
+            return [packet for packet in self.packets if packet[0] is not None and low <= packet[0] <= high]
+
+
+class capture_thread (threading.Thread):
+    def __init__ (self, pcap, ring):
+        '''
+        Long lived capture loop feeding a ring.
+
+        @type  pcap: pcapy.Reader
+        @param pcap: Open live capture handle, opened with a read timeout so the loop can notice it was stopped
+        @type  ring: pcap_ring.ring
+        @param ring: Ring to feed captured packets into
+        '''
+
+        threading.Thread.__init__(self)
+
+        self.pcap   = pcap
+        self.ring   = ring
+        self.active = True
+        self.daemon = True
+
+
+    def packet_handler (self, header, data):
+        seconds, useconds = header.getts()
+        self.ring.add(seconds, useconds, header.getlen(), data)
+
+
+    def run (self):
+        # process packets while the active flag is raised.
+        while self.active:
+            self.pcap.dispatch(0, self.packet_handler)
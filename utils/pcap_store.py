@@ -0,0 +1,235 @@
+'''
+Indexed, segmented pcapng store for the network monitors.
+
+Packets of every saved test case are appended as enhanced packet blocks to the current segment file, a new segment
+is started once the current one grows past the segment size. An append only index maps each test number to the byte
+range its packets occupy, so a single test case can be served by seeking instead of keeping a file per test case.
+
+Every segment starts with its own section header and interface description blocks, the capture of a test case is
+that header followed by the test case's byte range. Segment layout:
+
+    <path>/capture.<n>.pcapng   segments
+    <path>/capture.index        "test_number segment offset length" lines, the last line for a test number wins
+'''
+
+import os
+import struct
+import threading
+
+SHB_TYPE      = 0x0A0D0D0A
+IDB_TYPE      = 0x00000001
+EPB_TYPE      = 0x00000006
+BYTE_ORDER    = 0x1A2B3C4D
+HEADER_LENGTH = 48                  # section header block (28) + interface description block (20).
+CHUNK         = 1024 * 1024
+
+
+def header (linktype, snaplen):
+    '''
+    Section header and interface description blocks opening every segment.
+
+    @rtype:  Raw
+    @return: pcapng file header
+    '''
+
+    shb = struct.pack("<IIIHHqI", SHB_TYPE, 28, BYTE_ORDER, 1, 0, -1, 28)
+    idb = struct.pack("<IIHHII", IDB_TYPE, 20, linktype, 0, snaplen, 20)
+
+    return shb + idb
+
+
+def packet_block (seconds, useconds, length, data):
+    '''
+    Enhanced packet block for a captured packet on interface 0, microsecond timestamps.
+
+    @rtype:  Raw
+    @return: pcapng enhanced packet block
+    '''
+
+    padding   = -len(data) % 4
+    total     = 32 + len(data) + padding
+    timestamp = seconds * 1000000 + useconds
+
+    return struct.pack("<IIIIIII", EPB_TYPE, total, 0, timestamp >> 32, timestamp & 0xffffffff, len(data), length) + \
+           data + "\x00" * padding + struct.pack("<I", total)
+
+
+class store:
+    def __init__ (self, path, linktype=1, snaplen=65535, segment_size=256 * 1024 * 1024):
+        '''
+        Open the store in path, picking up the index of earlier runs.
+
+        @type  path:         String
+        @param path:         Directory holding the segments and the index
+        @type  linktype:     Integer
+        @param linktype:     (Optional, def=1) Data link type written to new segments, ie: pcapy.DLT_EN10MB
+        @type  snaplen:      Integer
+        @param snaplen:      (Optional, def=65535) Snap length written to new segments
+        @type  segment_size: Integer
+        @param segment_size: (Optional, def=256MB) Size past which a new segment is started
+        '''
+
+        self.path         = path
+        self.linktype     = linktype
+        self.snaplen      = snaplen
+        self.segment_size = segment_size
+
+        self.index        = {}      # test number -> (segment, offset, length)
+        self.segment      = 0
+        self.lock         = threading.Lock()
+
+        index_path = os.path.join(path, "capture.index")
+
+        if os.path.exists(index_path):
+            for line in open(index_path):
+                try:
+                    test_number, segment, offset, length = [int(field) for field in line.split()]
+                except ValueError:
+                    # a line cut short by a crash of the monitor.
+                    continue
+
+                self.index[test_number] = (segment, offset, length)
+                self.segment            = max(self.segment, segment)
+
+        self.index_fh = open(index_path, "a")
+
+
+    def segment_path (self, segment):
+        return os.path.join(self.path, "capture.%d.pcapng" % segment)
+
+
+    def append (self, test_number, packets):
+        '''
+        Append the packets of a test case to the store.
+
+        @type  test_number: Integer
+        @param test_number: Test case the packets belong to
+        @type  packets:     List
+        @param packets:     List of (seconds, microseconds, length, data) packets
+
+        @rtype:  Integer
+        @return: Number of bytes appended
+        '''
+
+        blocks = "".join([packet_block(*packet) for packet in packets])
+
+        with self.lock:
+            filename = self.segment_path(self.segment)
+
+            if os.path.exists(filename) and os.path.getsize(filename) + len(blocks) > self.segment_size:
+                self.segment += 1
+                filename      = self.segment_path(self.segment)
+
+            fh = open(filename, "ab")
+
+            if not fh.tell():
+                fh.write(header(self.linktype, self.snaplen))
+
+            offset = fh.tell()
+            fh.write(blocks)
+            fh.close()
+
+            self.index[test_number] = (self.segment, offset, len(blocks))
+            self.index_fh.write("%d %d %d %d\n" % (test_number, self.segment, offset, len(blocks)))
+            self.index_fh.flush()
+
+        return len(blocks)
+
+
+    def size (self, test_number):
+        '''
+        @rtype:  Integer
+        @return: Size of the pcapng capture of a test case, None if the test case isn't in the store
+        '''
+
+        if test_number not in self.index:
+            return None
+
+        return HEADER_LENGTH + self.index[test_number][2]
+
+
+    def read (self, test_number, offset=0, length=None):
+        '''
+        Read a range of the pcapng capture of a test case, seeking straight to it in its segment.
+
+        @type  test_number: Integer
+        @param test_number: Test case to read
+        @type  offset:      Integer
+        @param offset:      (Optional, def=0) Offset into the capture
+        @type  length:      Integer
+        @param length:      (Optional, def=None) Maximum number of bytes to read, None for the rest of the capture
+
+        @rtype:  Raw
+        @return: Requested range, shorter than length (or empty) past the end of the capture
+        '''
+
+        segment, start, size = self.index[test_number]
+        total                = HEADER_LENGTH + size
+
+        if length is None:
+            length = total
+
+        end = min(offset + length, total)
+        if offset >= end:
+            return ""
+
+        fh   = open(self.segment_path(segment), "rb")
+        data = ""
+
+        # the capture is the segment header followed by the test case's blocks.
+        if offset < HEADER_LENGTH:
+            data   += fh.read(HEADER_LENGTH)[offset:end]
+            offset  = HEADER_LENGTH
+
+        if offset < end:
+            fh.seek(start + offset - HEADER_LENGTH)
+            data += fh.read(end - offset)
+
+        fh.close()
+
+        return data
+
+
+    def export (self, test_numbers, filename):
+        '''
+        Bulk export the captures of a set of test cases into a single pcapng file, copying in chunks.
+
+        @type  test_numbers: List
+        @param test_numbers: Test cases to export, ie: range(1000, 2000), test cases not in the store are skipped
+        @type  filename:     String
+        @param filename:     pcapng file to write
+
+        @rtype:  Integer
+        @return: Number of test cases exported
+        '''
+
+        exported = 0
+        out      = open(filename, "wb")
+
+        for test_number in sorted(set(test_numbers)):
+            if test_number not in self.index:
+                continue
+
+            segment, offset, length = self.index[test_number]
+
+            fh = open(self.segment_path(segment), "rb")
+
+            # a single section and interface suffice while the segments agree on them.
+            if not exported:
+                out.write(fh.read(HEADER_LENGTH))
+
+            fh.seek(offset)
+            while length > 0:
+                data = fh.read(min(CHUNK, length))
+                if not data:
+                    break
+
+                out.write(data)
+                length -= len(data)
+
+            fh.close()
+            exported += 1
+
+        out.close()
+
+        return exported
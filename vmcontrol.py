@@ -6,6 +6,7 @@ import os
 import sys
 import time
 import getopt
+import threading
 
 try:
     from win32api import GetShortPathName
@@ -17,6 +18,7 @@ except:
 
 
 from sulley import pedrpc
+from sulley import readiness
 
 PORT  = 26003
 ERR   = lambda msg: sys.stderr.write("ERR> " + msg + "\n") or sys.exit(1)
@@ -27,11 +29,17 @@ USAGE = "USAGE: vmcontrol.py"
         "\n    [-l|--log_level LEVEL]   log level (default 1), increase for more verbosity" \
         "\n    [-i|--interactive]       Interactive mode, prompts for input values"         \
         "\n    [--port PORT]            TCP port to bind this agent to"                      \
-        "\n    [--vbox]                 control an Oracle VirtualBox VM"
+        "\n    [--vbox]                 control an Oracle VirtualBox VM"                     \
+        "\n    [--target HOST:PORT]     service endpoint of the VMX, probed for readiness"   \
+        "\n    [--standby VMX,HOST:PORT] warm standby clone to swap in on restart (repeatable)"
+
+PROBE_TIMEOUT = 300
+RECYCLE_TRIES = 3       # reverts of a standby clone whose service does not answer before it is left out of the pool.
 
 ########################################################################################################################
 class vmcontrol_pedrpc_server (pedrpc.server):
-    def __init__ (self, host, port, vmrun, vmx, snap_name=None, log_level=1, interactive=False):
+    def __init__ (self, host, port, vmrun, vmx, snap_name=None, log_level=1, interactive=False, target=None,
+                  standby=None):
         '''
         @type  host:         String
         @param host:         Hostname or IP address to bind server to
@@ -47,6 +55,10 @@ class vmcontrol_pedrpc_server (pedrpc.server):
         @param log_level:    (Optional, def=1) Log output level, increase for more verbosity
         @type  interactive:  Boolean
         @param interactive:  (Option, def=False) Interactive mode, prompts for input values
+        @type  target:       Tuple
+        @param target:       (Optional, def=None) (host, port) of the service running in the VM, probed for readiness
+        @type  standby:      List
+        @param standby:      (Optional, def=None) List of (vmx, host, port) warm standby clones of the VM
         '''
 
         # initialize the PED-RPC server.
@@ -129,6 +141,10 @@ class vmcontrol_pedrpc_server (pedrpc.server):
         self.log("\t vmx:       %s" % self.vmx)
         self.log("\t snap name: %s" % self.snap_name)
         self.log("\t log level: %d" % self.log_level)
+        self.log("\t target:    %s" % (target,))
+        self.log("\t standby:   %d" % len(standby or []))
+
+        self.init_pool(target, standby)
         self.log("Awaiting requests...")
 
 
@@ -167,6 +183,129 @@ class vmcontrol_pedrpc_server (pedrpc.server):
         self.snap_name = snap_name
 
 
+    def set_target (self, host, port):
+        '''
+        Set the service endpoint of the active VM, used to probe for readiness and handed back to the session when a
+        standby is swapped in.
+
+        @type  host: String
+        @param host: Hostname or IP address of the service running in the active VM
+        @type  port: Integer
+        @param port: Port of the service running in the active VM
+        '''
+
+        self.log("setting target to %s:%d" % (host, port), 2)
+        self.target_host = host
+        self.target_port = port
+
+
+    def init_pool (self, target, standby):
+        '''
+        Initialize the warm standby pool and bring each of the standby clones up in the background.
+
+        @type  target:  Tuple
+        @param target:  (host, port) of the service running in the active VM or None
+        @type  standby: List
+        @param standby: List of (vmx, host, port) warm standby clones or None
+        '''
+
+        self.target_host = None
+        self.target_port = None
+        self.standby     = []                       # (vmx, host, port) clones that are reverted, booted and serving.
+        self.pool_lock   = threading.Lock()
+
+        if target:
+            self.set_target(*target)
+
+        for vmx, host, port in standby or []:
+            self.add_standby(vmx, host, port)
+
+
+    def add_standby (self, vmx, host, port):
+        '''
+        Add a clone of the VM to the warm standby pool. The clone is reverted and started in the background and only
+        becomes eligible for a swap once its service answers on host:port.
+
+        @type  vmx:  String
+        @param vmx:  Path to VMX file (or VirtualBox machine name) of the clone
+        @type  host: String
+        @param host: Hostname or IP address of the service running in the clone
+        @type  port: Integer
+        @param port: Port of the service running in the clone
+        '''
+
+        self.log("adding standby %s (%s:%d)" % (vmx, host, port))
+
+        recycler = threading.Thread(target=self.recycle, args=(self.local_name(vmx), host, port))
+        recycler.daemon = True
+        recycler.start()
+
+
+    def local_name (self, vmx):
+        '''
+        Translate a VMX path to the form vmrun reports it in.
+        '''
+
+        if os.name == "nt":
+            return GetShortPathName(r"%s" % vmx)
+
+        return vmx
+
+
+    def probe (self, host, port, timeout=PROBE_TIMEOUT):
+        '''
+        Wait for the service of a VM to accept connections.
+
+        @type  host:    String
+        @param host:    Hostname or IP address of the service
+        @type  port:    Integer
+        @param port:    Port of the service
+        @type  timeout: Integer
+        @param timeout: (Optional, def=PROBE_TIMEOUT) Seconds to wait before giving up
+
+        @rtype:  Boolean
+        @return: True if the service accepted a connection within the timeout, False otherwise
+        '''
+
+        if readiness.wait_ready(readiness.port_open(host, port), timeout=timeout, max_delay=2):
+            return True
+
+        self.log("gave up waiting for %s:%d after %d seconds" % (host, port, timeout))
+        return False
+
+
+    def recycle (self, vmx, host, port):
+        '''
+        Revert and start a VM, wait for its service to come up and place it in the warm standby pool. Runs on a
+        background thread while the campaign continues against the active VM. A VM whose service does not answer is
+        reverted again, up to RECYCLE_TRIES times, and then left out of the pool.
+
+        @type  vmx:  String
+        @param vmx:  Path to VMX file (or VirtualBox machine name) to recycle
+        @type  host: String
+        @param host: Hostname or IP address of the service running in the VM
+        @type  port: Integer
+        @param port: Port of the service running in the VM
+        '''
+
+        self.log("recycling %s in the background" % vmx, 2)
+
+        for attempt in xrange(RECYCLE_TRIES):
+            self.revert_to_snapshot(vmx=vmx)
+            self.start(vmx=vmx)
+
+            if self.wait(vmx, host, port):
+                break
+        else:
+            self.log("standby %s (%s:%d) never answered, leaving it out of the pool" % (vmx, host, port))
+            return
+
+        with self.pool_lock:
+            self.standby.append((vmx, host, port))
+
+        self.log("standby ready: %s (%s:%d)" % (vmx, host, port))
+
+
     def vmcommand (self, command):
         '''
         Execute the specified command, keep trying in the event of a failure.
@@ -233,13 +372,16 @@ class vmcontrol_pedrpc_server (pedrpc.server):
         return self.vmcommand(command)
 
 
-    def revert_to_snapshot (self, snap_name=None):
+    def revert_to_snapshot (self, snap_name=None, vmx=None):
         if not snap_name:
             snap_name = self.snap_name
 
+        if not vmx:
+            vmx = self.vmx
+
         self.log("reverting to snapshot: %s" % snap_name, 2)
 
-        command = self.vmrun + " revertToSnapshot " + self.vmx + " " + '"' + snap_name + '"'
+        command = self.vmrun + " revertToSnapshot " + vmx + " " + '"' + snap_name + '"'
         return self.vmcommand(command)
 
 
@@ -254,17 +396,23 @@ class vmcontrol_pedrpc_server (pedrpc.server):
         return self.vmcommand(command)
 
 
-    def start (self):
+    def start (self, vmx=None):
+        if not vmx:
+            vmx = self.vmx
+
         self.log("starting image", 2)
 
-        command = self.vmrun + " start " + self.vmx
+        command = self.vmrun + " start " + vmx
         return self.vmcommand(command)
 
 
-    def stop (self):
+    def stop (self, vmx=None):
+        if not vmx:
+            vmx = self.vmx
+
         self.log("stopping image", 2)
 
-        command = self.vmrun + " stop " + self.vmx
+        command = self.vmrun + " stop " + vmx
         return self.vmcommand(command)
 
 
@@ -281,19 +429,48 @@ class vmcontrol_pedrpc_server (pedrpc.server):
 
 
     def restart_target (self):
-        self.log("restarting virtual machine...")
+        '''
+        Bring a fresh copy of the target up. If a warm standby is ready it becomes the active VM immediately and the
+        crashed VM is reverted in the background, otherwise the active VM is reverted in place.
+
+        @rtype:  Tuple
+        @return: (host, port) of the service in the now active VM, None if no target endpoint was configured
+        '''
 
-        # revert to the specified snapshot and start the image.
-        self.revert_to_snapshot()
-        self.start()
+        with self.pool_lock:
+            # the crashed VM can only rejoin the pool if we know where its service lives.
+            if self.standby and self.target_host is not None:
+                crashed  = (self.vmx, self.target_host, self.target_port)
+                standby  = self.standby.pop(0)
+            else:
+                standby  = None
 
-        # wait for the snapshot to come alive.
-        self.wait()
+        if standby:
+            self.vmx, self.target_host, self.target_port = standby
+            self.log("swapped in standby %s (%s:%d)" % standby)
 
+            recycler = threading.Thread(target=self.recycle, args=crashed)
+            recycler.daemon = True
+            recycler.start()
+        else:
+            self.log("restarting virtual machine...")
 
-    def is_target_running (self):
-        # sometimes vmrun reports that the VM is up while it's still reverting.
-        time.sleep(10)
+            # revert to the specified snapshot and start the image.
+            self.revert_to_snapshot()
+            self.start()
+
+            # wait for the snapshot to come alive.
+            self.wait()
+
+        if self.target_host is None:
+            return None
+
+        return self.target_host, self.target_port
+
+
+    def is_target_running (self, vmx=None):
+        if not vmx:
+            vmx = self.vmx
 
         for line in self.list().lower().split('\n'):
             if os.name == "nt":
@@ -303,24 +480,46 @@ class vmcontrol_pedrpc_server (pedrpc.server):
                 except:
                     continue
 
-            if self.vmx.lower() == line.lower():
+            if vmx.lower() == line.lower():
                 return True
 
         return False
 
 
-    def wait (self):
-        self.log("waiting for vmx to come up: %s" % self.vmx)
+    def wait (self, vmx=None, host=None, port=None):
+        '''
+        Wait for the VM to be running and, if its service endpoint is known, for the service to accept connections.
+        Defaults to the active VM.
+
+        @rtype:  Boolean
+        @return: False if the service did not accept connections within PROBE_TIMEOUT, True otherwise
+        '''
+
+        if not vmx:
+            vmx, host, port = self.vmx, self.target_host, self.target_port
+
+        self.log("waiting for vmx to come up: %s" % vmx)
         while 1:
-            if self.is_target_running():
+            if self.is_target_running(vmx):
                 break
 
+            time.sleep(1)
+
+        if host is not None:
+            return self.probe(host, port)
+        else:
+            # sometimes vmrun reports that the VM is up while it's still reverting. without an endpoint to probe all
+            # we can do is give it a while.
+            time.sleep(10)
+            return True
+
 
 ########################################################################################################################
 
 ########################################################################################################################
 class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
-    def __init__ (self, host, port, vmrun, vmx, snap_name=None, log_level=1, interactive=False):
+    def __init__ (self, host, port, vmrun, vmx, snap_name=None, log_level=1, interactive=False, target=None,
+                  standby=None):
         '''
         Controls an Oracle VirtualBox Virtual Machine
         
@@ -338,6 +537,10 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
         @param log_level:    (Optional, def=1) Log output level, increase for more verbosity
         @type  interactive:  Boolean
         @param interactive:  (Option, def=False) Interactive mode, prompts for input values
+        @type  target:       Tuple
+        @param target:       (Optional, def=None) (host, port) of the service running in the VM, probed for readiness
+        @type  standby:      List
+        @param standby:      (Optional, def=None) List of (vmx, host, port) warm standby clones of the VM
         '''
 
         # initialize the PED-RPC server.
@@ -405,6 +608,10 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
         self.log("\t machine name:       %s" % self.vmx)
         self.log("\t snap name: %s" % self.snap_name)
         self.log("\t log level: %d" % self.log_level)
+        self.log("\t target:    %s" % (target,))
+        self.log("\t standby:   %d" % len(standby or []))
+
+        self.init_pool(target, standby)
         self.log("Awaiting requests...")
 
     ###
@@ -454,19 +661,22 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
         command = self.vmrun + " controlvm " + self.vmx + " resume"
         return self.vmcommand(command)
 
-    def revert_to_snapshot (self, snap_name=None):
+    def revert_to_snapshot (self, snap_name=None, vmx=None):
         if not snap_name:
             snap_name = self.snap_name
 
+        if not vmx:
+            vmx = self.vmx
+
         #VirtualBox flips out if you try to do this with a running VM
-        if self.is_target_running():
-            self.stop()
+        if self.is_target_running(vmx):
+            self.stop(vmx)
 
 
 
         self.log("reverting to snapshot: %s" % snap_name, 2)
 
-        command = self.vmrun + " snapshot " + self.vmx + " restore " + snap_name 
+        command = self.vmrun + " snapshot " + vmx + " restore " + snap_name 
         return self.vmcommand(command)
 
 
@@ -486,18 +696,24 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
         return self.vmcommand(command)
 
 
-    def start (self):
+    def start (self, vmx=None):
+        if not vmx:
+            vmx = self.vmx
+
         self.log("starting image", 2)
 
-        command = self.vmrun + " startvm " + self.vmx 
+        command = self.vmrun + " startvm " + vmx 
         # TODO: we may want to do more here with headless, gui, etc...
         return self.vmcommand(command)
 
 
-    def stop (self):
+    def stop (self, vmx=None):
+        if not vmx:
+            vmx = self.vmx
+
         self.log("stopping image", 2)
 
-        command = self.vmrun + " controlvm " + self.vmx + " poweroff"
+        command = self.vmrun + " controlvm " + vmx + " poweroff"
         return self.vmcommand(command)
 
 
@@ -513,34 +729,23 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
     ###
 
 #added a function here to get vminfo... useful for parsing stuff out later
-    def get_vminfo(self):
+    def get_vminfo(self, vmx=None):
+           if not vmx:
+               vmx = self.vmx
 
            self.log("getting vminfo", 2)
 
-           command = self.vmrun + " showvminfo " + self.vmx + " --machinereadable"
+           command = self.vmrun + " showvminfo " + vmx + " --machinereadable"
            return self.vmcommand(command)
 
 
-    def restart_target (self):
-        self.log("restarting virtual machine...")
-    
-        #VirtualBox flips out if you try to do this with a running VM
-        if self.is_target_running():
-            self.stop()
-
-        # revert to the specified snapshot and start the image.
-        self.revert_to_snapshot()
-        self.start()
-
-        # wait for the snapshot to come alive.
-        self.wait()
+    def local_name (self, vmx):
+        # virtualbox machines are addressed by name, not by path.
+        return vmx
 
 
-    def is_target_running (self):
-        # sometimes vmrun reports that the VM is up while it's still reverting.
-        time.sleep(10)
-
-        for line in self.get_vminfo().split('\n'):
+    def is_target_running (self, vmx=None):
+        for line in self.get_vminfo(vmx).split('\n'):
             if line == 'VMState="running"':
                 return True
 
@@ -561,7 +766,7 @@ class vboxcontrol_pedrpc_server (vmcontrol_pedrpc_server):
 if __name__ == "__main__":
     # parse command line options.
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "x:r:s:l:i", ["vmx=", "vmrun=", "snapshot=", "log_level=", "interactive", "port=", "vbox"])
+        opts, args = getopt.getopt(sys.argv[1:], "x:r:s:l:i", ["vmx=", "vmrun=", "snapshot=", "log_level=", "interactive", "port=", "vbox", "target=", "standby="])
     except getopt.GetoptError:
         ERR(USAGE)
 
@@ -571,7 +776,9 @@ if __name__ == "__main__":
     log_level   = 1
     interactive = False
     virtualbox  = False
-    
+    target      = None
+    standby     = []
+
     for opt, arg in opts:
         if opt in ("-x", "--vmx"):         vmx         = arg
         if opt in ("-r", "--vmrun"):       vmrun       = arg
@@ -580,6 +787,15 @@ if __name__ == "__main__":
         if opt in ("-i", "--interactive"): interactive = True
         if opt in ("--port"):              PORT        = int(arg)
         if opt in ("--vbox"):              virtualbox  = True
+
+        if opt == "--target":
+            host, port = arg.rsplit(":", 1)
+            target     = (host, int(port))
+
+        if opt == "--standby":
+            clone, endpoint = arg.rsplit(",", 1)
+            host, port      = endpoint.rsplit(":", 1)
+            standby.append((clone, host, int(port)))
         
     # OS check
     if interactive and not os.name == "nt":
@@ -588,10 +804,13 @@ if __name__ == "__main__":
 
     if (not vmx or not vmrun or not snap_name) and not interactive:
         ERR(USAGE)
+
+    if standby and not target:
+        ERR("--standby requires --target, the service endpoint of the VMX")
     
     if not virtualbox:
-        servlet = vmcontrol_pedrpc_server("0.0.0.0", PORT, vmrun, vmx, snap_name, log_level, interactive)
+        servlet = vmcontrol_pedrpc_server("0.0.0.0", PORT, vmrun, vmx, snap_name, log_level, interactive, target, standby)
     elif virtualbox:
-        servlet = vboxcontrol_pedrpc_server("0.0.0.0", PORT, vmrun, vmx, snap_name, log_level, interactive)
+        servlet = vboxcontrol_pedrpc_server("0.0.0.0", PORT, vmrun, vmx, snap_name, log_level, interactive, target, standby)
     
     servlet.serve_forever()